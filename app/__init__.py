@@ -1,9 +1,11 @@
 import os
 from flask import Flask, redirect, url_for
-import markdown
 
-from .blueprints import animals
+from . import assets, commands, http_cache, tracing
+from .blueprints import animals, api
 from .db import DBConnector
+from .images import photo_srcset
+from .markdown_renderer import description_html, render_markdown_cached
 from .repositories import UserRepository
 from .repositories.animal_repository import AnimalRepository
 from .repositories.photo_repository import PhotoRepository
@@ -21,6 +23,9 @@ def create_app(test_config=None):
 
     db.init_app(app)
     app.db = db
+    tracing.init_app(app)
+    assets.init_app(app)
+    http_cache.init_app(app)
 
     from .blueprints.auth import login_manager
     login_manager.init_app(app)
@@ -33,17 +38,22 @@ def create_app(test_config=None):
 
     from app.blueprints.auth import bp as auth_bp
     from app.blueprints.animals import bp as animals_bp
+    from app.blueprints.api import bp as api_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(animals_bp)
+    app.register_blueprint(api_bp)
 
     animals.init_app(app)
+    api.init_app(app)
+    commands.init_app(app)
 
     @app.template_filter('markdown')
     def markdown_filter(text):
-        if text:
-            return markdown.markdown(text, extensions=['extra', 'codehilite'])
-        return ''
+        return render_markdown_cached(text)
+
+    app.add_template_filter(description_html, 'description_html')
+    app.add_template_global(photo_srcset, 'photo_srcset')
     #фильтр для отображения месяцев в правильном формате
     @app.template_filter('pluralize')
     def pluralize_filter(number, one, few, many):
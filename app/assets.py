@@ -0,0 +1,82 @@
+import hashlib
+import os
+import re
+
+from flask import current_app, request, url_for
+
+from app.cache import LRUCache
+
+# загруженные фотографии и их WebP-варианты уже названы по SHA-256 содержимого
+FINGERPRINTED_RE = re.compile(r'^uploads/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:_\d+w)?\.\w+$')
+FINGERPRINT_LENGTH = 12
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# отпечатки файлов вне манифеста (старые загрузки), ключ включает mtime и размер
+_fingerprints = LRUCache(maxsize=4096)
+
+
+def _digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def build_manifest(static_folder):
+    manifest = {}
+    for directory, dirnames, filenames in os.walk(static_folder):
+        relative = os.path.relpath(directory, static_folder)
+        if relative == 'uploads' or relative.startswith('uploads' + os.sep):
+            dirnames[:] = []
+            continue
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            manifest[os.path.relpath(path, static_folder).replace(os.sep, '/')] = _digest(path)
+    return manifest
+
+
+def fingerprint(filename):
+    manifest = current_app.extensions.get('asset_manifest', {})
+    if filename in manifest:
+        return manifest[filename]
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (filename, stat.st_mtime_ns, stat.st_size)
+    version = _fingerprints.get(key)
+    if version is None:
+        version = _digest(path)
+        _fingerprints.set(key, version)
+    return version
+
+
+def asset_url(filename, external=False):
+    if FINGERPRINTED_RE.match(filename):
+        return url_for('static', filename=filename, _external=external)
+    version = fingerprint(filename)
+    if version is None:
+        return url_for('static', filename=filename, _external=external)
+    return url_for('static', filename=filename, v=version, _external=external)
+
+
+def init_app(app):
+    # в режиме отладки файлы правятся на ходу, отпечатки считаются по mtime при каждом обращении
+    if not app.debug:
+        app.extensions['asset_manifest'] = build_manifest(app.static_folder)
+    app.add_template_global(asset_url, 'asset_url')
+
+    @app.after_request
+    def cache_fingerprinted(response):
+        if request.endpoint != 'static' or response.status_code not in (200, 304):
+            return response
+        filename = request.view_args.get('filename', '')
+        version = request.args.get('v')
+        if FINGERPRINTED_RE.match(filename) or (version and version == fingerprint(filename)):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response
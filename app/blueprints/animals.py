@@ -1,33 +1,49 @@
+import re
+import uuid
+
 from flask import Blueprint, render_template, request, current_app, flash, redirect, url_for
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-import os
 import bleach
-from app.repositories.animal_repository import AnimalRepository
+from app.repositories.adoption_repository import ALREADY_SUBMITTED, SUBMITTED
+from app.repositories.animal_repository import AnimalRepository, encode_cursor
 from app.repositories.photo_repository import PhotoRepository
 from app.decorators import admin_required, moderator_required
+from app.concurrency import fetch_parallel
+from app.http_cache import conditional
+from app.page_cache import LISTING_TAG, cached_page, listing_version
+from app.images import schedule_removal, schedule_variants
+from app.storage import release, save_upload
 
 bp = Blueprint('animals', __name__, url_prefix='/animals')
 
+IDEMPOTENCY_KEY_RE = re.compile(r'[0-9a-f]{32}')
+
 def init_app(app):
     bp.animal_repository = AnimalRepository(app.db)
     bp.photo_repository = PhotoRepository(app.db)
     bp.adoption_repository = app.adoption_repository
 
 @bp.route('/')
+@cached_page(LISTING_TAG)
 def index():
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 6
-    animals = bp.animal_repository.get_paginated(page)
-    total = bp.animal_repository.get_total_count()
-    total_pages = (total + per_page - 1) // per_page
-    return render_template(
-        'animals/index.html',
-        animals=animals,
-        total=total,
-        page=page,
-        total_pages=total_pages
-    )
+
+    def render():
+        animals, total = bp.animal_repository.get_page(page, cursor=cursor)
+        total_pages = (total + per_page - 1) // per_page
+        next_cursor = encode_cursor(animals[-1]) if animals else None
+        return render_template(
+            'animals/index.html',
+            animals=animals,
+            total=total,
+            page=page,
+            total_pages=total_pages,
+            next_cursor=next_cursor
+        )
+
+    return conditional(listing_version(), render)
 
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -51,38 +67,46 @@ def create():
                 flash('Необходимо загрузить хотя бы одну фотографию', 'danger')
                 return render_template('animals/create.html', form=request.form)
 
-            connection = bp.animal_repository.db.connect()
+            app = current_app._get_current_object()
+            saved_photos = []
+            holds = []
             try:
-                animal_id = bp.animal_repository.create({
-                    'name': name,
-                    'description': description,
-                    'age_months': age_months,
-                    'breed': breed,
-                    'gender': gender,
-                    'status': status
-                })
-
                 for photo in photos:
                     if photo.filename:
-                        filename = secure_filename(photo.filename)
-                        photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                        photo.save(photo_path)
-                        
-                        bp.photo_repository.create({
-                            'animal_id': animal_id,
+                        filename, content_hash, hold = save_upload(photo, app.config['UPLOAD_FOLDER'])
+                        holds.append(hold)
+                        saved_photos.append({
                             'filename': filename,
-                            'mime_type': photo.content_type
+                            'mime_type': photo.content_type,
+                            'content_hash': content_hash
                         })
+
+                with app.db.transaction() as connection:
+                    animal_id = bp.animal_repository.create({
+                        'name': name,
+                        'description': description,
+                        'age_months': age_months,
+                        'breed': breed,
+                        'gender': gender,
+                        'status': status
+                    }, connection=connection)
+                    photo_ids = bp.photo_repository.create_many(animal_id, saved_photos, connection=connection)
+                release(holds)
+
+                for photo_id, photo in zip(photo_ids, saved_photos):
+                    schedule_variants(app, photo_id, photo['filename'])
                 
                 flash('Животное успешно добавлено', 'success')
                 return redirect(url_for('animals.view', id=animal_id))
                 
             except Exception as e:
+                # записи не сохранились: новые файлы удаляются, если на них не ссылаются другие фотографии
+                release(holds)
+                if saved_photos:
+                    schedule_removal(app, [(photo['filename'], None) for photo in saved_photos])
                 current_app.logger.error(f"Error creating animal: {str(e)}")
                 flash('При сохранении данных возникла ошибка. Проверьте корректность введённых данных.', 'danger')
                 return render_template('animals/create.html', form=request.form)
-            finally:
-                connection.close()
                 
         except Exception as e:
             current_app.logger.error(f"Error processing form: {str(e)}")
@@ -109,7 +133,6 @@ def edit(id):
             gender = request.form['gender']
             status = request.form['status']
 
-            connection = bp.animal_repository.db.connect()
             try:
                 bp.animal_repository.update(id, {
                     'name': name,
@@ -118,8 +141,7 @@ def edit(id):
                     'breed': breed,
                     'gender': gender,
                     'status': status
-                }, connection=connection)
-                connection.commit()
+                })
                 
                 flash('Данные животного успешно обновлены', 'success')
                 return redirect(url_for('animals.view', id=id))
@@ -128,8 +150,6 @@ def edit(id):
                 current_app.logger.error(f"Error updating animal: {str(e)}")
                 flash('При сохранении данных возникла ошибка. Проверьте корректность введённых данных.', 'danger')
                 return render_template('animals/edit.html', form=request.form, animal=animal)
-            finally:
-                connection.close()
                 
         except Exception as e:
             current_app.logger.error(f"Error processing form: {str(e)}")
@@ -139,28 +159,38 @@ def edit(id):
     return render_template('animals/edit.html', form=animal, animal=animal)
 
 @bp.route('/<int:id>')
+@cached_page('animal:{id}')
 def view(id):
-    animal = bp.animal_repository.get_by_id(id)
-    if not animal:
+    version = bp.animal_repository.get_version(id)
+    if not version:
         flash('Животное не найдено', 'danger')
         return redirect(url_for('animals.index'))
-    
-    photos = bp.photo_repository.get_by_animal_id(id)
 
-    adoptions = []
-    user_adoption = None
-    
-    if current_user.is_authenticated:
-        if current_user.role_name in ['admin', 'moderator']:
-            adoptions = bp.adoption_repository.get_by_animal_id(id)
-        elif current_user.role_name == 'user':
-            user_adoption = bp.adoption_repository.get_by_user_and_animal(current_user.id, id)
-    
-    return render_template('animals/view.html', 
-                         animal=animal, 
-                         photos=photos, 
-                         adoptions=adoptions,
-                         user_adoption=user_adoption)
+    def render():
+        role = current_user.role_name if current_user.is_authenticated else None
+        calls = [
+            lambda: bp.animal_repository.get_by_id(id),
+            lambda: bp.photo_repository.get_by_animal_id(id)
+        ]
+        if role in ['admin', 'moderator']:
+            calls.append(lambda: bp.adoption_repository.get_by_animal_id(id))
+        elif role == 'user':
+            user_id = current_user.id
+            calls.append(lambda: bp.adoption_repository.get_by_user_and_animal(user_id, id))
+
+        # запросы независимы, страница ждёт самый медленный из них, а не их сумму
+        animal, photos, *extra = fetch_parallel(*calls)
+        adoptions = extra[0] if role in ['admin', 'moderator'] else []
+        user_adoption = extra[0] if role == 'user' else None
+
+        return render_template('animals/view.html',
+                             animal=animal,
+                             photos=photos,
+                             adoptions=adoptions,
+                             user_adoption=user_adoption,
+                             idempotency_key=uuid.uuid4().hex)
+
+    return conditional((id, version['revision']), render)
 
 @bp.route('/<int:id>/delete', methods=['POST'])
 @login_required
@@ -172,27 +202,10 @@ def delete(id):
         return redirect(url_for('animals.index'))
     
     try:
-        connection = bp.adoption_repository.db_connector.connect()
-        try:
-            cursor = connection.cursor()
-            cursor.execute("DELETE FROM adoptions WHERE animal_id = %s", (id,))
-            connection.commit()
-            cursor.close()
-        except Exception as e:
-            connection.rollback()
-            current_app.logger.error(f"Error deleting adoptions: {str(e)}")
-        finally:
-            connection.close()
-
-        photos = bp.photo_repository.get_by_animal_id(id)
-        for photo in photos:
-            photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], photo['filename'])
-            if os.path.exists(photo_path):
-                os.remove(photo_path)
-            bp.photo_repository.delete(photo['id'])
+        orphaned = bp.animal_repository.delete(id)
+        if orphaned:
+            schedule_removal(current_app._get_current_object(), orphaned)
 
-        bp.animal_repository.delete(id)
-        
         flash('Животное успешно удалено', 'success')
         
     except Exception as e:
@@ -204,37 +217,27 @@ def delete(id):
 @bp.route('/<int:id>/submit_adoption', methods=['POST'])
 @login_required
 def submit_adoption(id):
-    animal = bp.animal_repository.get_by_id(id)
-    if not animal:
-        flash('Животное не найдено', 'danger')
-        return redirect(url_for('animals.index'))
-
-    if animal['status'] not in ['available', 'adoption']:
-        flash('Это животное недоступно для усыновления', 'warning')
-        return redirect(url_for('animals.view', id=id))
-    
     contact_info = bleach.clean(request.form['contact_info'])
-    
-    try:
-        existing_adoption = bp.adoption_repository.get_by_user_and_animal(current_user.id, id)
-        if existing_adoption:
-            flash('Вы уже подавали заявку на усыновление этого животного', 'warning')
-            return redirect(url_for('animals.view', id=id))
+    # ключ выдаётся вместе с формой; повторная отправка той же формы не считается второй заявкой
+    idempotency_key = request.form.get('idempotency_key')
+    if not idempotency_key or not IDEMPOTENCY_KEY_RE.fullmatch(idempotency_key):
+        idempotency_key = None
 
-        adoption_id = bp.adoption_repository.create({
-            'animal_id': id,
-            'user_id': current_user.id,
-            'contact_info': contact_info
-        })
-        
-        flash('Заявка на усыновление успешно подана', 'success')
-        return redirect(url_for('animals.view', id=id))
-        
+    try:
+        outcome = bp.adoption_repository.submit(id, current_user.id, contact_info, idempotency_key=idempotency_key)
     except Exception as e:
         current_app.logger.error(f"Error submitting adoption: {str(e)}")
         flash('При подаче заявки возникла ошибка', 'danger')
         return redirect(url_for('animals.view', id=id))
 
+    if outcome == SUBMITTED:
+        flash('Заявка на усыновление успешно подана', 'success')
+    elif outcome == ALREADY_SUBMITTED:
+        flash('Вы уже подавали заявку на усыновление этого животного', 'warning')
+    else:
+        flash('Это животное недоступно для усыновления', 'warning')
+    return redirect(url_for('animals.view', id=id))
+
 @bp.route('/<int:id>/adoptions')
 @login_required
 @moderator_required
@@ -251,8 +254,10 @@ def get_adoptions(id):
 @moderator_required
 def approve_adoption(adoption_id):
     try:
-        bp.adoption_repository.update_status(adoption_id, 'accepted')
-        flash('Заявка на усыновление одобрена', 'success')
+        if bp.adoption_repository.update_status(adoption_id, 'accepted'):
+            flash('Заявка на усыновление одобрена', 'success')
+        else:
+            flash('Заявка уже рассмотрена или животное усыновлено по другой заявке', 'warning')
     except Exception as e:
         current_app.logger.error(f"Error approving adoption: {str(e)}")
         flash('При одобрении заявки возникла ошибка', 'danger')
@@ -264,8 +269,10 @@ def approve_adoption(adoption_id):
 @moderator_required
 def reject_adoption(adoption_id):
     try:
-        bp.adoption_repository.update_status(adoption_id, 'rejected')
-        flash('Заявка на усыновление отклонена', 'success')
+        if bp.adoption_repository.update_status(adoption_id, 'rejected'):
+            flash('Заявка на усыновление отклонена', 'success')
+        else:
+            flash('Заявка уже рассмотрена', 'warning')
     except Exception as e:
         current_app.logger.error(f"Error rejecting adoption: {str(e)}")
         flash('При отклонении заявки возникла ошибка', 'danger')
@@ -0,0 +1,229 @@
+import gzip
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Blueprint, current_app, request
+from flask_login import current_user
+
+from app.assets import asset_url
+from app.images import parse_variants, variant_filename
+from app import pagination
+from app.markdown_renderer import description_html
+from app.repositories.adoption_repository import STATUSES
+from app.repositories.animal_repository import encode_cursor
+from app.serialization import json_response
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+GZIP_MIN_SIZE = 1024
+
+
+def init_app(app):
+    bp.animal_repository = app.animal_repository
+    bp.photo_repository = app.photo_repository
+    bp.adoption_repository = app.adoption_repository
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return json_response({'error': error.message}, error.status)
+
+
+def roles_required(*roles):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user.is_authenticated:
+                raise ApiError('Необходима аутентификация', 401)
+            if current_user.role_name not in roles:
+                raise ApiError('У вас недостаточно прав для выполнения данного действия', 403)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def photo_url(filename):
+    return asset_url('uploads/' + filename, external=True) if filename else None
+
+
+def photo_variants(filename, variants):
+    return [
+        {'width': width, 'url': photo_url(variant_filename(filename, width))}
+        for width in parse_variants(variants)
+    ]
+
+
+# поля ресурсов и способ их получения из строки репозитория; вычисляются только запрошенные
+ANIMAL_FIELDS = {
+    'id': lambda animal: animal['id'],
+    'name': lambda animal: animal['name'],
+    'description': lambda animal: animal['description'],
+    'description_html': lambda animal: str(description_html(animal)),
+    'age_months': lambda animal: animal['age_months'],
+    'breed': lambda animal: animal['breed'],
+    'gender': lambda animal: animal['gender'],
+    'status': lambda animal: animal['status'],
+    'adoption_count': lambda animal: animal['adoption_count'],
+    'photo': lambda animal: photo_url(animal['primary_photo_filename']),
+    'photo_variants': lambda animal: photo_variants(animal['primary_photo_filename'],
+                                                    animal['primary_photo_variants']),
+    'created_at': lambda animal: animal['created_at'],
+    'updated_at': lambda animal: animal['updated_at'],
+}
+
+PHOTO_FIELDS = {
+    'id': lambda photo: photo['id'],
+    'url': lambda photo: photo_url(photo['filename']),
+    'mime_type': lambda photo: photo['mime_type'],
+    'variants': lambda photo: photo_variants(photo['filename'], photo['variant_widths']),
+    'created_at': lambda photo: photo['created_at'],
+}
+
+ADOPTION_FIELDS = {
+    'id': lambda adoption: adoption['id'],
+    'animal_id': lambda adoption: adoption['animal_id'],
+    'user_id': lambda adoption: adoption['user_id'],
+    'status': lambda adoption: adoption['status'],
+    'contact_info': lambda adoption: adoption['contact_info'],
+    'applicant': lambda adoption: ' '.join(
+        part for part in (adoption['last_name'], adoption['first_name'], adoption['middle_name']) if part
+    ),
+    'username': lambda adoption: adoption['username'],
+    'request_date': lambda adoption: adoption['request_date'],
+    'processed_at': lambda adoption: adoption['processed_at'],
+    'created_at': lambda adoption: adoption['created_at'],
+}
+
+QUEUE_FIELDS = dict(ADOPTION_FIELDS, animal_name=lambda adoption: adoption['animal_name'])
+
+
+def requested_fields(available):
+    """Разбирает параметр fields=id,name; без него возвращаются все поля"""
+    fields = request.args.get('fields')
+    if not fields:
+        return list(available)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def serialize(row, available, fields):
+    return {field: available[field](row) for field in fields}
+
+
+def requested_limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    return max(1, min(limit, MAX_LIMIT))
+
+
+@bp.after_request
+def compress(response):
+    if (response.direct_passthrough or response.status_code < 200
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE or 'gzip' not in request.accept_encodings:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=current_app.config.get('API_GZIP_LEVEL', 6)))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@bp.route('/animals')
+def animals():
+    fields = requested_fields(ANIMAL_FIELDS)
+    limit = requested_limit()
+    rows = bp.animal_repository.get_paginated(
+        status=request.args.get('status'),
+        cursor=request.args.get('cursor'),
+        per_page=limit
+    )
+    next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+    return json_response({
+        'data': [serialize(row, ANIMAL_FIELDS, fields) for row in rows],
+        'next_cursor': next_cursor
+    })
+
+
+def get_animal_or_404(animal_id):
+    animal = bp.animal_repository.get_by_id(animal_id)
+    if not animal:
+        raise ApiError('Животное не найдено', 404)
+    return animal
+
+
+@bp.route('/animals/<int:id>')
+def animal(id):
+    fields = requested_fields(ANIMAL_FIELDS)
+    data = serialize(get_animal_or_404(id), ANIMAL_FIELDS, fields)
+    if 'photos' in request.args.get('include', '').split(','):
+        data['photos'] = [serialize(photo, PHOTO_FIELDS, list(PHOTO_FIELDS))
+                          for photo in bp.photo_repository.get_by_animal_id(id)]
+    return json_response({'data': data})
+
+
+@bp.route('/animals/<int:id>/photos')
+def animal_photos(id):
+    fields = requested_fields(PHOTO_FIELDS)
+    get_animal_or_404(id)
+    photos = bp.photo_repository.get_by_animal_id(id)
+    return json_response({'data': [serialize(photo, PHOTO_FIELDS, fields) for photo in photos]})
+
+
+@bp.route('/animals/<int:id>/adoptions')
+@roles_required('admin', 'moderator')
+def animal_adoptions(id):
+    fields = requested_fields(ADOPTION_FIELDS)
+    get_animal_or_404(id)
+    adoptions = bp.adoption_repository.get_by_animal_id(id)
+    return json_response({'data': [serialize(adoption, ADOPTION_FIELDS, fields) for adoption in adoptions]})
+
+
+def requested_age(name):
+    days = request.args.get(name, type=int)
+    if days is None:
+        return None
+    if days < 0:
+        raise ApiError(f'Параметр {name} не может быть отрицательным')
+    return datetime.now() - timedelta(days=days)
+
+
+@bp.route('/adoptions')
+@roles_required('admin', 'moderator')
+def adoptions_queue():
+    """Очередь модерации, самые старые заявки первыми.
+
+    Параметры: status (pending), animal_id, min_age_days и max_age_days — возраст заявки,
+    cursor, limit, fields. counts — количество заявок по статусам без учёта фильтров.
+    """
+    fields = requested_fields(QUEUE_FIELDS)
+    limit = requested_limit()
+    status = request.args.get('status', 'pending')
+    if status not in STATUSES:
+        raise ApiError(f'Неизвестный статус: {status}')
+    rows = bp.adoption_repository.get_queue(
+        status=status,
+        animal_id=request.args.get('animal_id', type=int),
+        created_before=requested_age('min_age_days'),
+        created_after=requested_age('max_age_days'),
+        cursor=request.args.get('cursor'),
+        limit=limit
+    )
+    next_cursor = pagination.encode_cursor(rows[-1]) if len(rows) == limit else None
+    return json_response({
+        'data': [serialize(row, QUEUE_FIELDS, fields) for row in rows],
+        'next_cursor': next_cursor,
+        'counts': bp.adoption_repository.get_status_counts()
+    })
@@ -37,7 +37,7 @@ class User(UserMixin):
 
 @login_manager.user_loader
 def load_user(user_id):
-    user = current_app.user_repository.get_by_id(user_id)
+    user = current_app.user_repository.get_principal(user_id)
     if user is not None:
         return User(
             user.id,
@@ -0,0 +1,168 @@
+import ctypes
+import multiprocessing
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+
+# общие для всех процессов поколения тегов; создаются в мастер-процессе до fork
+_shared_generations = None
+
+
+class LRUCache:
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class LocalGenerations:
+    """Счётчики поколений тегов в памяти одного процесса."""
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+        # счётчики начинаются с нуля при каждом запуске, метка отличает их от прошлых запусков
+        self.token = uuid.uuid4().hex[:8]
+
+    def read(self, keys):
+        with self._lock:
+            return tuple(self._counters.get(key, 0) for key in keys)
+
+    def bump(self, keys):
+        with self._lock:
+            for key in keys:
+                self._counters[key] = self._counters.get(key, 0) + 1
+
+
+class SharedGenerations:
+    """Счётчики поколений в разделяемой памяти, видимые всем процессам, порождённым после создания.
+
+    Ключ отображается в ячейку по crc32; при коллизии сброс одного тега лишь сбрасывает и соседний.
+    """
+
+    def __init__(self, slots=16384):
+        self._counters = multiprocessing.RawArray(ctypes.c_uint64, slots)
+        self._lock = multiprocessing.Lock()
+        self.token = uuid.uuid4().hex[:8]
+
+    def _slot(self, key):
+        return zlib.crc32(key.encode('utf-8')) % len(self._counters)
+
+    def read(self, keys):
+        return tuple(self._counters[self._slot(key)] for key in keys)
+
+    def bump(self, keys):
+        with self._lock:
+            for slot in {self._slot(key) for key in keys}:
+                self._counters[slot] += 1
+
+
+def share_generations(slots=16384):
+    """Переключает все TaggedCache на общие счётчики, чтобы сброс в одном воркере был виден остальным.
+
+    Вызывается в мастер-процессе до запуска воркеров.
+    """
+    global _shared_generations
+    if _shared_generations is None:
+        _shared_generations = SharedGenerations(slots)
+    return _shared_generations
+
+
+class TaggedCache(LRUCache):
+    """LRU-кэш, записи которого сбрасываются по тегам.
+
+    Запись хранит номера поколений своих тегов на момент чтения данных; invalidate() увеличивает
+    поколение, и все записи с этим тегом, включая вычисленные до сброса, перестают находиться.
+    Данные у каждого процесса свои, а поколения после share_generations() общие, поэтому
+    сброс действует во всех воркерах.
+    """
+
+    def __init__(self, maxsize=128, ttl=None, name='default'):
+        super().__init__(maxsize, ttl)
+        self.name = name
+        self._local_generations = LocalGenerations()
+
+    @property
+    def _generations(self):
+        return _shared_generations or self._local_generations
+
+    def _keys(self, tags):
+        return [f'{self.name}\0{tag}' for tag in tags]
+
+    def generations(self, tags):
+        tags = tuple(tags)
+        epoch, *values = self._generations.read([f'{self.name}\0'] + self._keys(tags))
+        return epoch, tuple(zip(tags, values))
+
+    def version(self, *tags):
+        """Строка, которая меняется при каждом сбросе этих тегов или всего кэша; подходит для ETag."""
+        epoch, generations = self.generations(tags)
+        return '.'.join([self._generations.token, str(epoch)] + [str(value) for _, value in generations])
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None:
+            return default
+        value, generations = entry
+        if generations != self.generations(tag for tag, _ in generations[1]):
+            self.delete(key)
+            return default
+        return value
+
+    def set(self, key, value, ttl=None, tags=(), generations=None):
+        if generations is None:
+            generations = self.generations(tags)
+        super().set(key, (value, generations), ttl)
+
+    def invalidate(self, *tags):
+        self._generations.bump(self._keys(tags))
+
+    def clear(self):
+        # эпоха входит в поколения каждой записи, её увеличение сбрасывает весь кэш
+        with self._lock:
+            self._data.clear()
+        self._generations.bump([f'{self.name}\0'])
+
+
+# количество заявок по статусам для очереди модерации; сбрасывается при изменении adoptions,
+# в том числе каскадном удалении вместе с животным или пользователем
+adoption_counts_cache = TaggedCache(maxsize=1, ttl=60, name='adoption_counts')
+
+
+def invalidate_adoption_counts():
+    adoption_counts_cache.clear()
@@ -0,0 +1,97 @@
+import glob
+import os
+import shutil
+
+import click
+from flask import current_app
+
+from app import storage
+from app.images import generate_variants, variant_filename
+
+
+def init_app(app):
+    app.cli.add_command(repair_animal_counters)
+    app.cli.add_command(reindex_search)
+    app.cli.add_command(rerender_descriptions)
+    app.cli.add_command(generate_photo_variants)
+    app.cli.add_command(migrate_uploads)
+
+
+@click.command('repair-animal-counters')
+def repair_animal_counters():
+    """Пересчитать primary_photo_filename и adoption_count у всех животных."""
+    repaired = current_app.animal_repository.repair_denormalized()
+    click.echo(f'Пересчитано записей: {repaired}')
+
+
+@click.command('reindex-search')
+@click.option('--batch-size', default=500, show_default=True)
+def reindex_search(batch_size):
+    """Перестроить search_text для полнотекстового поиска."""
+    reindexed = current_app.animal_repository.reindex_search(batch_size)
+    click.echo(f'Проиндексировано записей: {reindexed}')
+
+
+@click.command('rerender-descriptions')
+@click.option('--batch-size', default=200, show_default=True)
+def rerender_descriptions(batch_size):
+    """Перерендерить description_html, собранные старой версией рендерера."""
+    rendered = current_app.animal_repository.rerender_descriptions(batch_size)
+    click.echo(f'Перерендерено описаний: {rendered}')
+
+
+@click.command('generate-photo-variants')
+def generate_photo_variants():
+    """Создать уменьшенные WebP-копии для фотографий, у которых их ещё нет."""
+    generated = 0
+    last_id = 0
+    while True:
+        photos = current_app.photo_repository.get_without_variants(last_id)
+        if not photos:
+            break
+        for photo in photos:
+            try:
+                widths = generate_variants(current_app.config['UPLOAD_FOLDER'], photo['filename'])
+            except OSError as e:
+                click.echo(f"Не удалось обработать {photo['filename']}: {e}")
+                widths = []
+            if widths:
+                current_app.photo_repository.set_variants(photo['id'], ','.join(map(str, widths)))
+                generated += 1
+        last_id = photos[-1]['id']
+    click.echo(f'Обработано фотографий: {generated}')
+
+
+@click.command('migrate-uploads')
+def migrate_uploads():
+    """Перенести файлы из плоского каталога uploads в хранилище по хешу содержимого."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    migrated = 0
+    last_filename = ''
+    while True:
+        filenames = current_app.photo_repository.get_unhashed_filenames(last_filename)
+        if not filenames:
+            break
+        for filename in filenames:
+            path = os.path.join(upload_folder, filename)
+            if not os.path.isfile(path):
+                click.echo(f'Файл не найден: {filename}')
+                continue
+            new_filename, content_hash, hold = storage.import_file(path, upload_folder)
+            stem = os.path.splitext(path)[0]
+            old_variants = [variant for variant in glob.glob(glob.escape(stem) + '_*w.webp')
+                            if variant[len(stem) + 1:-len('w.webp')].isdigit()]
+            for variant in old_variants:
+                width = int(variant[len(stem) + 1:-len('w.webp')])
+                target = os.path.join(upload_folder, variant_filename(new_filename, width))
+                if not os.path.exists(target):
+                    shutil.copy2(variant, target)
+            try:
+                current_app.photo_repository.relocate(filename, new_filename, content_hash)
+            finally:
+                storage.release([hold])
+            if new_filename != filename:
+                storage.remove_files([path] + old_variants)
+            migrated += 1
+        last_filename = filenames[-1]
+    click.echo(f'Перенесено файлов: {migrated}')
@@ -0,0 +1,74 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g
+from mysql.connector.errors import PoolError
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(app):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=app.config.get('PARALLEL_FETCH_WORKERS', 4),
+                    thread_name_prefix='fetch'
+                )
+    return _executor
+
+
+def _reset_executor_after_fork():
+    # потоки в дочерний процесс не копируются, исполнитель создаётся заново
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executor_after_fork)
+
+
+# результат задачи, которой не хватило свободного соединения
+_NO_CONNECTION = object()
+
+
+def _in_app_context(app, trace, read_primary, call):
+    # у задачи свой контекст приложения, а значит своё соединение из пула, вернётся на teardown
+    def task():
+        with app.app_context():
+            if trace is not None:
+                g.sql_trace = trace
+            # без контекста запроса сессия задаче не видна, решение о реплике принимается заранее
+            g.db_read_primary = read_primary
+            # соединение берётся до вызова и без ожидания: если свободных нет, вызов выполнит поток запроса
+            try:
+                app.db.connect(readonly=True, timeout=0)
+            except PoolError:
+                return _NO_CONNECTION
+            return call()
+    return task
+
+
+def fetch_parallel(*calls):
+    """Выполняет независимые чтения одновременно и возвращает их результаты в том же порядке.
+
+    Первый вызов выполняется в текущем потоке на соединении запроса, остальные — в пуле потоков.
+    Задача, которой не досталось свободного соединения, не ждёт его: её вызов выполняется
+    после первого в текущем потоке, на соединении запроса.
+    """
+    app = current_app._get_current_object()
+    if len(calls) < 2 or app.config.get('PARALLEL_FETCH_WORKERS', 4) < 1:
+        return [call() for call in calls]
+
+    trace = g.get('sql_trace')
+    read_primary = app.db.get_replicas() is None or app.db.reads_from_primary()
+    executor = get_executor(app)
+    futures = [executor.submit(_in_app_context(app, trace, read_primary, call)) for call in calls[1:]]
+    results = [calls[0]()]
+    for call, future in zip(calls[1:], futures):
+        result = future.result()
+        results.append(call() if result is _NO_CONNECTION else result)
+    return results
@@ -6,11 +6,42 @@ MYSQL_USER = os.getenv('MYSQL_USER', 'root')
 MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', '')
 MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'bakulinexam')
 
+# Connection pool configuration
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))  # seconds to wait for a free connection
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 300))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 3600))
+DB_POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', 30))  # ping idle connections older than this
+DB_PREPARED_STATEMENTS = int(os.getenv('DB_PREPARED_STATEMENTS', 32))  # per connection, 0 sends plain SQL text
+DB_DEADLOCK_RETRIES = int(os.getenv('DB_DEADLOCK_RETRIES', 3))  # retries of a transaction rolled back by a deadlock
+DB_DEADLOCK_BACKOFF = float(os.getenv('DB_DEADLOCK_BACKOFF', 0.05))  # first pause in seconds, doubled per retry
+
+# Read replicas: comma-separated host[:port]; read-only repository methods are spread across them
+MYSQL_REPLICAS = os.getenv('MYSQL_REPLICAS', '')
+DB_REPLICA_STICKY_SECONDS = float(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))  # session reads the primary after it writes
+DB_REPLICA_RETRY_AFTER = float(os.getenv('DB_REPLICA_RETRY_AFTER', 30))  # skip an unreachable replica this long
+
+# SQL tracing (Server-Timing header and log warnings); off by default, the header shows query timings to clients
+SQL_TRACE = os.getenv('SQL_TRACE', 'False').lower() == 'true'
+SQL_SLOW_MS = float(os.getenv('SQL_SLOW_MS', 100))
+SQL_NPLUS1_THRESHOLD = int(os.getenv('SQL_NPLUS1_THRESHOLD', 3))  # same statement shape this many times per request
+
+# HTTP caching
+CONDITIONAL_GET = os.getenv('CONDITIONAL_GET', 'True').lower() == 'true'  # ETag and 304 on animal pages
+PAGE_CACHE = os.getenv('PAGE_CACHE', 'True').lower() == 'true'  # rendered animal pages for anonymous visitors
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', 300))
+API_GZIP_LEVEL = int(os.getenv('API_GZIP_LEVEL', 6))  # 1 (fastest) .. 9 (smallest)
+
 # Flask configuration
 SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 TESTING = False
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))  # seconds a logged-in user is served from memory
 
 # Upload configuration
 UPLOAD_FOLDER = 'app/static/uploads'
-MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
\ No newline at end of file
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))  # threads generating photo variants
+
+# Concurrent independent reads on the animal page (0 runs them one after another)
+PARALLEL_FETCH_WORKERS = int(os.getenv('PARALLEL_FETCH_WORKERS', 4))
@@ -1,39 +1,572 @@
-from flask import current_app
+import os
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, session
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
+
+from app.tracing import TracingCursor
+
+# сервер не знает statement: его освободили или соединение переподключилось
+ER_UNKNOWN_STMT_HANDLER = 1243
+# транзакция выбрана жертвой взаимной блокировки или не дождалась блокировки строки
+ER_LOCK_DEADLOCK = 1213
+ER_LOCK_WAIT_TIMEOUT = 1205
+
+
+class StatementCache:
+    """Серверные prepared statements одного соединения, по курсору на текст запроса.
+
+    Текст разбирается и планируется сервером один раз, дальше передаются только параметры.
+    Самые давно не использованные statements освобождаются сверх maxsize.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.connection_id = None
+        self._cursors = OrderedDict()
+        self._active = None
+
+    def __len__(self):
+        return len(self._cursors)
+
+    def execute(self, connection, operation, params=(), dictionary=False, named_tuple=False):
+        self.finish()
+        if connection.connection_id != self.connection_id:
+            # после переподключения statements старой сессии на сервере уже нет
+            self._cursors.clear()
+            self.connection_id = connection.connection_id
+
+        key = (operation, dictionary, named_tuple)
+        entry = self._cursors.get(key)
+        if entry is None:
+            entry = self._cursors[key] = (operation, self._prepare(connection, key))
+            while len(self._cursors) > self.maxsize:
+                _, (_, evicted) = self._cursors.popitem(last=False)
+                self._deallocate(evicted)
+        else:
+            self._cursors.move_to_end(key)
+
+        # курсор готовит запрос заново, если получил другой объект строки, поэтому передаётся сохранённый
+        operation, cursor = entry
+        try:
+            cursor.execute(operation, params)
+        except Error as e:
+            if e.errno != ER_UNKNOWN_STMT_HANDLER:
+                raise
+            cursor = self._prepare(connection, key)
+            self._cursors[key] = (operation, cursor)
+            cursor.execute(operation, params)
+        self._active = cursor
+        return cursor
+
+    def finish(self):
+        # непрочитанные строки бинарного протокола мешают следующей команде на соединении. C-расширение
+        # учитывает их на курсоре, а connection.unread_result может быть False, поэтому дочитывается курсор
+        active, self._active = self._active, None
+        if active is not None and active.with_rows:
+            active.fetchall()
+
+    def _prepare(self, connection, key):
+        _, dictionary, named_tuple = key
+        return connection.cursor(prepared=True, dictionary=dictionary, named_tuple=named_tuple)
+
+    def _deallocate(self, cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+class PreparedCursor:
+    """Курсор для PooledConnection.cursor(prepared=True).
+
+    close() только дочитывает результат: statement остаётся подготовленным, пока соединение в пуле.
+    """
+
+    def __init__(self, statements, connection, dictionary=False, named_tuple=False):
+        self._statements = statements
+        self._connection = connection
+        self._dictionary = dictionary
+        self._named_tuple = named_tuple
+        self._cursor = None
+
+    def __getattr__(self, name):
+        if self._cursor is None:
+            raise AttributeError(name)
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount if self._cursor is not None else -1
+
+    def execute(self, operation, params=()):
+        self._cursor = self._statements.execute(
+            self._connection, operation, params, self._dictionary, self._named_tuple
+        )
+
+    def close(self):
+        if self._cursor is not None:
+            self._statements.finish()
+            self._cursor = None
+
+
+class PooledConnection:
+    def __init__(self, pool, connection, created_at):
+        self._pool = pool
+        self._connection = connection
+        self.created_at = created_at
+        self.trace = None
+        self.in_unit_of_work = False
+        self.after_commit_callbacks = []
+
+    def __getattr__(self, name):
+        return getattr(self._checked_out(), name)
+
+    def _checked_out(self):
+        if self._connection is None:
+            raise PoolError('Connection has already been returned to the pool')
+        return self._connection
+
+    @property
+    def released(self):
+        return self._connection is None
+
+    def cursor(self, *args, prepared=False, **kwargs):
+        connection = self._checked_out()
+        if prepared and self._pool.statement_cache_size > 0:
+            cursor = PreparedCursor(self._pool.statements(connection), connection, **kwargs)
+        else:
+            cursor = connection.cursor(*args, **kwargs)
+        if self.trace is not None:
+            return TracingCursor(cursor, self.trace)
+        return cursor
+
+    def close(self):
+        # внутри transaction() соединение возвращается в пул только после commit/rollback
+        if self.in_unit_of_work:
+            return
+        # вместо закрытия соединение возвращается в пул
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            self._pool.release(connection, self.created_at)
+
+
+class ConnectionPool:
+    def __init__(self, factory, size=10, timeout=5.0, max_idle=300.0,
+                 max_lifetime=3600.0, ping_after=30.0, statement_cache_size=32):
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self.statement_cache_size = statement_cache_size
+        self._idle = deque()
+        self._opened = 0
+        self._cond = threading.Condition()
+        # кэш statements живёт вместе с соединением и пропадает, когда оно закрыто
+        self._statements = weakref.WeakKeyDictionary()
+
+    @property
+    def idle_count(self):
+        return len(self._idle)
+
+    @property
+    def opened_count(self):
+        return self._opened
+
+    @property
+    def available_count(self):
+        # соединения, которые можно получить без ожидания: свободные и ещё не открытые
+        with self._cond:
+            return len(self._idle) + self.size - self._opened
+
+    def acquire(self, timeout=None):
+        """Свободное соединение; если все заняты, ждёт не дольше timeout (по умолчанию self.timeout).
+
+        timeout=0 не ждёт: PoolError сразу, когда свободных соединений нет.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        while True:
+            entry = None
+            with self._cond:
+                expired = self._pop_expired()
+                while True:
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._opened < self.size:
+                        self._opened += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(
+                            f'Timed out after {self.timeout}s waiting for a database connection'
+                        )
+                    self._cond.wait(remaining)
+            for connection in expired:
+                self._close(connection)
+
+            if entry is None:
+                try:
+                    connection = self._factory()
+                except Exception:
+                    self._forget()
+                    raise
+                return PooledConnection(self, connection, time.monotonic())
+
+            connection, created_at, returned_at = entry
+            if self._is_healthy(connection, returned_at):
+                return PooledConnection(self, connection, created_at)
+            self._close(connection)
+
+    def statements(self, connection):
+        with self._cond:
+            cache = self._statements.get(connection)
+            if cache is None:
+                cache = self._statements[connection] = StatementCache(self.statement_cache_size)
+            return cache
+
+    def release(self, connection, created_at):
+        now = time.monotonic()
+        if now - created_at >= self.max_lifetime:
+            self._close(connection)
+            return
+        try:
+            statements = self._statements.get(connection)
+            if statements is not None:
+                statements.finish()
+            if connection.unread_result:
+                connection.consume_results()
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            self._close(connection)
+            return
+        with self._cond:
+            self._idle.append((connection, created_at, now))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle = [entry[0] for entry in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._close(connection)
+
+    def _pop_expired(self):
+        # самые старые соединения лежат в начале очереди
+        now = time.monotonic()
+        expired = []
+        while self._idle:
+            connection, created_at, returned_at = self._idle[0]
+            if now - returned_at < self.max_idle and now - created_at < self.max_lifetime:
+                break
+            self._idle.popleft()
+            expired.append(connection)
+        return expired
+
+    def _is_healthy(self, connection, returned_at):
+        if time.monotonic() - returned_at < self.ping_after:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._forget()
+
+    def _forget(self):
+        with self._cond:
+            self._opened -= 1
+            self._cond.notify()
+
+
+class ReplicaSet:
+    """Пулы реплик, которые выдают соединения по кругу.
+
+    Реплика, к которой не удалось подключиться, пропускается retry_after секунд, реплика без
+    свободных соединений — до следующего вызова; если не подошла ни одна, acquire() возвращает None
+    и чтение уходит на основной сервер.
+    """
+
+    def __init__(self, pools, retry_after=30.0):
+        self.pools = pools
+        self.retry_after = retry_after
+        self._next = 0
+        self._down_until = [0.0] * len(pools)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.pools)
+        for offset in range(len(self.pools)):
+            index = (start + offset) % len(self.pools)
+            if self._down_until[index] > time.monotonic():
+                continue
+            try:
+                # без ожидания: занятая реплика не должна задерживать чтение на DB_POOL_TIMEOUT,
+                # следующая реплика или основной сервер ответят сразу
+                return self.pools[index].acquire(timeout=0)
+            except PoolError:
+                # все соединения реплики заняты, но сама она исправна
+                continue
+            except Error as e:
+                self._down_until[index] = time.monotonic() + self.retry_after
+                if has_app_context():
+                    current_app.logger.warning(f"Replica {index} is unavailable: {str(e)}")
+        return None
+
+    def close_all(self):
+        for pool in self.pools:
+            pool.close_all()
+
+
+def parse_hosts(value):
+    """'db-replica-1, db-replica-2:3307' -> [('db-replica-1', 3306), ('db-replica-2', 3307)]"""
+    hosts = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(':')
+        hosts.append((host, int(port or 3306)))
+    return hosts
+
+
+# время последней записи в сессии: до истечения DB_REPLICA_STICKY_SECONDS чтения идут на основной сервер
+SESSION_WROTE_AT = '_db_wrote_at'
+
+def retry_on_deadlock(method):
+    """Повторяет метод репозитория, если его транзакция откатилась из-за deadlock или lock wait timeout.
+
+    Повторяется только собственная транзакция метода: внутри внешней транзакции ошибка
+    пробрасывается, и повторять всю работу должен её владелец. Число попыток и начальная пауза
+    берутся из DB_DEADLOCK_RETRIES и DB_DEADLOCK_BACKOFF, пауза удваивается и не превышает секунды.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, connection=None, **kwargs):
+        outer = connection is not None or (
+            has_app_context() and getattr(g.get('db_connection'), 'in_unit_of_work', False)
+        )
+        config = current_app.config if has_app_context() else {}
+        retries = 0 if outer else config.get('DB_DEADLOCK_RETRIES', 3)
+        backoff = config.get('DB_DEADLOCK_BACKOFF', 0.05)
+        for attempt in range(retries + 1):
+            try:
+                return method(self, *args, connection=connection, **kwargs)
+            except Error as e:
+                if e.errno not in (ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT) or attempt == retries:
+                    raise
+                if has_app_context():
+                    current_app.logger.warning(
+                        f"{method.__qualname__}: retrying after {str(e)} (attempt {attempt + 1} of {retries})"
+                    )
+                # случайная доля паузы разводит повторы конкурирующих транзакций
+                time.sleep(min(backoff * 2 ** attempt, 1.0) * random.uniform(0.5, 1.0))
+
+    return wrapper
+
+
+# коннекторы процесса; после fork их пулы пересоздаются в дочернем процессе
+_connectors = weakref.WeakSet()
+# пулы, унаследованные от родителя: их сокеты принадлежат родителю, закрывать их нельзя
+_inherited_pools = []
+
+
+def _reset_pools_after_fork():
+    for connector in list(_connectors):
+        connector.reset_after_fork()
+
 
 class DBConnector:
     def __init__(self):
         self.app = None
-        self._connection = None
+        self._pool = None
+        self._replicas = None
+        self._pool_lock = threading.Lock()
+        _connectors.add(self)
+
+    def reset_after_fork(self):
+        # воркер открывает свои соединения при первом запросе
+        if self._pool is not None:
+            _inherited_pools.append(self._pool)
+        if self._replicas is not None:
+            _inherited_pools.extend(self._replicas.pools)
+        self._pool = None
+        self._replicas = None
+        self._pool_lock = threading.Lock()
 
     def init_app(self, app):
         self.app = app
 
         @app.teardown_appcontext
         def close_db_connection(error):
-            if self._connection is not None:
-                self._connection.close()
-                self._connection = None
+            for name in ('db_connection', 'db_replica_connection'):
+                connection = g.pop(name, None)
+                if connection is not None:
+                    connection.close()
 
-    def get_config(self):
-        return {
+    def get_config(self, host=None, port=None):
+        config = {
             'user': self.app.config['MYSQL_USER'],
             'password': self.app.config['MYSQL_PASSWORD'],
-            'host': self.app.config['MYSQL_HOST'],
+            'host': host or self.app.config['MYSQL_HOST'],
             'database': self.app.config['MYSQL_DATABASE'],
             'charset': 'utf8mb4',
             'collation': 'utf8mb4_general_ci',
             'use_unicode': True
         }
+        if port:
+            config['port'] = port
+        return config
+
+    def _create_pool(self, host=None, port=None):
+        config = self.app.config
+        return ConnectionPool(
+            lambda: mysql.connector.connect(**self.get_config(host, port)),
+            size=config.get('DB_POOL_SIZE', 10),
+            timeout=config.get('DB_POOL_TIMEOUT', 5.0),
+            max_idle=config.get('DB_POOL_MAX_IDLE', 300.0),
+            max_lifetime=config.get('DB_POOL_MAX_LIFETIME', 3600.0),
+            ping_after=config.get('DB_POOL_PING_AFTER', 30.0),
+            statement_cache_size=config.get('DB_PREPARED_STATEMENTS', 32)
+        )
+
+    def get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = self._create_pool()
+        return self._pool
 
-    def connect(self):
+    def get_replicas(self):
+        """Реплики из MYSQL_REPLICAS или None, если чтения идут только на основной сервер"""
+        if self._replicas is None:
+            hosts = parse_hosts(self.app.config.get('MYSQL_REPLICAS'))
+            if not hosts:
+                return None
+            with self._pool_lock:
+                if self._replicas is None:
+                    self._replicas = ReplicaSet(
+                        [self._create_pool(host, port) for host, port in hosts],
+                        retry_after=self.app.config.get('DB_REPLICA_RETRY_AFTER', 30.0)
+                    )
+        return self._replicas
+
+    def reads_from_primary(self):
+        # чтения внутри транзакции и после записи в этом запросе или недавно в этой сессии
+        connection = g.get('db_connection')
+        if connection is not None and not connection.released and connection.in_unit_of_work:
+            return True
+        if g.get('db_read_primary'):
+            return True
+        if has_request_context():
+            wrote_at = session.get(SESSION_WROTE_AT)
+            sticky = self.app.config.get('DB_REPLICA_STICKY_SECONDS', 5.0)
+            return wrote_at is not None and time.time() - wrote_at < sticky
+        return False
+
+    def _mark_write(self):
+        if self.get_replicas() is None or not has_app_context():
+            return
+        g.db_read_primary = True
+        if has_request_context():
+            session[SESSION_WROTE_AT] = time.time()
+
+    def _connect_replica(self):
+        connection = g.get('db_replica_connection')
+        if connection is not None and not connection.released:
+            return connection
+        connection = self.get_replicas().acquire()
+        if connection is not None:
+            connection.trace = g.get('sql_trace')
+            g.db_replica_connection = connection
+        return connection
+
+    def connect(self, readonly=False, timeout=None):
+        """Соединение контекста приложения.
+
+        readonly=True отправляет запрос на реплику, если они настроены и чтение не обязано
+        видеть недавнюю запись (см. reads_from_primary); иначе — основной сервер.
+        timeout — сколько ждать свободного соединения (по умолчанию DB_POOL_TIMEOUT); при timeout=0
+        занятый пул сразу даёт PoolError, и что делать дальше, решает вызывающий.
+        """
         try:
-            if self._connection is None or not self._connection.is_connected():
-                self._connection = mysql.connector.connect(**self.get_config())
-            return self._connection
+            if not has_app_context():
+                return self.get_pool().acquire(timeout)
+            if readonly and self.get_replicas() is not None and not self.reads_from_primary():
+                connection = self._connect_replica()
+                if connection is not None:
+                    return connection
+            # одно соединение на контекст приложения, возвращается в пул на teardown
+            connection = g.get('db_connection')
+            if connection is None or connection.released:
+                connection = g.db_connection = self.get_pool().acquire(timeout)
+                connection.trace = g.get('sql_trace')
+            return connection
         except Error as e:
-            current_app.logger.error(f"Errors connecting to MySQL: {str(e)}")
+            # при timeout=0 занятый пул — ожидаемый исход, его обрабатывает вызывающий
+            if timeout != 0 or not isinstance(e, PoolError):
+                logger = current_app.logger if has_app_context() else self.app.logger
+                logger.error(f"Errors connecting to MySQL: {str(e)}")
             raise
 
+    @contextmanager
+    def transaction(self, connection=None):
+        # переданное соединение принадлежит внешней транзакции, она и делает commit
+        if connection is not None:
+            yield connection
+            return
+        connection = self.connect()
+        if getattr(connection, 'in_unit_of_work', False):
+            yield connection
+            return
+        connection.in_unit_of_work = True
+        try:
+            yield connection
+            connection.commit()
+        except Exception:
+            connection.after_commit_callbacks.clear()
+            connection.rollback()
+            raise
+        finally:
+            connection.in_unit_of_work = False
+            connection.close()
+        self._mark_write()
+        callbacks = list(connection.after_commit_callbacks)
+        connection.after_commit_callbacks.clear()
+        for callback in callbacks:
+            callback()
+
+    def after_commit(self, connection, callback):
+        if getattr(connection, 'in_unit_of_work', False):
+            connection.after_commit_callbacks.append(callback)
+        else:
+            callback()
+
+os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
 db = DBConnector()
@@ -0,0 +1,63 @@
+import hashlib
+import os
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+
+def deployment_digest(app):
+    # меняется при выкладке новых шаблонов или статики, чтобы старые ETag не подходили к новой разметке
+    digest = hashlib.sha256()
+    root = os.path.join(app.root_path, app.template_folder)
+    for directory, dirnames, filenames in sorted(os.walk(root)):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, 'rb') as template:
+                digest.update(template.read())
+    digest.update(repr(sorted(app.extensions.get('asset_manifest', {}).items())).encode())
+    return digest.hexdigest()[:16]
+
+
+def viewer_key():
+    # шапка показывает ФИО, а страницы животных отличаются для администратора, модератора и пользователя
+    if not current_user.is_authenticated:
+        return 'anonymous'
+    return f'{current_user.id}:{current_user.role_name}:{current_user.full_name}'
+
+
+def make_etag(validator):
+    source = repr((current_app.config.get('ETAG_SALT'), viewer_key(), validator))
+    return hashlib.sha256(source.encode()).hexdigest()[:32]
+
+
+def conditional(validator, render):
+    """Отдаёт 304 без вызова render(), если у клиента актуальная копия страницы.
+
+    Проверяется только ETag: он учитывает и зрителя, и данные, а Last-Modified с точностью
+    до секунды не отличил бы две правки в одну секунду и страницы разных ролей.
+    """
+    # сообщения flash показываются один раз, такую страницу нельзя отдавать из кэша клиента
+    if (validator is None or not current_app.config.get('CONDITIONAL_GET', True)
+            or session.get('_flashes')):
+        return make_response(render())
+
+    etag = make_etag(validator)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.vary.add('Cookie')
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('ETAG_SALT', deployment_digest(app))
@@ -0,0 +1,125 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.assets import asset_url
+from app.storage import is_held, locked, remove_files
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # без Pillow производные не создаются, шаблоны отдают оригинал
+    Image = None
+
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(app):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=app.config.get('IMAGE_WORKERS', 2),
+                    thread_name_prefix='image-variants'
+                )
+    return _executor
+
+
+def _reset_executor_after_fork():
+    # потоки в дочерний процесс не копируются, исполнитель создаётся заново
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executor_after_fork)
+
+
+def variant_filename(filename, width):
+    stem, _ = os.path.splitext(filename)
+    return f'{stem}_{width}w.webp'
+
+
+def parse_variants(variants):
+    if not variants:
+        return []
+    return [int(width) for width in variants.split(',')]
+
+
+def variant_paths(upload_folder, filename, variants):
+    return [os.path.join(upload_folder, variant_filename(filename, width))
+            for width in parse_variants(variants)]
+
+
+def generate_variants(upload_folder, filename):
+    if Image is None:
+        return []
+    widths = []
+    with Image.open(os.path.join(upload_folder, filename)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        # оригинал не увеличиваем: ширины больше исходной заменяются исходной
+        for width in sorted({min(width, image.width) for width in VARIANT_WIDTHS}):
+            widths.append(width)
+            path = os.path.join(upload_folder, variant_filename(filename, width))
+            if os.path.exists(path):
+                # одинаковые фотографии хранятся одним файлом, копии уже созданы
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            temp_path = f'{path}.tmp'
+            resized.save(temp_path, 'WEBP', quality=VARIANT_QUALITY, method=4)
+            os.replace(temp_path, path)
+    return widths
+
+
+def schedule_variants(app, photo_id, filename):
+    def task():
+        with app.app_context():
+            try:
+                widths = generate_variants(app.config['UPLOAD_FOLDER'], filename)
+                if widths:
+                    app.photo_repository.set_variants(photo_id, ','.join(map(str, widths)))
+            except Exception as e:
+                app.logger.error(f"Error generating variants for photo {photo_id}: {str(e)}")
+
+    return get_executor(app).submit(task)
+
+
+def schedule_removal(app, photos):
+    """Удаляет в фоне файлы фотографий и их копий, на которые больше нет ссылок.
+
+    Ссылки проверяются заново под блокировкой хранилища: с момента удаления записей тот же
+    файл могли загрузить снова.
+    """
+    upload_folder = app.config['UPLOAD_FOLDER']
+
+    def task():
+        with app.app_context():
+            try:
+                with locked(upload_folder):
+                    referenced = app.photo_repository.get_referenced([filename for filename, _ in photos])
+                    paths = []
+                    for filename, variants in photos:
+                        path = os.path.join(upload_folder, filename)
+                        if filename in referenced or is_held(path):
+                            continue
+                        paths.append(path)
+                        paths.extend(variant_paths(upload_folder, filename, variants))
+                    remove_files(paths)
+            except Exception as e:
+                app.logger.error(f"Error removing photo files: {str(e)}")
+
+    return get_executor(app).submit(task)
+
+
+def photo_srcset(filename, variants):
+    return ', '.join(
+        f"{asset_url('uploads/' + variant_filename(filename, width))} {width}w"
+        for width in parse_variants(variants)
+    )
@@ -0,0 +1,48 @@
+import hashlib
+
+import bleach
+import markdown
+
+from app.cache import LRUCache
+
+# увеличить при смене расширений или правил очистки, чтобы перерендерить описания
+RENDERER_VERSION = 1
+
+ALLOWED_TAGS = [
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'dd', 'div', 'dl', 'dt', 'em', 'h1', 'h2',
+    'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 'span', 'strong', 'sup',
+    'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'ul',
+]
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title', 'id', 'rel'],
+    'abbr': ['title'],
+    'img': ['src', 'alt', 'title'],
+    '*': ['class', 'id'],
+}
+
+_render_cache = LRUCache(maxsize=256)
+
+
+def render_markdown(text):
+    if not text:
+        return ''
+    html = markdown.markdown(text, extensions=['extra', 'codehilite'])
+    return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
+
+
+def render_markdown_cached(text):
+    if not text:
+        return ''
+    key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    html = _render_cache.get(key)
+    if html is None:
+        html = render_markdown(text)
+        _render_cache.set(key, html)
+    return html
+
+
+def description_html(animal):
+    if animal.get('description_html') is not None and \
+            animal.get('description_html_version') == RENDERER_VERSION:
+        return animal['description_html']
+    return render_markdown_cached(animal.get('description'))
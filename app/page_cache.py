@@ -0,0 +1,97 @@
+import time
+from functools import wraps
+
+from flask import current_app, g, request, session
+from flask_login import current_user
+
+from app.cache import TaggedCache
+
+# готовые страницы для анонимных посетителей; сбрасываются репозиториями после commit
+page_cache = TaggedCache(maxsize=512, name='pages')
+
+LISTING_TAG = 'animals'
+
+# заголовки, которые сохраняются вместе с телом страницы
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+
+def animal_tag(animal_id):
+    return f'animal:{animal_id}'
+
+
+def invalidate_animal(animal_id=None):
+    if animal_id is None:
+        page_cache.invalidate(LISTING_TAG)
+    else:
+        page_cache.invalidate(LISTING_TAG, animal_tag(animal_id))
+
+
+def invalidate_all():
+    page_cache.clear()
+
+
+def listing_version():
+    """Версия списка животных для ETag без запроса к БД.
+
+    Меняется при каждом сбросе списка после commit. Сбросы из других процессов (команды flask,
+    другие хосты) сюда не доходят, поэтому версия ещё и обновляется раз в PAGE_CACHE_TTL —
+    так же долго может устаревать и сама закэшированная страница.
+    """
+    ttl = current_app.config.get('PAGE_CACHE_TTL', 300)
+    return page_cache.version(LISTING_TAG), int(time.time() // ttl)
+
+
+def _role():
+    if not current_user.is_authenticated:
+        return 'anonymous'
+    return current_user.role_name
+
+
+def _is_cacheable():
+    # шапка и формы зависят от пользователя, поэтому кэшируются только страницы анонимных посетителей
+    return (current_app.config.get('PAGE_CACHE', True)
+            and request.method == 'GET'
+            and _role() == 'anonymous'
+            and not session.get('_flashes'))
+
+
+def cached_page(*tags):
+    """Кэширует ответ 200 страницы по адресу, параметрам и роли.
+
+    Теги — шаблоны строк, заполняемые аргументами маршрута, например 'animal:{id}'.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if not _is_cacheable():
+                return view(**kwargs)
+
+            key = (_role(), request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = page_cache.get(key)
+            if entry is not None:
+                body, headers = entry
+                response = current_app.response_class(body, headers=headers)
+                return response.make_conditional(request)
+
+            # Страница из кэша отдаётся до следующего сброса её тегов. Промах обычно случается сразу
+            # после сброса, то есть после записи, и отстающая реплика отдала бы ещё старые данные —
+            # такая страница закрепилась бы в кэше под новым поколением до PAGE_CACHE_TTL. Поэтому
+            # кэшируемая отрисовка читает с основного сервера. Нагрузка на него ограничена: в БД идёт
+            # только промах, не чаще раза на страницу и воркер после каждого сброса или истечения TTL;
+            # попадания в БД не ходят, а страницы вошедших пользователей и API читают с реплик.
+            g.db_read_primary = True
+            entry_tags = [tag.format(**kwargs) for tag in tags]
+            # поколения тегов фиксируются до чтения данных, чтобы сброс во время отрисовки не потерялся
+            generations = page_cache.generations(entry_tags)
+            response = current_app.make_response(view(**kwargs))
+            if response.status_code == 200 and not response.direct_passthrough and not session.get('_flashes'):
+                headers = [(name, value) for name, value in response.headers.items() if name in CACHED_HEADERS]
+                page_cache.set(key, (response.get_data(), headers),
+                               ttl=current_app.config.get('PAGE_CACHE_TTL', 300),
+                               generations=generations)
+            return response
+
+        return wrapper
+
+    return decorator
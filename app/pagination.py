@@ -0,0 +1,26 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(row, *leading):
+    """Курсор keyset-пагинации: позиция строки row по ключу сортировки (*leading, created_at, id).
+
+    leading — целые ключи, которые в ORDER BY стоят перед created_at (например is_available).
+    """
+    position = [*leading, row['created_at'].isoformat(), row['id']]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, leading=0):
+    """Возвращает (*leading, created_at, id) или None для пустого и повреждённого курсора."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        *prefix, created_at, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        if len(prefix) != leading:
+            return None
+        return (*(int(value) for value in prefix), datetime.fromisoformat(created_at), int(last_id))
+    except (ValueError, TypeError):
+        return None
@@ -1,30 +1,87 @@
+from mysql.connector import IntegrityError
+
+from app.cache import adoption_counts_cache, invalidate_adoption_counts
+from app.db import retry_on_deadlock
+from app.page_cache import invalidate_animal
+from app.pagination import decode_cursor
+from app.repositories.animal_repository import invalidate_status_counts
+
+STATUSES = ('pending', 'accepted', 'rejected', 'rejected_adopted')
+
+# результаты AdoptionRepository.submit
+SUBMITTED = 'submitted'
+ALREADY_SUBMITTED = 'already_submitted'
+UNAVAILABLE = 'unavailable'
+
+ER_DUP_ENTRY = 1062
+
+
 class AdoptionRepository:
     def __init__(self, db_connector):
         self.db_connector = db_connector
-    def create(self, adoption_data):
-        connection = self.db_connector.connect()
-        try:
+
+    def create(self, adoption_data, connection=None):
+        """Добавляет заявку и переводит животное в статус 'adoption' одной транзакцией.
+
+        Возвращает id заявки или None, если животное не найдено или уже не принимает заявки.
+        Повторная заявка пользователя на то же животное завершается IntegrityError (ER_DUP_ENTRY).
+        """
+        with self.db_connector.transaction(connection) as connection:
             cursor = connection.cursor()
+            # строка животного блокируется первой, как при одобрении заявок, поэтому одновременные
+            # подачи и решения по одному животному не образуют взаимных блокировок
             cursor.execute("""
-                INSERT INTO adoptions (animal_id, user_id, contact_info, status)
-                VALUES (%s, %s, %s, 'pending')
-            """, (adoption_data['animal_id'], adoption_data['user_id'], adoption_data['contact_info']))
-            connection.commit()
-            adoption_id = cursor.lastrowid
+                UPDATE animals SET status = 'adoption', adoption_count = adoption_count + 1, revision = revision + 1
+                WHERE id = %s AND status IN ('available', 'adoption')
+            """, (adoption_data['animal_id'],))
+            if cursor.rowcount == 0:
+                cursor.close()
+                return None
 
-            cursor.execute("UPDATE animals SET status = 'adoption' WHERE id = %s", (adoption_data['animal_id'],))
-            connection.commit()
-            
+            cursor.execute("""
+                INSERT INTO adoptions (animal_id, user_id, contact_info, status, idempotency_key)
+                VALUES (%s, %s, %s, 'pending', %s)
+            """, (adoption_data['animal_id'], adoption_data['user_id'], adoption_data['contact_info'],
+                  adoption_data.get('idempotency_key')))
+            adoption_id = cursor.lastrowid
             cursor.close()
-            return adoption_id
-        except Exception as e:
-            connection.rollback()
-            raise e
-        finally:
-            connection.close()
+            self.db_connector.after_commit(connection, invalidate_status_counts)
+            self.db_connector.after_commit(connection, invalidate_adoption_counts)
+            self.db_connector.after_commit(connection, lambda: invalidate_animal(adoption_data['animal_id']))
+        return adoption_id
+
+    @retry_on_deadlock
+    def submit(self, animal_id, user_id, contact_info, idempotency_key=None, connection=None):
+        """Подаёт заявку без предварительных проверок и возвращает SUBMITTED, ALREADY_SUBMITTED или UNAVAILABLE.
+
+        О повторной заявке сообщает ошибка уникального ключа (user_id, animal_id). Если у уже
+        сохранённой заявки тот же idempotency_key, это повтор той же отправки формы (двойной клик,
+        обновление страницы), и он считается успешным.
+        """
+        try:
+            adoption_id = self.create({
+                'animal_id': animal_id,
+                'user_id': user_id,
+                'contact_info': contact_info,
+                'idempotency_key': idempotency_key
+            }, connection=connection)
+        except IntegrityError as e:
+            # во внешней транзакции решение об откате остаётся за её владельцем
+            if e.errno != ER_DUP_ENTRY or connection is not None:
+                raise
+            if idempotency_key is not None:
+                with self.db_connector.connect().cursor() as cursor:
+                    cursor.execute("""
+                        SELECT idempotency_key FROM adoptions WHERE user_id = %s AND animal_id = %s
+                    """, (user_id, animal_id))
+                    row = cursor.fetchone()
+                if row is not None and row[0] == idempotency_key:
+                    return SUBMITTED
+            return ALREADY_SUBMITTED
+        return SUBMITTED if adoption_id is not None else UNAVAILABLE
 
     def get_by_id(self, adoption_id):
-        with self.db_connector.connect().cursor(dictionary=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(dictionary=True) as cursor:
             cursor.execute("""
                 SELECT a.*, u.first_name, u.last_name, u.middle_name, u.username
                 FROM adoptions a
@@ -34,43 +91,69 @@ class AdoptionRepository:
             return cursor.fetchone()
 
     def get_by_user_and_animal(self, user_id, animal_id):
-        with self.db_connector.connect().cursor(dictionary=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(prepared=True, dictionary=True) as cursor:
             cursor.execute("""
                 SELECT * FROM adoptions 
                 WHERE user_id = %s AND animal_id = %s
             """, (user_id, animal_id))
             return cursor.fetchone()
 
-    def update_status(self, adoption_id, status):
-        connection = self.db_connector.connect()
-        try:
+    @retry_on_deadlock
+    def update_status(self, adoption_id, status, connection=None):
+        """Одобряет или отклоняет заявку, ожидающую решения.
+
+        Все решения по животному сериализуются блокировкой его строки, поэтому из одновременных
+        одобрений разных заявок проходит только одно. Возвращает False, если заявки нет,
+        она уже обработана или животное усыновлено по другой заявке.
+        """
+        with self.db_connector.transaction(connection) as connection:
             cursor = connection.cursor()
+            # животное заявки не меняется, поэтому его можно узнать без блокировки
+            cursor.execute("SELECT animal_id FROM adoptions WHERE id = %s", (adoption_id,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.close()
+                return False
+            animal_id = row[0]
+
+            # сначала животное, затем заявки: одинаковый порядок блокировок у всех решений
+            cursor.execute("SELECT status FROM animals WHERE id = %s FOR UPDATE", (animal_id,))
+            row = cursor.fetchone()
+            if row is None or (status == 'accepted' and row[0] == 'adopted'):
+                cursor.close()
+                return False
+
             cursor.execute("""
-                UPDATE adoptions SET status = %s WHERE id = %s
+                UPDATE adoptions SET status = %s, processed_at = NOW()
+                WHERE id = %s AND status = 'pending'
             """, (status, adoption_id))
+            if cursor.rowcount == 0:
+                cursor.close()
+                return False
 
             if status == 'accepted':
                 cursor.execute("""
-                    UPDATE animals SET status = 'adopted'
-                    WHERE id = (SELECT animal_id FROM adoptions WHERE id = %s)
-                """, (adoption_id,))
+                    UPDATE animals SET status = 'adopted', revision = revision + 1
+                    WHERE id = %s
+                """, (animal_id,))
 
                 cursor.execute("""
-                    UPDATE adoptions SET status = 'rejected_adopted'
-                    WHERE animal_id = (SELECT animal_id FROM adoptions WHERE id = %s)
-                    AND id != %s
-                """, (adoption_id, adoption_id))
-            
-            connection.commit()
+                    UPDATE adoptions SET status = 'rejected_adopted', processed_at = NOW()
+                    WHERE animal_id = %s AND status = 'pending'
+                """, (animal_id,))
+                self.db_connector.after_commit(connection, invalidate_status_counts)
+            else:
+                # список заявок показывается на странице животного
+                cursor.execute("""
+                    UPDATE animals SET revision = revision + 1 WHERE id = %s
+                """, (animal_id,))
             cursor.close()
-        except Exception as e:
-            connection.rollback()
-            raise e
-        finally:
-            connection.close()
+            self.db_connector.after_commit(connection, invalidate_adoption_counts)
+            self.db_connector.after_commit(connection, lambda: invalidate_animal(animal_id))
+        return True
 
     def get_by_animal_id(self, animal_id):
-        with self.db_connector.connect().cursor(dictionary=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(prepared=True, dictionary=True) as cursor:
             cursor.execute("""
                 SELECT a.*, u.first_name, u.last_name, u.middle_name, u.username
                 FROM adoptions a
@@ -81,7 +164,7 @@ class AdoptionRepository:
             return cursor.fetchall()
 
     def get_by_user_id(self, user_id):
-        with self.db_connector.connect().cursor(dictionary=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(dictionary=True) as cursor:
             cursor.execute("""
                 SELECT a.*, an.name as animal_name
                 FROM adoptions a
@@ -91,19 +174,62 @@ class AdoptionRepository:
             """, (user_id,))
             return cursor.fetchall()
 
-    def get_pending_requests(self):
-        with self.db_connector.connect().cursor(named_tuple=True) as cursor:
-            cursor.execute("""
-                SELECT a.*, u.username, an.name as animal_name
-                FROM adoptions a
-                JOIN users u ON a.user_id = u.id
-                JOIN animals an ON a.animal_id = an.id
-                WHERE a.status = 'pending'
-            """)
-            return cursor.fetchall()
+    def get_queue(self, status='pending', animal_id=None, created_before=None, created_after=None,
+                  cursor=None, limit=20):
+        """Очередь модерации: заявки со статусом status, начиная с самых старых.
+
+        Страницы выбираются по курсору (created_at, id) из индекса idx_adoptions_queue,
+        поэтому стоимость запроса не зависит от длины очереди.
+        """
+        query = """
+            SELECT a.*, u.username, u.first_name, u.last_name, u.middle_name, an.name as animal_name
+            FROM adoptions a
+            JOIN users u ON a.user_id = u.id
+            JOIN animals an ON a.animal_id = an.id
+            WHERE a.status = %s
+        """
+        params = [status]
+
+        if animal_id:
+            query += " AND a.animal_id = %s"
+            params.append(animal_id)
+
+        if created_before:
+            query += " AND a.created_at < %s"
+            params.append(created_before)
+
+        if created_after:
+            query += " AND a.created_at >= %s"
+            params.append(created_after)
+
+        position = decode_cursor(cursor)
+        if position:
+            created_at, last_id = position
+            query += " AND (a.created_at > %s OR (a.created_at = %s AND a.id > %s))"
+            params.extend([created_at, created_at, last_id])
+
+        query += " ORDER BY a.created_at, a.id LIMIT %s"
+        params.append(limit)
+
+        with self.db_connector.connect(readonly=True).cursor(prepared=True, dictionary=True) as db_cursor:
+            db_cursor.execute(query, params)
+            return db_cursor.fetchall()
+
+    def get_status_counts(self):
+        counts = adoption_counts_cache.get('counts')
+        if counts is not None:
+            return counts
+        # поколение фиксируется до запроса, чтобы сброс во время подсчёта не перезаписался старыми данными
+        generations = adoption_counts_cache.generations(())
+        with self.db_connector.connect(readonly=True).cursor() as cursor:
+            cursor.execute("SELECT status, COUNT(*) FROM adoptions GROUP BY status")
+            counts = dict.fromkeys(STATUSES, 0)
+            counts.update((status, total) for status, total in cursor.fetchall())
+        adoption_counts_cache.set('counts', counts, generations=generations)
+        return counts
 
     def get_user_requests(self, user_id):
-        with self.db_connector.connect().cursor(named_tuple=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(named_tuple=True) as cursor:
             cursor.execute("""
                 SELECT a.*, an.name as animal_name, an.status as animal_status
                 FROM adoptions a
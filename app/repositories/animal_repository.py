@@ -1,125 +1,174 @@
+from app import pagination
+from app.cache import TaggedCache, invalidate_adoption_counts
 from app.db import db
+from app.markdown_renderer import RENDERER_VERSION, render_markdown
+from app.page_cache import invalidate_all, invalidate_animal
+from app.search import build_boolean_query, build_search_text
 from flask import current_app
 
+# количество животных по статусам, сбрасывается при любом изменении animals
+status_counts_cache = TaggedCache(maxsize=1, ttl=60, name='status_counts')
+
+
+def invalidate_status_counts():
+    status_counts_cache.clear()
+
+
+def encode_cursor(animal):
+    # список отсортирован по is_available, затем по (created_at, id)
+    return pagination.encode_cursor(animal, int(animal['is_available']))
+
+
+def decode_cursor(token):
+    return pagination.decode_cursor(token, leading=1)
+
+
 class AnimalRepository:
     def __init__(self, db_connector):
         self.db = db_connector
 
-    def create(self, animal_data):
-        connection = self.db.connect()
-        try:
+    def create(self, animal_data, connection=None):
+        with self.db.transaction(connection) as connection:
             cursor = connection.cursor()
             cursor.execute("""
-                INSERT INTO animals (name, description, age_months, breed, gender, status)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                INSERT INTO animals (name, description, age_months, breed, gender, status, search_text,
+                                     description_html, description_html_version)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (
                 animal_data['name'],
                 animal_data.get('description', ''),
                 animal_data['age_months'],
                 animal_data['breed'],
                 animal_data['gender'],
-                animal_data.get('status', 'available')
+                animal_data.get('status', 'available'),
+                build_search_text(animal_data),
+                render_markdown(animal_data.get('description', '')),
+                RENDERER_VERSION
             ))
-            connection.commit()
             animal_id = cursor.lastrowid
             cursor.close()
-            return animal_id
-        except Exception as e:
-            connection.rollback()
-            raise e
-        finally:
-            connection.close()
+            self.db.after_commit(connection, invalidate_status_counts)
+            self.db.after_commit(connection, invalidate_animal)
+        return animal_id
 
     def get_by_id(self, animal_id):
-        cursor = self.db.connect().cursor(dictionary=True)
+        cursor = self.db.connect(readonly=True).cursor(prepared=True, dictionary=True)
         cursor.execute("""
-            SELECT a.*, 
-                   COUNT(DISTINCT ad.id) as adoption_count,
-                   (SELECT filename FROM animal_photos WHERE animal_id = a.id LIMIT 1) as photo_filename
+            SELECT a.*, a.primary_photo_filename as photo_filename
             FROM animals a
-            LEFT JOIN adoptions ad ON a.id = ad.animal_id
             WHERE a.id = %s
-            GROUP BY a.id
         """, (animal_id,))
         animal = cursor.fetchone()
         cursor.close()
         return animal
 
-    def get_paginated(self, page=1, sort_by='created_at', sort_order='desc', status=None):
-        per_page = 6
-        offset = (page - 1) * per_page
+    def get_version(self, animal_id):
+        with self.db.connect(readonly=True).cursor(prepared=True, dictionary=True) as cursor:
+            cursor.execute("SELECT revision FROM animals WHERE id = %s", (animal_id,))
+            return cursor.fetchone()
+
+    def get_paginated(self, page=1, sort_by='created_at', sort_order='desc', status=None, cursor=None, per_page=6):
         query = """
             SELECT 
                 a.*,
-                (SELECT filename FROM animal_photos WHERE animal_id = a.id LIMIT 1) as photo_filename,
-                (SELECT COUNT(*) FROM adoptions WHERE animal_id = a.id) as adoptions_count
+                a.primary_photo_filename as photo_filename,
+                a.adoption_count as adoptions_count
             FROM animals a
             WHERE 1=1
         """
+        params = []
 
         if status:
             query += " AND a.status = %s"
+            params.append(status)
+
+        # курсор работает только для сортировки по умолчанию, иначе обычный OFFSET
+        position = decode_cursor(cursor) if sort_by == 'created_at' else None
+        if position:
+            is_available, created_at, last_id = position
+            query += """
+                AND (a.is_available < %s
+                     OR (a.is_available = %s AND (a.created_at < %s
+                         OR (a.created_at = %s AND a.id < %s))))
+            """
+            params.extend([is_available, is_available, created_at, created_at, last_id])
 
         if sort_by == 'created_at':
-            query += " ORDER BY a.status = 'available' DESC, a.created_at DESC"
+            query += " ORDER BY a.is_available DESC, a.created_at DESC, a.id DESC"
         else:
-            query += f" ORDER BY a.status = 'available' DESC, a.{sort_by} {sort_order}"
+            query += f" ORDER BY a.is_available DESC, a.{sort_by} {sort_order}"
 
-        query += " LIMIT %s OFFSET %s"
-
-        params = []
-        if status:
-            params.append(status)
-        params.extend([per_page, offset])
+        if position:
+            query += " LIMIT %s"
+            params.append(per_page)
+        else:
+            query += " LIMIT %s OFFSET %s"
+            params.extend([per_page, (page - 1) * per_page])
         
         try:
-            connection = self.db.connect()
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(query, params)
-            animals = cursor.fetchall()
-            cursor.close()
+            connection = self.db.connect(readonly=True)
+            db_cursor = connection.cursor(prepared=True, dictionary=True)
+            db_cursor.execute(query, params)
+            animals = db_cursor.fetchall()
+            db_cursor.close()
             connection.close()
             return animals
         except Exception as e:
             current_app.logger.error(f"Error getting paginated animals: {str(e)}")
             return []
 
+    def get_page(self, page=1, status=None, cursor=None):
+        animals = self.get_paginated(page, status=status, cursor=cursor)
+        return animals, self.get_total_count(status)
+
+    def get_status_counts(self):
+        counts = status_counts_cache.get('counts')
+        if counts is not None:
+            return counts
+        # поколение фиксируется до запроса, чтобы сброс во время подсчёта не перезаписался старыми данными
+        generations = status_counts_cache.generations(())
+        connection = self.db.connect(readonly=True)
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT status, COUNT(*) as total FROM animals GROUP BY status")
+        counts = {row['status']: row['total'] for row in cursor.fetchall()}
+        cursor.close()
+        connection.close()
+        status_counts_cache.set('counts', counts, generations=generations)
+        return counts
+
     def get_total_count(self, status=None):
-        query = "SELECT COUNT(*) as total FROM animals"
-        params = []
-        
-        if status:
-            query += " WHERE status = %s"
-            params.append(status)
-            
         try:
-            connection = self.db.connect()
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute(query, params)
-            result = cursor.fetchone()
-            cursor.close()
-            connection.close()
-            return result['total'] if result else 0
+            counts = self.get_status_counts()
         except Exception as e:
             current_app.logger.error(f"Error getting total count: {str(e)}")
             return 0
+        if status:
+            return counts.get(status, 0)
+        return sum(counts.values())
 
-    def search(self, query=None, status=None, gender=None, breed=None):
-        cursor = self.db.connect().cursor(dictionary=True)
-        
-        sql = """
-            SELECT a.*, 
-                   COUNT(DISTINCT ad.id) as adoption_count,
-                   (SELECT filename FROM animal_photos WHERE animal_id = a.id LIMIT 1) as photo_filename
-            FROM animals a
-            LEFT JOIN adoptions ad ON a.id = ad.animal_id
-            WHERE 1=1
-        """
-        params = []
+    def search(self, query=None, status=None, gender=None, breed=None, page=1, per_page=20):
+        cursor = self.db.connect(readonly=True).cursor(dictionary=True)
+        boolean_query = build_boolean_query(query)
         
-        if query:
-            sql += " AND (a.name LIKE %s OR a.breed LIKE %s)"
-            params.extend([f"%{query}%", f"%{query}%"])
+        if boolean_query:
+            sql = """
+                SELECT a.*, a.primary_photo_filename as photo_filename,
+                       MATCH(a.search_text) AGAINST (%s IN BOOLEAN MODE) as relevance
+                FROM animals a
+                WHERE MATCH(a.search_text) AGAINST (%s IN BOOLEAN MODE)
+            """
+            params = [boolean_query, boolean_query]
+        else:
+            sql = """
+                SELECT a.*, a.primary_photo_filename as photo_filename
+                FROM animals a
+                WHERE 1=1
+            """
+            params = []
+            # слишком короткий запрос в полнотекстовый индекс не попадает
+            if query and query.strip():
+                sql += " AND (a.name LIKE %s OR a.breed LIKE %s)"
+                params.extend([f"{query.strip()}%", f"{query.strip()}%"])
         
         if status:
             sql += " AND a.status = %s"
@@ -132,8 +181,13 @@ class AnimalRepository:
         if breed:
             sql += " AND a.breed = %s"
             params.append(breed)
-            
-        sql += " GROUP BY a.id"
+
+        if boolean_query:
+            sql += " ORDER BY relevance DESC, a.id DESC"
+        else:
+            sql += " ORDER BY a.is_available DESC, a.created_at DESC, a.id DESC"
+        sql += " LIMIT %s OFFSET %s"
+        params.extend([per_page, (page - 1) * per_page])
         
         cursor.execute(sql, params)
         animals = cursor.fetchall()
@@ -141,42 +195,139 @@ class AnimalRepository:
         return animals
 
     def update(self, animal_id, animal_data, connection=None):
-        own_connection = False
-        if connection is None:
-            connection = self.db.connect()
-            own_connection = True
-        cursor = connection.cursor()
-        cursor.execute("""
-            UPDATE animals
-            SET name = %s,
-                description = %s,
-                age_months = %s,
-                breed = %s,
-                gender = %s,
-                status = %s
-            WHERE id = %s
-        """, (
-            animal_data['name'],
-            animal_data.get('description', ''),
-            animal_data['age_months'],
-            animal_data['breed'],
-            animal_data['gender'],
-            animal_data.get('status', 'available'),
-            animal_id
-        ))
-        if own_connection:
-            connection.commit()
-        cursor.close()
+        with self.db.transaction(connection) as connection:
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE animals
+                SET name = %s,
+                    description = %s,
+                    age_months = %s,
+                    breed = %s,
+                    gender = %s,
+                    status = %s,
+                    search_text = %s,
+                    description_html = %s,
+                    description_html_version = %s,
+                    revision = revision + 1
+                WHERE id = %s
+            """, (
+                animal_data['name'],
+                animal_data.get('description', ''),
+                animal_data['age_months'],
+                animal_data['breed'],
+                animal_data['gender'],
+                animal_data.get('status', 'available'),
+                build_search_text(animal_data),
+                render_markdown(animal_data.get('description', '')),
+                RENDERER_VERSION,
+                animal_id
+            ))
+            cursor.close()
+            self.db.after_commit(connection, invalidate_status_counts)
+            self.db.after_commit(connection, lambda: invalidate_animal(animal_id))
 
-    def delete(self, animal_id):
-        connection = self.db.connect()
-        try:
+    def delete(self, animal_id, connection=None):
+        # заявки и фотографии удаляются каскадно; возвращаются файлы, на которые больше нет ссылок
+        with self.db.transaction(connection) as connection:
             cursor = connection.cursor()
+            cursor.execute("""
+                SELECT filename, variant_widths FROM animal_photos WHERE animal_id = %s
+            """, (animal_id,))
+            photos = dict(cursor.fetchall())
             cursor.execute("DELETE FROM animals WHERE id = %s", (animal_id,))
-            connection.commit()
+            if photos:
+                placeholders = ', '.join(['%s'] * len(photos))
+                cursor.execute(f"""
+                    SELECT DISTINCT filename FROM animal_photos WHERE filename IN ({placeholders})
+                """, tuple(photos))
+                for (filename,) in cursor.fetchall():
+                    photos.pop(filename, None)
+            cursor.close()
+            self.db.after_commit(connection, invalidate_status_counts)
+            self.db.after_commit(connection, invalidate_adoption_counts)
+            self.db.after_commit(connection, lambda: invalidate_animal(animal_id))
+        return list(photos.items())
+
+    def repair_denormalized(self):
+        with self.db.transaction() as connection:
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE animals a
+                SET primary_photo_filename = (
+                        SELECT p.filename FROM animal_photos p
+                        WHERE p.animal_id = a.id ORDER BY p.id LIMIT 1),
+                    primary_photo_variants = (
+                        SELECT p.variant_widths FROM animal_photos p
+                        WHERE p.animal_id = a.id ORDER BY p.id LIMIT 1),
+                    adoption_count = (
+                        SELECT COUNT(*) FROM adoptions ad WHERE ad.animal_id = a.id),
+                    revision = revision + 1
+            """)
+            repaired = cursor.rowcount
             cursor.close()
+            self.db.after_commit(connection, invalidate_all)
+        return repaired
+
+    def reindex_search(self, batch_size=500):
+        connection = self.db.connect()
+        try:
+            read_cursor = connection.cursor(dictionary=True)
+            write_cursor = connection.cursor()
+            last_id = 0
+            reindexed = 0
+            while True:
+                read_cursor.execute("""
+                    SELECT id, name, breed, description FROM animals
+                    WHERE id > %s ORDER BY id LIMIT %s
+                """, (last_id, batch_size))
+                rows = read_cursor.fetchall()
+                if not rows:
+                    break
+                write_cursor.executemany(
+                    "UPDATE animals SET search_text = %s WHERE id = %s",
+                    [(build_search_text(row), row['id']) for row in rows]
+                )
+                connection.commit()
+                reindexed += len(rows)
+                last_id = rows[-1]['id']
+            read_cursor.close()
+            write_cursor.close()
+            return reindexed
         except Exception as e:
             connection.rollback()
             raise e
         finally:
-            connection.close()
\ No newline at end of file
+            connection.close()
+
+    def rerender_descriptions(self, batch_size=200):
+        connection = self.db.connect()
+        try:
+            read_cursor = connection.cursor(dictionary=True)
+            write_cursor = connection.cursor()
+            last_id = 0
+            rendered = 0
+            while True:
+                read_cursor.execute("""
+                    SELECT id, description FROM animals
+                    WHERE id > %s AND description_html_version < %s
+                    ORDER BY id LIMIT %s
+                """, (last_id, RENDERER_VERSION, batch_size))
+                rows = read_cursor.fetchall()
+                if not rows:
+                    break
+                write_cursor.executemany("""
+                    UPDATE animals SET description_html = %s, description_html_version = %s, revision = revision + 1
+                    WHERE id = %s
+                """, [(render_markdown(row['description']), RENDERER_VERSION, row['id']) for row in rows])
+                connection.commit()
+                rendered += len(rows)
+                last_id = rows[-1]['id']
+            read_cursor.close()
+            write_cursor.close()
+            invalidate_all()
+            return rendered
+        except Exception as e:
+            connection.rollback()
+            raise e
+        finally:
+            connection.close()
@@ -1,50 +1,155 @@
+from app.page_cache import invalidate_all, invalidate_animal
+
+
 class PhotoRepository:
     def __init__(self, db_connector):
         self.db_connector = db_connector
 
-    def create(self, photo_data):
-        connection = self.db_connector.connect()
-        try:
+    def create(self, photo_data, connection=None):
+        with self.db_connector.transaction(connection) as connection:
             cursor = connection.cursor()
             cursor.execute("""
-                INSERT INTO animal_photos (animal_id, filename, mime_type)
-                VALUES (%s, %s, %s)
-            """, (photo_data['animal_id'], photo_data['filename'], photo_data.get('mime_type', 'image/jpeg')))
-            connection.commit()
+                INSERT INTO animal_photos (animal_id, filename, mime_type, content_hash)
+                VALUES (%s, %s, %s, %s)
+            """, (
+                photo_data['animal_id'],
+                photo_data['filename'],
+                photo_data.get('mime_type', 'image/jpeg'),
+                photo_data.get('content_hash')
+            ))
             photo_id = cursor.lastrowid
+            # первое загруженное фото становится основным
+            cursor.execute("""
+                UPDATE animals SET primary_photo_filename = COALESCE(primary_photo_filename, %s),
+                    revision = revision + 1
+                WHERE id = %s
+            """, (photo_data['filename'], photo_data['animal_id']))
+            cursor.close()
+            self.db_connector.after_commit(connection, lambda: invalidate_animal(photo_data['animal_id']))
+        return photo_id
+
+    def create_many(self, animal_id, photos, connection=None):
+        if not photos:
+            return []
+        with self.db_connector.transaction(connection) as connection:
+            cursor = connection.cursor()
+            placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(photos))
+            params = []
+            for photo in photos:
+                params.extend((
+                    animal_id,
+                    photo['filename'],
+                    photo.get('mime_type', 'image/jpeg'),
+                    photo.get('content_hash')
+                ))
+            # id не обязаны идти подряд (innodb_autoinc_lock_mode=2, auto_increment_increment > 1),
+            # поэтому они возвращаются самим INSERT в порядке строк VALUES
+            cursor.execute(f"""
+                INSERT INTO animal_photos (animal_id, filename, mime_type, content_hash)
+                VALUES {placeholders}
+                RETURNING id
+            """, tuple(params))
+            photo_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("""
+                UPDATE animals SET primary_photo_filename = COALESCE(primary_photo_filename, %s),
+                    revision = revision + 1
+                WHERE id = %s
+            """, (photos[0]['filename'], animal_id))
             cursor.close()
-            return photo_id
-        except Exception as e:
-            connection.rollback()
-            raise e
-        finally:
-            connection.close()
+            self.db_connector.after_commit(connection, lambda: invalidate_animal(animal_id))
+        return photo_ids
 
     def get_by_animal_id(self, animal_id):
-        with self.db_connector.connect().cursor(dictionary=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(prepared=True, dictionary=True) as cursor:
             cursor.execute("""
-                SELECT * FROM animal_photos WHERE animal_id = %s
+                SELECT * FROM animal_photos WHERE animal_id = %s ORDER BY id
             """, (animal_id,))
             return cursor.fetchall()
 
     def get_by_animal(self, animal_id):
-        with self.db_connector.connect().cursor(named_tuple=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(named_tuple=True) as cursor:
             cursor.execute("""
-                SELECT * FROM animal_photos WHERE animal_id = %s
+                SELECT * FROM animal_photos WHERE animal_id = %s ORDER BY id
             """, (animal_id,))
             return cursor.fetchall()
 
-    def delete(self, photo_id):
-        connection = self.db_connector.connect()
-        try:
+    def delete(self, photo_id, connection=None):
+        with self.db_connector.transaction(connection) as connection:
             cursor = connection.cursor()
+            cursor.execute("SELECT animal_id FROM animal_photos WHERE id = %s", (photo_id,))
+            row = cursor.fetchone()
             cursor.execute("DELETE FROM animal_photos WHERE id = %s", (photo_id,))
-            connection.commit()
             result = cursor.rowcount > 0
+            if row:
+                cursor.execute("""
+                    UPDATE animals SET
+                        primary_photo_filename = (
+                            SELECT filename FROM animal_photos WHERE animal_id = %s ORDER BY id LIMIT 1),
+                        primary_photo_variants = (
+                            SELECT variant_widths FROM animal_photos WHERE animal_id = %s ORDER BY id LIMIT 1),
+                        revision = revision + 1
+                    WHERE id = %s
+                """, (row[0], row[0], row[0]))
+                self.db_connector.after_commit(connection, lambda: invalidate_animal(row[0]))
+            cursor.close()
+        return result
+
+    def set_variants(self, photo_id, variants, connection=None):
+        with self.db_connector.transaction(connection) as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT animal_id FROM animal_photos WHERE id = %s", (photo_id,))
+            row = cursor.fetchone()
+            cursor.execute("UPDATE animal_photos SET variant_widths = %s WHERE id = %s", (variants, photo_id))
+            cursor.execute("""
+                UPDATE animals a
+                JOIN animal_photos p ON p.animal_id = a.id
+                SET a.primary_photo_variants = IF(p.filename = a.primary_photo_filename, %s, a.primary_photo_variants),
+                    a.revision = a.revision + 1
+                WHERE p.id = %s
+            """, (variants, photo_id))
+            cursor.close()
+            if row:
+                self.db_connector.after_commit(connection, lambda: invalidate_animal(row[0]))
+
+    def get_referenced(self, filenames):
+        if not filenames:
+            return set()
+        placeholders = ', '.join(['%s'] * len(filenames))
+        # с основного сервера: реплика может ещё не получить только что сохранённую ссылку
+        with self.db_connector.connect().cursor() as cursor:
+            cursor.execute(f"""
+                SELECT DISTINCT filename FROM animal_photos WHERE filename IN ({placeholders})
+            """, tuple(filenames))
+            return {row[0] for row in cursor.fetchall()}
+
+    def get_without_variants(self, after_id=0, limit=500):
+        with self.db_connector.connect().cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                SELECT id, filename FROM animal_photos
+                WHERE variant_widths IS NULL AND id > %s ORDER BY id LIMIT %s
+            """, (after_id, limit))
+            return cursor.fetchall()
+
+    def get_unhashed_filenames(self, after='', limit=500):
+        with self.db_connector.connect().cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT filename FROM animal_photos
+                WHERE content_hash IS NULL AND filename > %s ORDER BY filename LIMIT %s
+            """, (after, limit))
+            return [row[0] for row in cursor.fetchall()]
+
+    def relocate(self, old_filename, new_filename, content_hash, connection=None):
+        with self.db_connector.transaction(connection) as connection:
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE animal_photos SET filename = %s, content_hash = %s
+                WHERE filename = %s AND content_hash IS NULL
+            """, (new_filename, content_hash, old_filename))
+            cursor.execute("""
+                UPDATE animals
+                SET primary_photo_filename = IF(primary_photo_filename = %s, %s, primary_photo_filename),
+                    revision = revision + 1
+                WHERE id IN (SELECT animal_id FROM animal_photos WHERE filename = %s)
+            """, (old_filename, new_filename, new_filename))
             cursor.close()
-            return result
-        except Exception as e:
-            connection.rollback()
-            raise e
-        finally:
-            connection.close()
\ No newline at end of file
+            self.db_connector.after_commit(connection, invalidate_all)
@@ -1,9 +1,18 @@
+from flask import current_app
+
+from app.cache import TaggedCache, invalidate_adoption_counts
+from app.page_cache import invalidate_animal
+
+# пользователи для Flask-Login, сбрасываются при изменении записи
+user_cache = TaggedCache(maxsize=1024, ttl=60, name='users')
+
+
 class UserRepository:
     def __init__(self, db_connector):
         self.db_connector = db_connector
 
     def get_by_id(self, user_id):
-        with self.db_connector.connect().cursor(named_tuple=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(prepared=True, named_tuple=True) as cursor:
             cursor.execute("""
                 SELECT users.*, roles.name as role_name 
                 FROM users 
@@ -12,8 +21,28 @@ class UserRepository:
             """, (user_id,))
             return cursor.fetchone()
 
+    def get_principal(self, user_id):
+        key = str(user_id)
+        user = user_cache.get(key)
+        if user is not None:
+            return user
+        # поколение фиксируется до запроса: смена роли во время чтения не должна закэшировать старую строку
+        generations = user_cache.generations((key,))
+        with self.db_connector.connect(readonly=True).cursor(prepared=True, named_tuple=True) as cursor:
+            cursor.execute("""
+                SELECT users.id, users.username, users.first_name, users.last_name,
+                       users.middle_name, roles.name as role_name
+                FROM users 
+                LEFT JOIN roles ON users.role_id = roles.id 
+                WHERE users.id = %s
+            """, (user_id,))
+            user = cursor.fetchone()
+        if user is not None:
+            user_cache.set(key, user, ttl=current_app.config.get('USER_CACHE_TTL', 60), generations=generations)
+        return user
+
     def get_by_username(self, username):
-        with self.db_connector.connect().cursor(named_tuple=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(prepared=True, named_tuple=True) as cursor:
             cursor.execute("""
                 SELECT users.*, roles.name as role_name 
                 FROM users 
@@ -23,7 +52,7 @@ class UserRepository:
             return cursor.fetchone()
 
     def get_by_credentials(self, username, password_hash):
-        with self.db_connector.connect().cursor(named_tuple=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(prepared=True, named_tuple=True) as cursor:
             cursor.execute("""
                 SELECT users.*, roles.name as role_name 
                 FROM users 
@@ -32,44 +61,66 @@ class UserRepository:
             """, (username, password_hash))
             return cursor.fetchone()
 
-    def create(self, username, password_hash, first_name, last_name, middle_name=None, role_id=3):
-        connection = self.db_connector.connect()
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO users (username, password_hash, first_name, last_name, middle_name, role_id)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (username, password_hash, first_name, last_name, middle_name, role_id))
-            connection.commit()
-            return cursor.lastrowid
+    def create(self, username, password_hash, first_name, last_name, middle_name=None, role_id=3,
+               connection=None):
+        with self.db_connector.transaction(connection) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO users (username, password_hash, first_name, last_name, middle_name, role_id)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (username, password_hash, first_name, last_name, middle_name, role_id))
+                return cursor.lastrowid
 
-    def update(self, user_id, first_name, last_name, middle_name=None, role_id=None):
-        connection = self.db_connector.connect()
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                UPDATE users 
-                SET first_name = %s, last_name = %s, middle_name = %s, role_id = %s
-                WHERE id = %s
-            """, (first_name, last_name, middle_name, role_id, user_id))
-            connection.commit()
+    def update(self, user_id, first_name, last_name, middle_name=None, role_id=None, connection=None):
+        with self.db_connector.transaction(connection) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE users 
+                    SET first_name = %s, last_name = %s, middle_name = %s, role_id = %s
+                    WHERE id = %s
+                """, (first_name, last_name, middle_name, role_id, user_id))
+                # ФИО заявителя показывается в списке заявок на странице животного
+                cursor.execute("""
+                    UPDATE animals a JOIN adoptions ad ON ad.animal_id = a.id
+                    SET a.revision = a.revision + 1
+                    WHERE ad.user_id = %s
+                """, (user_id,))
+            self.db_connector.after_commit(connection, lambda: user_cache.invalidate(str(user_id)))
 
-    def update_password(self, user_id, password_hash):
-        connection = self.db_connector.connect()
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                UPDATE users 
-                SET password_hash = %s
-                WHERE id = %s
-            """, (password_hash, user_id))
-            connection.commit()
+    def update_password(self, user_id, password_hash, connection=None):
+        with self.db_connector.transaction(connection) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE users 
+                    SET password_hash = %s
+                    WHERE id = %s
+                """, (password_hash, user_id))
+            self.db_connector.after_commit(connection, lambda: user_cache.invalidate(str(user_id)))
 
-    def delete(self, user_id):
-        connection = self.db_connector.connect()
-        with connection.cursor() as cursor:
-            cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
-            connection.commit()
-            return cursor.rowcount > 0
+    def delete(self, user_id, connection=None):
+        with self.db_connector.transaction(connection) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT DISTINCT animal_id FROM adoptions WHERE user_id = %s", (user_id,))
+                animal_ids = [row[0] for row in cursor.fetchall()]
+                # заявки пользователя удаляются каскадно: счётчик заявок животных уменьшается в той же
+                # транзакции, а сами заявки пропадают со страницы животного
+                if animal_ids:
+                    cursor.execute("""
+                        UPDATE animals a
+                        JOIN (SELECT animal_id, COUNT(*) AS total FROM adoptions
+                              WHERE user_id = %s GROUP BY animal_id) ad ON ad.animal_id = a.id
+                        SET a.adoption_count = GREATEST(a.adoption_count - ad.total, 0),
+                            a.revision = a.revision + 1
+                    """, (user_id,))
+                cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+                deleted = cursor.rowcount > 0
+            self.db_connector.after_commit(connection, lambda: user_cache.invalidate(str(user_id)))
+            self.db_connector.after_commit(connection, invalidate_adoption_counts)
+            for animal_id in animal_ids:
+                self.db_connector.after_commit(connection, lambda animal_id=animal_id: invalidate_animal(animal_id))
+        return deleted
 
     def get_all_roles(self):
-        with self.db_connector.connect().cursor(named_tuple=True) as cursor:
+        with self.db_connector.connect(readonly=True).cursor(named_tuple=True) as cursor:
             cursor.execute("SELECT id, name FROM roles")
             return cursor.fetchall()
\ No newline at end of file
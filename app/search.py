@@ -0,0 +1,50 @@
+import re
+
+# innodb_ft_min_token_size по умолчанию 3 — более короткие слова индекс не хранит
+MIN_TOKEN_LENGTH = 3
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_REFLEXIVE = ('ся', 'сь')
+_ENDINGS = sorted({
+    # прилагательные и причастия
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом',
+    'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+    # глаголы
+    'ла', 'на', 'ете', 'йте', 'ли', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'ила', 'ыла',
+    'ена', 'ите', 'или', 'ыли', 'ил', 'ыл', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+    'ит', 'ены', 'ить', 'ыть', 'ишь',
+    # существительные
+    'а', 'ев', 'ов', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ий', 'й',
+    'иям', 'ям', 'ием', 'ам', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+}, key=len, reverse=True)
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    for ending in _REFLEXIVE:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_TOKEN_LENGTH:
+            word = word[:-len(ending)]
+            break
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_TOKEN_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [stem(word) for word in _WORD_RE.findall(text) if len(word) >= MIN_TOKEN_LENGTH]
+
+
+def build_search_text(animal_data):
+    # кличка повторяется дважды, чтобы совпадения по ней ранжировались выше
+    name = tokenize(animal_data.get('name'))
+    parts = name + name + tokenize(animal_data.get('breed')) + tokenize(animal_data.get('description'))
+    return ' '.join(parts)
+
+
+def build_boolean_query(query):
+    tokens = dict.fromkeys(tokenize(query))
+    return ' '.join(f'+{token}*' for token in tokens)
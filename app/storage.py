@@ -0,0 +1,133 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from werkzeug.utils import secure_filename
+
+try:
+    import fcntl
+except ImportError:  # не POSIX: блокировка хранилища действует только внутри процесса
+    fcntl = None
+
+CHUNK_SIZE = 64 * 1024
+INCOMING_DIR = '.incoming'
+LOCK_FILE = '.lock'
+
+_local_lock = threading.Lock()
+
+
+def sharded_filename(digest, extension):
+    return f'{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def file_extension(filename):
+    extension = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    return extension or '.jpg'
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def locked(upload_folder):
+    """Блокировка хранилища, общая для потоков и воркеров.
+
+    Под ней файл размещается в хранилище и удаляется файл без ссылок, поэтому загрузка
+    не может сослаться на файл, который в этот момент удаляют.
+    """
+    if fcntl is None:
+        with _local_lock:
+            yield
+        return
+    incoming = os.path.join(upload_folder, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+    with open(os.path.join(incoming, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def is_held(path):
+    # жёсткая ссылка загрузки, ещё не сохранившей запись в БД, увеличивает число ссылок на файл
+    try:
+        return os.stat(path).st_nlink > 1
+    except FileNotFoundError:
+        return False
+
+
+def _store(upload_folder, temp_path, digest, extension):
+    filename = sharded_filename(digest, extension)
+    target = os.path.join(upload_folder, filename)
+    with locked(upload_folder):
+        if os.path.exists(target):
+            # такой файл уже загружали — вторую копию не храним
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(temp_path, target)
+        # файл удерживается жёсткой ссылкой на месте временного, пока вызывающий не снимет её release()
+        os.link(target, temp_path)
+    return filename, temp_path
+
+
+def _temp_file(upload_folder):
+    incoming = os.path.join(upload_folder, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=incoming, delete=False)
+
+
+def save_upload(file_storage, upload_folder):
+    """Сохраняет загруженный файл и возвращает (filename, content_hash, hold).
+
+    hold удерживает файл от удаления, пока ссылка на него не сохранена в БД; после commit
+    или отката его снимает release().
+    """
+    digest = hashlib.sha256()
+    temp = _temp_file(upload_folder)
+    try:
+        with temp:
+            for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                temp.write(chunk)
+    except Exception:
+        remove_files([temp.name])
+        raise
+    content_hash = digest.hexdigest()
+    filename, hold = _store(upload_folder, temp.name, content_hash, file_extension(file_storage.filename))
+    return filename, content_hash, hold
+
+
+def import_file(path, upload_folder):
+    # копия, а не перенос: исходный файл удаляется только после обновления ссылок в БД
+    content_hash = hash_file(path)
+    temp = _temp_file(upload_folder)
+    try:
+        with temp, open(path, 'rb') as source:
+            shutil.copyfileobj(source, temp, CHUNK_SIZE)
+    except Exception:
+        remove_files([temp.name])
+        raise
+    filename, hold = _store(upload_folder, temp.name, content_hash, file_extension(path))
+    return filename, content_hash, hold
+
+
+def release(holds):
+    remove_files(holds)
+
+
+def remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
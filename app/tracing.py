@@ -0,0 +1,121 @@
+import re
+import time
+from collections import Counter
+
+from flask import current_app, g, request
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_PLACEHOLDER_RE = re.compile(r'%(?:\(\w+\))?s')
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_TUPLE_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_TUPLES_RE = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    if isinstance(statement, bytes):
+        statement = statement.decode('utf-8', 'replace')
+    statement = _STRING_RE.sub('?', statement)
+    statement = _PLACEHOLDER_RE.sub('?', statement)
+    statement = _NUMBER_RE.sub('?', statement)
+    statement = _TUPLE_RE.sub('(?)', statement)
+    statement = _TUPLES_RE.sub('(?)', statement)
+    return _SPACE_RE.sub(' ', statement).strip()
+
+
+class QueryTrace:
+    def __init__(self):
+        self.statements = []
+
+    def record(self, statement, duration, rows):
+        entry = {'statement': normalize_statement(statement), 'duration': duration, 'rows': rows}
+        self.statements.append(entry)
+        return entry
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def total_time(self):
+        return sum(entry['duration'] for entry in self.statements)
+
+    def repeated(self, threshold):
+        counts = Counter(entry['statement'] for entry in self.statements)
+        return [(statement, count) for statement, count in counts.items() if count >= threshold]
+
+    def slow(self, threshold):
+        return [entry for entry in self.statements if entry['duration'] >= threshold]
+
+
+class TracingCursor:
+    def __init__(self, cursor, trace):
+        self._cursor = cursor
+        self._trace = trace
+        self._entry = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._cursor.close()
+
+    def _timed(self, method, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            self._entry = self._trace.record(
+                operation, time.perf_counter() - started, self._cursor.rowcount
+            )
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, *args, **kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None and self._entry is not None:
+            self._entry['rows'] = max(self._entry['rows'], 0) + 1
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        if self._entry is not None:
+            self._entry['rows'] = len(rows)
+        return rows
+
+
+def init_app(app):
+    if not app.config.get('SQL_TRACE', False):
+        return
+
+    @app.before_request
+    def start_trace():
+        g.sql_trace = QueryTrace()
+
+    @app.after_request
+    def report_trace(response):
+        trace = g.pop('sql_trace', None)
+        if trace is None or not trace.count:
+            return response
+
+        total_ms = trace.total_time * 1000
+        response.headers.add('Server-Timing', f'db;dur={total_ms:.2f};desc="{trace.count} queries"')
+
+        logger = current_app.logger
+        for statement, count in trace.repeated(current_app.config.get('SQL_NPLUS1_THRESHOLD', 3)):
+            logger.warning(f"Possible N+1 in {request.endpoint}: {count}x {statement}")
+        for entry in trace.slow(current_app.config.get('SQL_SLOW_MS', 100) / 1000):
+            logger.warning(f"Slow query in {request.endpoint} "
+                           f"({entry['duration'] * 1000:.1f} ms, {entry['rows']} rows): {entry['statement']}")
+        logger.debug(f"{request.method} {request.path}: {trace.count} queries in {total_ms:.2f} ms")
+        return response
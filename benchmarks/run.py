@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк методов репозиториев на заполненной базе (см. benchmarks/seed.py).
+
+Пример: python -m benchmarks.run --iterations 200 --compare benchmarks/results/baseline.json
+Изменяющие методы (create, update, delete, ...) выполняются на отдельном соединении и откатываются.
+Исключение — сценарии --maintenance (repair_denormalized, reindex_search, rerender_descriptions):
+они проходят по всей таблице animals и фиксируют свои изменения, поэтому запускайте их только на базе
+для бенчмарков, а не на общей.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from flask import g
+from mysql.connector import IntegrityError
+
+from app import create_app, pagination
+from app.cache import invalidate_adoption_counts
+from app.repositories.animal_repository import encode_cursor, invalidate_status_counts
+from app.repositories.user_repository import user_cache
+from app.tracing import QueryTrace
+
+from benchmarks.seed import BREEDS, NAMES
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+@dataclass
+class Case:
+    name: str
+    fn: object
+    write: bool = False
+    iterations: int = None
+    maintenance: bool = False
+    # False — горячие запросы отправляются текстом, без серверных prepared statements
+    prepared: bool = True
+
+
+@contextmanager
+def rolled_back(db):
+    # соединение помечено как внешняя транзакция: репозитории не делают commit и не запускают after_commit
+    connection = db.get_pool().acquire()
+    connection.trace = g.get('sql_trace')
+    connection.in_unit_of_work = True
+    try:
+        yield connection
+    finally:
+        connection.rollback()
+        connection.after_commit_callbacks.clear()
+        connection.in_unit_of_work = False
+        connection.close()
+
+
+class Dataset:
+    """Случайная выборка существующих строк, из которой берутся параметры вызовов"""
+
+    def __init__(self, connection, rng, sample_size=500):
+        cursor = connection.cursor(dictionary=True)
+        self.counts = {}
+        self.samples = {}
+        queries = {
+            'animals': "SELECT id, is_available, created_at FROM animals",
+            'animal_photos': "SELECT id, animal_id, filename FROM animal_photos",
+            'adoptions': "SELECT id, animal_id, user_id FROM adoptions",
+            'users': "SELECT id, username, password_hash FROM users",
+        }
+        for table, query in queries.items():
+            cursor.execute(f"SELECT COUNT(*) AS total, MIN(id) AS low, MAX(id) AS high FROM {table}")
+            stats = cursor.fetchone()
+            self.counts[table] = stats['total']
+            start = rng.randint(stats['low'], stats['high']) if stats['total'] else 0
+            cursor.execute(f"{query} WHERE id >= %s ORDER BY id LIMIT %s", (start, sample_size))
+            rows = cursor.fetchall()
+            if len(rows) < sample_size:
+                cursor.execute(f"{query} ORDER BY id LIMIT %s", (sample_size,))
+                rows = cursor.fetchall()
+            if not rows:
+                raise SystemExit(f'Таблица {table} пуста, сначала запустите python -m benchmarks.seed')
+            self.samples[table] = rows
+        cursor.close()
+        self.rng = rng
+
+    def pick(self, table):
+        return self.rng.choice(self.samples[table])
+
+
+def build_cases(app, data):
+    animals = app.animal_repository
+    photos = app.photo_repository
+    adoptions = app.adoption_repository
+    users = app.user_repository
+    rng = data.rng
+
+    def animal_data():
+        return {'name': rng.choice(NAMES), 'description': 'Ласковый и **игривый**', 'age_months': 12,
+                'breed': rng.choice(BREEDS), 'gender': 'male', 'status': 'available'}
+
+    def photo_data(animal_id):
+        digest = uuid.uuid4().hex * 2
+        return {'animal_id': animal_id, 'filename': f'{digest[:2]}/{digest[2:4]}/{digest}.jpg',
+                'mime_type': 'image/jpeg', 'content_hash': digest}
+
+    def uncached_status_counts():
+        invalidate_status_counts()
+        return animals.get_status_counts()
+
+    def uncached_adoption_counts():
+        invalidate_adoption_counts()
+        return adoptions.get_status_counts()
+
+    def submit_adoption(connection):
+        try:
+            return adoptions.submit(data.pick('animals')['id'], data.pick('users')['id'], '+7 900 000 00 00',
+                                    idempotency_key=uuid.uuid4().hex, connection=connection)
+        except IntegrityError:
+            # случайная пара уже подала заявку; транзакция всё равно откатывается
+            return None
+
+    def adoption_pair():
+        adoption = data.pick('adoptions')
+        return adoptions.get_by_user_and_animal(adoption['user_id'], adoption['animal_id'])
+
+    def credentials():
+        user = data.pick('users')
+        return users.get_by_credentials(user['username'], user['password_hash'])
+
+    def uncached_principal():
+        user_cache.clear()
+        return users.get_principal(data.pick('users')['id'])
+
+    # запросы страниц целиком: сравнение prepared statements с текстовым протоколом
+    def listing_path():
+        # версия списка для ETag берётся из памяти, к БД идёт только сама страница
+        return animals.get_paginated(1)
+
+    def detail_path():
+        animal_id = data.pick('animals')['id']
+        animals.get_version(animal_id)
+        animals.get_by_id(animal_id)
+        photos.get_by_animal_id(animal_id)
+        return adoptions.get_by_animal_id(animal_id)
+
+    def login_path():
+        user = credentials()
+        user_cache.clear()
+        return users.get_principal(user.id)
+
+    return [
+        Case('animal.get_by_id', lambda: animals.get_by_id(data.pick('animals')['id'])),
+        Case('animal.get_version', lambda: animals.get_version(data.pick('animals')['id'])),
+        Case('animal.get_paginated[first]', lambda: animals.get_paginated(1)),
+        Case('animal.get_paginated[offset]', lambda: animals.get_paginated(rng.randint(100, 1000))),
+        Case('animal.get_paginated[cursor]',
+             lambda: animals.get_paginated(cursor=encode_cursor(data.pick('animals')))),
+        Case('animal.get_paginated[status]', lambda: animals.get_paginated(1, status='adoption')),
+        Case('animal.get_page', lambda: animals.get_page(1)),
+        Case('animal.get_status_counts[cached]', animals.get_status_counts),
+        Case('animal.get_status_counts[uncached]', uncached_status_counts, iterations=20),
+        Case('animal.get_total_count', lambda: animals.get_total_count('available')),
+        Case('animal.search[fulltext]', lambda: animals.search(rng.choice(NAMES))),
+        Case('animal.search[prefix]', lambda: animals.search(rng.choice(NAMES)[:2])),
+        Case('animal.search[filters]', lambda: animals.search(status='available', breed=rng.choice(BREEDS))),
+        Case('animal.create', lambda connection: animals.create(animal_data(), connection=connection),
+             write=True),
+        Case('animal.update', lambda connection: animals.update(
+            data.pick('animals')['id'], animal_data(), connection=connection), write=True),
+        Case('animal.delete', lambda connection: animals.delete(data.pick('animals')['id'], connection=connection),
+             write=True),
+        Case('animal.repair_denormalized', animals.repair_denormalized, iterations=1, maintenance=True),
+        Case('animal.reindex_search', animals.reindex_search, iterations=1, maintenance=True),
+        Case('animal.rerender_descriptions', animals.rerender_descriptions, iterations=1, maintenance=True),
+
+        Case('photo.get_by_animal_id', lambda: photos.get_by_animal_id(data.pick('animals')['id'])),
+        Case('photo.get_by_animal', lambda: photos.get_by_animal(data.pick('animals')['id'])),
+        Case('photo.get_without_variants', photos.get_without_variants, iterations=20),
+        Case('photo.get_unhashed_filenames', photos.get_unhashed_filenames, iterations=20),
+        Case('photo.create', lambda connection: photos.create(
+            photo_data(data.pick('animals')['id']), connection=connection), write=True),
+        Case('photo.create_many[5]', lambda connection: photos.create_many(
+            data.pick('animals')['id'],
+            [photo_data(None) for _ in range(5)], connection=connection), write=True),
+        Case('photo.delete', lambda connection: photos.delete(data.pick('animal_photos')['id'], connection=connection),
+             write=True),
+        Case('photo.set_variants', lambda connection: photos.set_variants(
+            data.pick('animal_photos')['id'], '320,640', connection=connection), write=True),
+        Case('photo.relocate', lambda connection: photos.relocate(
+            data.pick('animal_photos')['filename'], 'relocated.jpg', 'x' * 64, connection=connection), write=True),
+
+        Case('adoption.get_by_id', lambda: adoptions.get_by_id(data.pick('adoptions')['id'])),
+        Case('adoption.get_by_user_and_animal', adoption_pair),
+        Case('adoption.get_by_animal_id', lambda: adoptions.get_by_animal_id(data.pick('animals')['id'])),
+        Case('adoption.get_by_user_id', lambda: adoptions.get_by_user_id(data.pick('users')['id'])),
+        Case('adoption.get_user_requests', lambda: adoptions.get_user_requests(data.pick('users')['id'])),
+        Case('adoption.get_queue[first]', adoptions.get_queue),
+        Case('adoption.get_queue[cursor]', lambda: adoptions.get_queue(cursor=pagination.encode_cursor(
+            {'created_at': datetime.now() - timedelta(days=rng.randint(1, 365)), 'id': 0}))),
+        Case('adoption.get_queue[animal]', lambda: adoptions.get_queue(animal_id=data.pick('animals')['id'])),
+        Case('adoption.get_queue[age]', lambda: adoptions.get_queue(
+            created_before=datetime.now() - timedelta(days=30))),
+        Case('adoption.get_status_counts[uncached]', uncached_adoption_counts, iterations=20),
+        Case('adoption.submit', submit_adoption, write=True),
+        Case('adoption.update_status[rejected]', lambda connection: adoptions.update_status(
+            data.pick('adoptions')['id'], 'rejected', connection=connection), write=True),
+        Case('adoption.update_status[accepted]', lambda connection: adoptions.update_status(
+            data.pick('adoptions')['id'], 'accepted', connection=connection), write=True),
+
+        Case('user.get_by_id', lambda: users.get_by_id(data.pick('users')['id'])),
+        Case('user.get_principal[cached]', lambda: users.get_principal(data.pick('users')['id'])),
+        Case('user.get_principal[uncached]', uncached_principal),
+        Case('user.get_by_username', lambda: users.get_by_username(data.pick('users')['username'])),
+        Case('user.get_by_credentials', credentials),
+        Case('user.get_all_roles', users.get_all_roles),
+        Case('user.create', lambda connection: users.create(
+            f'bench_tmp_{uuid.uuid4().hex[:16]}', 'x', 'Иван', 'Иванов', connection=connection), write=True),
+        Case('user.update', lambda connection: users.update(
+            data.pick('users')['id'], 'Иван', 'Иванов', role_id=3, connection=connection), write=True),
+        Case('user.update_password', lambda connection: users.update_password(
+            data.pick('users')['id'], 'x', connection=connection), write=True),
+        Case('user.delete', lambda connection: users.delete(data.pick('users')['id'], connection=connection),
+             write=True),
+
+        Case('path.listing[prepared]', listing_path),
+        Case('path.listing[text]', listing_path, prepared=False),
+        Case('path.detail[prepared]', detail_path),
+        Case('path.detail[text]', detail_path, prepared=False),
+        Case('path.login[prepared]', login_path),
+        Case('path.login[text]', login_path, prepared=False),
+    ]
+
+
+def call(app, case):
+    if case.write:
+        with rolled_back(app.db) as connection:
+            started = time.perf_counter()
+            case.fn(connection)
+            return time.perf_counter() - started
+    started = time.perf_counter()
+    case.fn()
+    return time.perf_counter() - started
+
+
+def worker(app, case, iterations, durations, traces):
+    with app.app_context():
+        g.sql_trace = QueryTrace()
+        for _ in range(iterations):
+            durations.append(call(app, case))
+        traces.append(g.sql_trace)
+
+
+def percentile(values, p):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[p - 1]
+
+
+def measure(app, case, iterations, warmup, concurrency):
+    pool = app.db.get_pool()
+    statement_cache_size = pool.statement_cache_size
+    if not case.prepared:
+        pool.statement_cache_size = 0
+    try:
+        return _measure(app, case, iterations, warmup, concurrency)
+    finally:
+        pool.statement_cache_size = statement_cache_size
+
+
+def _measure(app, case, iterations, warmup, concurrency):
+    for _ in range(min(warmup, iterations)):
+        with app.app_context():
+            call(app, case)
+
+    durations, traces = [], []
+    per_thread = [iterations // concurrency + (1 if n < iterations % concurrency else 0)
+                  for n in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(app, case, count, durations, traces))
+               for count in per_thread if count]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    statements = sum(trace.count for trace in traces)
+    return {
+        'name': case.name,
+        'iterations': len(durations),
+        'p50_ms': percentile(durations, 50) * 1000,
+        'p95_ms': percentile(durations, 95) * 1000,
+        'p99_ms': percentile(durations, 99) * 1000,
+        'mean_ms': statistics.fmean(durations) * 1000,
+        'ops_per_sec': len(durations) / elapsed,
+        'queries_per_call': statements / len(durations),
+        'qps': statements / elapsed,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    previous = {result['name']: result for result in (baseline or {}).get('results', [])}
+    print(f"{'case':42} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'q/call':>7}")
+    for result in results:
+        line = (f"{result['name']:42} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['p99_ms']:9.2f} "
+                f"{result['ops_per_sec']:9.1f} {result['queries_per_call']:7.1f}")
+        old = previous.get(result['name'])
+        if old and old['p50_ms']:
+            line += f"  p50 {(result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100:+.1f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=1, help='потоков, вызывающих метод одновременно')
+    parser.add_argument('--only', help='регулярное выражение для имён сценариев')
+    parser.add_argument('--maintenance', action='store_true',
+                        help='запустить также обслуживающие методы; они проходят по всей таблице animals '
+                             'и фиксируют изменения (не запускать на общей базе)')
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--output', help='файл с результатами (по умолчанию benchmarks/results/<время>-<commit>.json)')
+    parser.add_argument('--compare', help='файл с результатами предыдущего запуска')
+    args = parser.parse_args(argv)
+
+    # каждому потоку нужно соединение контекста приложения и отдельное для откатываемых записей
+    app = create_app({'SQL_TRACE': False, 'DB_POOL_SIZE': 2 * args.concurrency + 1})
+    rng = random.Random(args.seed)
+    with app.app_context():
+        data = Dataset(app.db.connect(), rng)
+        cases = build_cases(app, data)
+
+    pattern = re.compile(args.only) if args.only else None
+    results = []
+    for case in cases:
+        if (case.maintenance and not args.maintenance) or (pattern and not pattern.search(case.name)):
+            continue
+        iterations = case.iterations or args.iterations
+        results.append(measure(app, case, iterations, args.warmup if iterations > 1 else 0,
+                               min(args.concurrency, iterations)))
+        print(f'{case.name}: {results[-1]["p50_ms"]:.2f} ms', file=sys.stderr)
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'dataset': data.counts,
+        'settings': {'iterations': args.iterations, 'warmup': args.warmup, 'concurrency': args.concurrency,
+                     'seed': args.seed},
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    print(f'\nрезультаты сохранены в {output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Заполнение базы синтетическими данными для бенчмарков.
+
+Пример: python -m benchmarks.seed --animals 100000 --photos 500000 --adoptions 1000000 --users 20000
+Параметры подключения берутся из MYSQL_HOST / MYSQL_USER / MYSQL_PASSWORD / MYSQL_DATABASE.
+Запускать только на отдельной базе: --truncate очищает животных, фотографии, заявки и пользователей bench_*
+и требует подтвердить имя базы: --truncate --confirm-database <MYSQL_DATABASE>.
+"""
+
+import argparse
+import hashlib
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.markdown_renderer import RENDERER_VERSION, render_markdown
+from app.search import build_search_text
+
+NAMES = ['Барон', 'Мурка', 'Снежок', 'Корж', 'Злата', 'Веня', 'Любава', 'Стасик', 'Гошка', 'Мэри',
+         'Рыжик', 'Тиша', 'Буся', 'Шарик', 'Дымка', 'Лаки', 'Марта', 'Персик', 'Соня', 'Граф']
+BREEDS = ['Лабрадор', 'Дворняжка', 'Сиамская', 'Британская', 'Овчарка', 'Хомяк', 'Мейн-кун',
+          'Такса', 'Шпиц', 'Бигль', 'Сфинкс', 'Корги']
+WORDS = ['ласковый', 'игривый', 'спокойный', 'приучен', 'к', 'лотку', 'любит', 'детей', 'гулять',
+         'здоров', 'привит', 'стерилизован', 'ищет', 'дом', 'активный', 'умный', 'добрый']
+FIRST_NAMES = ['Иван', 'Пётр', 'Анна', 'Мария', 'Ольга', 'Сергей', 'Алексей', 'Елена']
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Волков']
+
+ANIMAL_STATUSES = ['available'] * 6 + ['adoption'] * 3 + ['adopted']
+ADOPTION_STATUSES = ['pending'] * 5 + ['accepted', 'rejected', 'rejected_adopted']
+
+
+def insert_batches(connection, table, columns, rows, batch_size):
+    """Вставляет строки многострочными INSERT и возвращает id вставленных строк"""
+    cursor = connection.cursor()
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    ids = []
+    batch = []
+
+    def flush():
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([placeholders] * len(batch))} "
+            "RETURNING id",
+            [value for row in batch for value in row]
+        )
+        # id пакета не обязаны идти подряд (innodb_autoinc_lock_mode=2, auto_increment_increment > 1)
+        ids.extend(row[0] for row in cursor.fetchall())
+        connection.commit()
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    cursor.close()
+    return ids
+
+
+def truncate(connection):
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM adoptions")
+    cursor.execute("DELETE FROM animal_photos")
+    cursor.execute("DELETE FROM animals")
+    cursor.execute("DELETE FROM users WHERE username LIKE 'bench\\_%'")
+    connection.commit()
+    cursor.close()
+
+
+def generate_users(rng, count):
+    password_hash = hashlib.sha256(b'bench').hexdigest()
+    for n in range(count):
+        yield (f'bench_{n}', password_hash, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), None, 3)
+
+
+def generate_animals(rng, count, now):
+    for n in range(count):
+        animal = {
+            'name': rng.choice(NAMES),
+            'breed': rng.choice(BREEDS),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))),
+        }
+        created_at = now - timedelta(seconds=rng.randint(0, 3 * 365 * 24 * 3600))
+        yield (animal['name'], animal['description'], rng.randint(1, 180), animal['breed'],
+               rng.choice(['male', 'female']), rng.choice(ANIMAL_STATUSES), created_at,
+               build_search_text(animal), render_markdown(animal['description']), RENDERER_VERSION)
+
+
+def generate_photos(rng, count, animal_ids):
+    for n in range(count):
+        # у каждого животного есть хотя бы одна фотография, остальные распределяются случайно
+        animal_id = animal_ids[n] if n < len(animal_ids) else rng.choice(animal_ids)
+        digest = hashlib.sha256(f'bench-photo-{n}'.encode()).hexdigest()
+        filename = f'{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        yield (animal_id, filename, 'image/jpeg', digest, '320,640,1280' if rng.random() < 0.9 else None)
+
+
+def generate_adoptions(rng, count, animal_ids, user_ids, now):
+    # пары (пользователь, животное) не повторяются, пока заявок на животное меньше, чем пользователей
+    for n in range(count):
+        animal_index, round_number = n % len(animal_ids), n // len(animal_ids)
+        user_id = user_ids[(animal_index * 31 + round_number) % len(user_ids)]
+        created_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        yield (animal_ids[animal_index], user_id, f'+7 900 {rng.randint(0, 9999999):07d}',
+               rng.choice(ADOPTION_STATUSES), created_at)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--animals', type=int, default=100000)
+    parser.add_argument('--photos', type=int, default=500000)
+    parser.add_argument('--adoptions', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--truncate', action='store_true', help='очистить таблицы перед заполнением')
+    parser.add_argument('--confirm-database', metavar='NAME',
+                        help='имя базы, которую разрешено очистить с --truncate')
+    args = parser.parse_args(argv)
+
+    if args.photos and not args.animals:
+        parser.error('--photos требует хотя бы одного животного')
+    if args.adoptions > args.animals * args.users:
+        parser.error('--adoptions не может превышать animals * users')
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    with app.app_context():
+        connection = app.db.connect()
+        cursor = connection.cursor()
+        cursor.execute("SELECT DATABASE()")
+        database = cursor.fetchone()[0]
+        if args.truncate and args.confirm_database != database:
+            parser.error(f'--truncate удалит всех животных, фотографии и заявки в базе {database}; '
+                         f'если это база для бенчмарков, добавьте --confirm-database {database}')
+        # ссылки генерируются заведомо корректными, проверки внешних ключей только замедляют загрузку
+        cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        cursor.close()
+        if args.truncate:
+            truncate(connection)
+
+        started = time.perf_counter()
+        now = datetime.now().replace(microsecond=0)
+
+        user_ids = insert_batches(
+            connection, 'users',
+            ['username', 'password_hash', 'first_name', 'last_name', 'middle_name', 'role_id'],
+            generate_users(rng, args.users), args.batch_size)
+        print(f'users: {len(user_ids)}', file=sys.stderr)
+
+        animal_ids = insert_batches(
+            connection, 'animals',
+            ['name', 'description', 'age_months', 'breed', 'gender', 'status', 'created_at',
+             'search_text', 'description_html', 'description_html_version'],
+            generate_animals(rng, args.animals, now), args.batch_size)
+        print(f'animals: {len(animal_ids)}', file=sys.stderr)
+
+        photo_ids = insert_batches(
+            connection, 'animal_photos',
+            ['animal_id', 'filename', 'mime_type', 'content_hash', 'variant_widths'],
+            generate_photos(rng, args.photos, animal_ids), args.batch_size)
+        print(f'photos: {len(photo_ids)}', file=sys.stderr)
+
+        adoption_ids = insert_batches(
+            connection, 'adoptions',
+            ['animal_id', 'user_id', 'contact_info', 'status', 'created_at'],
+            generate_adoptions(rng, args.adoptions, animal_ids, user_ids, now), args.batch_size)
+        print(f'adoptions: {len(adoption_ids)}', file=sys.stderr)
+
+        repaired = app.animal_repository.repair_denormalized()
+        print(f'denormalized columns repaired: {repaired}', file=sys.stderr)
+        # repair_denormalized() фиксирует свою транзакцию и возвращает соединение в пул, берётся новое
+        cursor = app.db.connect().cursor()
+        cursor.execute("ANALYZE TABLE animals, animal_photos, adoptions, users")
+        cursor.fetchall()
+        cursor.close()
+
+    print(f'done in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка одобрения заявок: модераторы одновременно одобряют и отклоняют
+заявки на одних и тех же животных.
+
+Пример: python -m benchmarks.stress_approval --animals 20 --requests 8 --moderators 16 --rounds 3
+Для каждого раунда создаются временные животные, пользователи и заявки, после раунда они удаляются.
+Проверяется, что ни у одного животного нет двух одобренных заявок, и выводится пропускная способность.
+"""
+
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+
+from app import create_app
+
+from benchmarks.run import percentile
+
+
+class RetryCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.retries = 0
+
+    def emit(self, record):
+        if 'retrying after' in record.getMessage():
+            self.retries += 1
+
+
+def prepare(app, animals, requests):
+    prefix = f'bench_stress_{uuid.uuid4().hex[:8]}'
+    with app.app_context():
+        user_ids = [app.user_repository.create(f'{prefix}_{n}', 'x', 'Модератор', 'Нагрузочный')
+                    for n in range(requests)]
+        animal_ids = [app.animal_repository.create({
+            'name': f'{prefix}_{n}', 'description': '', 'age_months': 12, 'breed': 'Дворняга',
+            'gender': 'male', 'status': 'available'}) for n in range(animals)]
+        adoption_ids = [app.adoption_repository.create({
+            'animal_id': animal_id, 'user_id': user_id, 'contact_info': '+7 900 000 00 00'})
+            for animal_id in animal_ids for user_id in user_ids]
+    return user_ids, animal_ids, adoption_ids
+
+
+def cleanup(app, user_ids, animal_ids):
+    with app.app_context():
+        for animal_id in animal_ids:
+            app.animal_repository.delete(animal_id)
+        for user_id in user_ids:
+            app.user_repository.delete(user_id)
+
+
+def moderate(app, queue, lock, rng, durations, outcomes, errors):
+    with app.app_context():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                adoption_id = queue.pop()
+                status = 'accepted' if rng.random() < 0.7 else 'rejected'
+            started = time.perf_counter()
+            try:
+                outcomes.append(app.adoption_repository.update_status(adoption_id, status))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                durations.append(time.perf_counter() - started)
+
+
+def double_adoptions(app, animal_ids):
+    placeholders = ', '.join(['%s'] * len(animal_ids))
+    with app.app_context():
+        with app.db.connect().cursor() as cursor:
+            cursor.execute(f"""
+                SELECT animal_id, COUNT(*) FROM adoptions
+                WHERE animal_id IN ({placeholders}) AND status = 'accepted'
+                GROUP BY animal_id HAVING COUNT(*) > 1
+            """, tuple(animal_ids))
+            return cursor.fetchall()
+
+
+def run_round(app, args, rng):
+    user_ids, animal_ids, adoption_ids = prepare(app, args.animals, args.requests)
+    try:
+        queue = list(adoption_ids)
+        rng.shuffle(queue)
+        lock = threading.Lock()
+        durations, outcomes, errors = [], [], []
+        threads = [threading.Thread(target=moderate, args=(app, queue, lock, rng, durations, outcomes, errors))
+                   for _ in range(args.moderators)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return {
+            'decisions': len(durations),
+            'applied': sum(1 for outcome in outcomes if outcome),
+            'errors': errors,
+            'ops_per_sec': len(durations) / elapsed,
+            'p50_ms': percentile(durations, 50) * 1000,
+            'p95_ms': percentile(durations, 95) * 1000,
+            'double_adoptions': double_adoptions(app, animal_ids),
+        }
+    finally:
+        cleanup(app, user_ids, animal_ids)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--animals', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=8, help='заявок на каждое животное')
+    parser.add_argument('--moderators', type=int, default=16, help='потоков, одновременно принимающих решения')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=2025)
+    args = parser.parse_args(argv)
+
+    app = create_app({'SQL_TRACE': False, 'DB_POOL_SIZE': args.moderators + 1})
+    counter = RetryCounter()
+    app.logger.addHandler(counter)
+    rng = random.Random(args.seed)
+
+    failed = False
+    print(f"{'round':>5} {'decisions':>9} {'applied':>8} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'retries':>7} {'errors':>6} {'double':>6}")
+    for number in range(1, args.rounds + 1):
+        retries_before = counter.retries
+        result = run_round(app, args, rng)
+        print(f"{number:5} {result['decisions']:9} {result['applied']:8} {result['ops_per_sec']:9.1f} "
+              f"{result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {counter.retries - retries_before:7} "
+              f"{len(result['errors']):6} {len(result['double_adoptions']):6}")
+        for error in result['errors'][:3]:
+            print(f'  ошибка: {error}', file=sys.stderr)
+        failed = failed or bool(result['errors'] or result['double_adoptions'])
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+--liquibase formatted sql
+
+--changeset bakulin:1
+--comment: stored listing sort key and composite index for keyset pagination
+ALTER TABLE animals ADD COLUMN IF NOT EXISTS is_available TINYINT(1) AS (status = 'available') STORED;
+CREATE INDEX IF NOT EXISTS idx_animals_listing ON animals (is_available, created_at, id);
+--rollback DROP INDEX idx_animals_listing ON animals;
+--rollback ALTER TABLE animals DROP COLUMN is_available;
+
+--changeset bakulin:2
+--comment: denormalized primary photo and adoption counter on animals
+ALTER TABLE animals
+    ADD COLUMN IF NOT EXISTS primary_photo_filename VARCHAR(255) NULL,
+    ADD COLUMN IF NOT EXISTS adoption_count INT NOT NULL DEFAULT 0;
+UPDATE animals a
+SET primary_photo_filename = (SELECT p.filename FROM animal_photos p WHERE p.animal_id = a.id ORDER BY p.id LIMIT 1),
+    adoption_count = (SELECT COUNT(*) FROM adoptions ad WHERE ad.animal_id = a.id);
+--rollback ALTER TABLE animals DROP COLUMN primary_photo_filename, DROP COLUMN adoption_count;
+
+--changeset bakulin:3 runOnChange:true
+--comment: normalized search text with a FULLTEXT index; existing rows get lowercased raw text so they stay searchable until 'flask reindex-search' stems it
+ALTER TABLE animals ADD COLUMN IF NOT EXISTS search_text TEXT CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL DEFAULT '';
+CREATE FULLTEXT INDEX IF NOT EXISTS ft_animals_search ON animals (search_text);
+UPDATE animals SET search_text = REPLACE(LOWER(CONCAT_WS(' ', name, name, breed, description)), 'ё', 'е')
+WHERE search_text = '';
+--rollback DROP INDEX ft_animals_search ON animals;
+--rollback ALTER TABLE animals DROP COLUMN search_text;
+
+--changeset bakulin:4
+--comment: pre-rendered description HTML; version 0 rows are filled by 'flask rerender-descriptions'
+ALTER TABLE animals
+    ADD COLUMN IF NOT EXISTS description_html MEDIUMTEXT CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL,
+    ADD COLUMN IF NOT EXISTS description_html_version SMALLINT NOT NULL DEFAULT 0;
+--rollback ALTER TABLE animals DROP COLUMN description_html, DROP COLUMN description_html_version;
+
+--changeset bakulin:5
+--comment: widths of generated WebP variants; fill existing photos with 'flask generate-photo-variants'
+ALTER TABLE animal_photos ADD COLUMN IF NOT EXISTS variant_widths VARCHAR(64) NULL;
+ALTER TABLE animals ADD COLUMN IF NOT EXISTS primary_photo_variants VARCHAR(64) NULL;
+--rollback ALTER TABLE animals DROP COLUMN primary_photo_variants;
+--rollback ALTER TABLE animal_photos DROP COLUMN variant_widths;
+
+--changeset bakulin:6
+--comment: content hash of stored photo files, used for deduplication and reference counting
+ALTER TABLE animal_photos ADD COLUMN IF NOT EXISTS content_hash CHAR(64) NULL;
+CREATE INDEX IF NOT EXISTS idx_animal_photos_content_hash ON animal_photos (content_hash);
+--rollback DROP INDEX idx_animal_photos_content_hash ON animal_photos;
+--rollback ALTER TABLE animal_photos DROP COLUMN content_hash;
+
+--changeset bakulin:7
+--comment: revision counter of an animal page, bumped by every write to the animal, its photos or adoptions
+ALTER TABLE animals ADD COLUMN IF NOT EXISTS revision INT UNSIGNED NOT NULL DEFAULT 1;
+--rollback ALTER TABLE animals DROP COLUMN revision;
+
+--changeset bakulin:8
+--comment: moderation queue index: adoptions of one status ordered by age, id is appended by InnoDB
+CREATE INDEX IF NOT EXISTS idx_adoptions_queue ON adoptions (status, created_at);
+--rollback DROP INDEX idx_adoptions_queue ON adoptions;
+
+--changeset bakulin:9
+--comment: one adoption request per user and animal, and the idempotency key of the form post that created it; of duplicate requests the accepted one is kept, else a pending one, else the earliest
+DELETE a FROM adoptions a
+JOIN adoptions b ON a.user_id = b.user_id AND a.animal_id = b.animal_id
+    AND (CASE b.status WHEN 'accepted' THEN 0 WHEN 'pending' THEN 1 ELSE 2 END, b.id)
+      < (CASE a.status WHEN 'accepted' THEN 0 WHEN 'pending' THEN 1 ELSE 2 END, a.id);
+UPDATE animals a SET adoption_count = (SELECT COUNT(*) FROM adoptions ad WHERE ad.animal_id = a.id),
+                     revision = revision + 1;
+ALTER TABLE adoptions
+    ADD COLUMN IF NOT EXISTS idempotency_key CHAR(32) NULL,
+    ADD UNIQUE INDEX IF NOT EXISTS uq_adoptions_user_animal (user_id, animal_id);
+--rollback ALTER TABLE adoptions DROP INDEX uq_adoptions_user_animal, DROP COLUMN idempotency_key;
@@ -0,0 +1,42 @@
+# Настройки gunicorn для запуска в контейнере: gunicorn run:app
+# (файл подхватывается автоматически из рабочей директории)
+import multiprocessing
+import os
+
+bind = f"{os.environ.get('FLASK_HOST', '0.0.0.0')}:{os.environ.get('FLASK_PORT', 5000)}"
+
+# у каждого воркера свой пул из DB_POOL_SIZE соединений к основному серверу (к каждой реплике
+# столько же), в нём же берут соединения параллельные чтения страницы животного. По умолчанию
+# воркеров не больше, чем помещается в DB_MAX_CONNECTIONS (max_connections MariaDB, по умолчанию 151)
+# за вычетом DB_RESERVED_CONNECTIONS для команд flask, liquibase и администрирования
+db_connection_budget = (int(os.environ.get('DB_MAX_CONNECTIONS', 151))
+                        - int(os.environ.get('DB_RESERVED_CONNECTIONS', 20)))
+max_db_workers = max(1, db_connection_budget // int(os.environ.get('DB_POOL_SIZE', 10)))
+workers = int(os.environ.get('WEB_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, max_db_workers)))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+# приложение загружается один раз в мастер-процессе, воркеры получают его через fork;
+# пулы соединений и потоки исполнителей создаются в каждом воркере заново (os.register_at_fork).
+# Поэтому SIGHUP перезапускает воркеры со старым кодом: новый код (он и так в образе) —
+# только пересборкой и перезапуском контейнера, docker compose up -d --build web
+preload_app = True
+
+# воркер перезапускается после стольких запросов, jitter разносит перезапуски во времени
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+# на SIGTERM и SIGHUP воркеры дорабатывают текущие запросы не дольше этого времени
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # поколения тегов кэшей в разделяемой памяти: сброс кэша в одном воркере виден всем
+    from app.cache import share_generations
+    share_generations()
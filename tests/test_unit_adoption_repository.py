@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для AdoptionRepository с имитацией соединения
+"""
+
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from mysql.connector import IntegrityError
+
+from app.cache import invalidate_adoption_counts
+from app.pagination import decode_cursor, encode_cursor
+from app.repositories.adoption_repository import ALREADY_SUBMITTED, SUBMITTED, UNAVAILABLE, AdoptionRepository
+
+
+class TestModerationQueue(unittest.TestCase):
+    """Unit тесты для очереди модерации"""
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.after_commit.side_effect = lambda connection, callback: callback()
+        self.cursor = self.db.connect.return_value.cursor.return_value.__enter__.return_value
+        self.repository = AdoptionRepository(self.db)
+        invalidate_adoption_counts()
+
+    def test_cursor_round_trip(self):
+        """Тест кодирования позиции в очереди"""
+        created_at = datetime(2025, 6, 18, 11, 0)
+        token = encode_cursor({'created_at': created_at, 'id': 42})
+
+        self.assertEqual(decode_cursor(token), (created_at, 42))
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        # курсор списка животных с ключом is_available очереди не подходит
+        self.assertIsNone(decode_cursor(encode_cursor({'created_at': created_at, 'id': 42}, 1)))
+
+    def test_page_after_cursor_is_read_from_index_order(self):
+        """Тест выборки следующей страницы по курсору с фильтрами"""
+        created_at = datetime(2025, 6, 18, 11, 0)
+        cutoff = datetime(2025, 6, 1)
+        self.cursor.fetchall.return_value = []
+
+        self.repository.get_queue(animal_id=7, created_before=cutoff,
+                                  cursor=encode_cursor({'created_at': created_at, 'id': 42}), limit=10)
+
+        query, params = self.cursor.execute.call_args.args
+        self.assertIn('a.created_at > %s OR (a.created_at = %s AND a.id > %s)', query)
+        self.assertIn('ORDER BY a.created_at, a.id LIMIT %s', query)
+        self.assertEqual(params, ['pending', 7, cutoff, created_at, created_at, 42, 10])
+        self.db.connect.assert_called_with(readonly=True)
+
+    def test_status_counts_are_cached_until_adoption_changes(self):
+        """Тест кэширования счётчиков по статусам и их сброса после изменения заявки"""
+        self.cursor.fetchall.return_value = [('pending', 3), ('accepted', 1)]
+
+        counts = self.repository.get_status_counts()
+        self.repository.get_status_counts()
+
+        self.assertEqual(counts, {'pending': 3, 'accepted': 1, 'rejected': 0, 'rejected_adopted': 0})
+        self.assertEqual(self.cursor.execute.call_count, 1)
+
+        connection = self.db.transaction.return_value.__enter__.return_value
+        connection.cursor.return_value.fetchone.return_value = (7,)
+        self.repository.update_status(1, 'rejected')
+        self.repository.get_status_counts()
+
+        self.assertEqual(self.cursor.execute.call_count, 2)
+
+    def test_invalidation_during_count_is_not_lost(self):
+        """Тест сброса во время подсчёта: результат, прочитанный до сброса, не остаётся в кэше"""
+        self.cursor.fetchall.side_effect = lambda: invalidate_adoption_counts() or [('pending', 3)]
+
+        self.repository.get_status_counts()
+        self.repository.get_status_counts()
+
+        self.assertEqual(self.cursor.execute.call_count, 2)
+
+
+class TestUpdateStatus(unittest.TestCase):
+    """Unit тесты для одобрения заявок под конкурентной нагрузкой"""
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.after_commit.side_effect = lambda connection, callback: callback()
+        self.cursor = self.db.transaction.return_value.__enter__.return_value.cursor.return_value
+        self.cursor.rowcount = 1
+        self.repository = AdoptionRepository(self.db)
+
+    def statements(self):
+        return [' '.join(call.args[0].split()) for call in self.cursor.execute.call_args_list]
+
+    def test_approval_locks_animal_and_rejects_siblings_set_wise(self):
+        """Тест блокировки строки животного и отклонения остальных заявок одним запросом"""
+        self.cursor.fetchone.side_effect = [(7,), ('adoption',)]
+
+        self.assertTrue(self.repository.update_status(1, 'accepted', connection=MagicMock()))
+
+        statements = self.statements()
+        self.assertEqual(statements[1], 'SELECT status FROM animals WHERE id = %s FOR UPDATE')
+        self.assertIn("WHERE id = %s AND status = 'pending'", statements[2])
+        self.assertEqual(statements[4], "UPDATE adoptions SET status = 'rejected_adopted', processed_at = NOW() "
+                                        "WHERE animal_id = %s AND status = 'pending'")
+        self.assertNotIn('SELECT animal_id FROM adoptions WHERE id = %s)', ' '.join(statements))
+
+    def test_second_approval_for_adopted_animal_is_refused(self):
+        """Тест отказа во втором одобрении для уже усыновлённого животного"""
+        self.cursor.fetchone.side_effect = [(7,), ('adopted',)]
+
+        self.assertFalse(self.repository.update_status(2, 'accepted', connection=MagicMock()))
+        self.assertEqual(self.cursor.execute.call_count, 2)
+
+    def test_already_processed_request_is_not_changed(self):
+        """Тест повторного решения по уже рассмотренной заявке"""
+        self.cursor.fetchone.side_effect = [(7,), ('adoption',)]
+        self.cursor.rowcount = 0
+
+        self.assertFalse(self.repository.update_status(1, 'rejected', connection=MagicMock()))
+        self.assertEqual(self.cursor.execute.call_count, 3)
+
+
+class TestSubmit(unittest.TestCase):
+    """Unit тесты для подачи заявки без предварительных проверок"""
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.after_commit.side_effect = lambda connection, callback: callback()
+        self.cursor = self.db.transaction.return_value.__enter__.return_value.cursor.return_value
+        self.cursor.rowcount = 1
+        self.lookup = self.db.connect.return_value.cursor.return_value.__enter__.return_value
+        self.repository = AdoptionRepository(self.db)
+
+    def duplicate_on_insert(self, sql, params):
+        if sql.strip().startswith('INSERT'):
+            raise IntegrityError(msg="Duplicate entry for key 'uq_adoptions_user_animal'", errno=1062)
+
+    def test_submission_flips_status_and_inserts_in_one_transaction(self):
+        """Тест подачи заявки двумя запросами в одной транзакции"""
+        self.assertEqual(self.repository.submit(7, 3, '+7 900', idempotency_key='a' * 32), SUBMITTED)
+
+        update, insert = (call.args for call in self.cursor.execute.call_args_list)
+        self.assertIn("WHERE id = %s AND status IN ('available', 'adoption')", update[0])
+        self.assertEqual(insert[1], (7, 3, '+7 900', 'a' * 32))
+        self.db.transaction.assert_called_once()
+        self.db.connect.assert_not_called()
+
+    def test_adoption_count_is_bumped_with_insert(self):
+        """Тест увеличения счётчика заявок животного тем же запросом, что меняет его статус"""
+        self.repository.create({'animal_id': 7, 'user_id': 3, 'contact_info': '+7 900'})
+
+        update = self.cursor.execute.call_args_list[0].args[0]
+        self.assertIn('adoption_count = adoption_count + 1', update)
+        self.assertEqual(self.cursor.execute.call_count, 2)
+
+    def test_unavailable_animal(self):
+        """Тест заявки на животное, которое не принимает заявки"""
+        self.cursor.rowcount = 0
+
+        self.assertEqual(self.repository.submit(7, 3, '+7 900'), UNAVAILABLE)
+        self.assertEqual(self.cursor.execute.call_count, 1)
+
+    def test_duplicate_key_is_reported_as_already_submitted(self):
+        """Тест повторной заявки по ошибке уникального ключа"""
+        self.cursor.execute.side_effect = self.duplicate_on_insert
+        self.lookup.fetchone.return_value = ('b' * 32,)
+
+        self.assertEqual(self.repository.submit(7, 3, '+7 900', idempotency_key='a' * 32), ALREADY_SUBMITTED)
+        self.assertEqual(self.repository.submit(7, 3, '+7 900'), ALREADY_SUBMITTED)
+
+    def test_replayed_form_post_is_successful(self):
+        """Тест повторной отправки той же формы"""
+        self.cursor.execute.side_effect = self.duplicate_on_insert
+        self.lookup.fetchone.return_value = ('a' * 32,)
+
+        self.assertEqual(self.repository.submit(7, 3, '+7 900', idempotency_key='a' * 32), SUBMITTED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для AnimalRepository с имитацией соединения
+"""
+
+import sqlite3
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from app.repositories.animal_repository import (AnimalRepository, decode_cursor, encode_cursor,
+                                                invalidate_status_counts)
+
+
+class SQLiteCursor:
+    """Курсор поверх sqlite3: подставляет параметры MySQL и возвращает строки словарями"""
+
+    def __init__(self, connection):
+        self.cursor = connection.cursor()
+
+    def execute(self, query, params=()):
+        params = [value.isoformat(' ') if isinstance(value, datetime) else value for value in params]
+        self.cursor.execute(query.replace('%s', '?'), params)
+
+    def fetchall(self):
+        columns = [column[0] for column in self.cursor.description]
+        rows = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+        for row in rows:
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+        return rows
+
+    def close(self):
+        self.cursor.close()
+
+
+class TestCursor(unittest.TestCase):
+    """Unit тесты для курсора постраничного вывода"""
+
+    def test_round_trip(self):
+        """Тест кодирования и декодирования позиции"""
+        animal = {'is_available': True, 'created_at': datetime(2025, 6, 18, 11, 0, 5), 'id': 42}
+
+        self.assertEqual(decode_cursor(encode_cursor(animal)), (1, datetime(2025, 6, 18, 11, 0, 5), 42))
+
+    def test_malformed_token(self):
+        """Тест повреждённого или подделанного курсора"""
+        token = encode_cursor({'is_available': 0, 'created_at': datetime(2025, 6, 18), 'id': 42})
+
+        for malformed in ('not-a-cursor', token[:-3], 'WyJ4Il0', 'eyJpZCI6IDF9', 'WzEsICJub3ciLCAyXQ', '!!!'):
+            self.assertIsNone(decode_cursor(malformed), malformed)
+        self.assertIsNone(decode_cursor(None))
+        self.assertIsNone(decode_cursor(''))
+
+
+class TestKeysetPagination(unittest.TestCase):
+    """Unit тесты для выборки страниц по курсору на реальном SQL (sqlite в памяти)"""
+
+    def setUp(self):
+        self.sqlite = sqlite3.connect(':memory:')
+        self.sqlite.execute("""
+            CREATE TABLE animals (id INTEGER PRIMARY KEY, name TEXT, status TEXT, is_available INTEGER,
+                                  created_at TEXT, primary_photo_filename TEXT, adoption_count INTEGER)
+        """)
+        started = datetime(2025, 1, 1)
+        # несколько животных с одинаковым created_at, чтобы порядок внутри секунды решал id
+        rows = []
+        for animal_id in range(1, 24):
+            created_at = started + timedelta(seconds=animal_id // 3)
+            is_available = int(animal_id % 4 != 0)
+            rows.append((animal_id, f'animal {animal_id}', 'available' if is_available else 'adopted',
+                         is_available, created_at.isoformat(' '), None, 0))
+        self.sqlite.executemany("INSERT INTO animals VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+        self.db = MagicMock()
+        self.db.connect.return_value.cursor.side_effect = lambda **kwargs: SQLiteCursor(self.sqlite)
+        self.repository = AnimalRepository(self.db)
+
+    def tearDown(self):
+        self.sqlite.close()
+
+    def test_pages_follow_each_other_without_gaps(self):
+        """Тест прохода по всем страницам курсором без пропусков и повторов"""
+        expected = [row['id'] for row in self.repository.get_paginated(per_page=100)]
+
+        seen = []
+        cursor = None
+        while True:
+            animals = self.repository.get_paginated(cursor=cursor, per_page=5)
+            if not animals:
+                break
+            seen.extend(animal['id'] for animal in animals)
+            cursor = encode_cursor(animals[-1])
+
+        self.assertEqual(len(expected), 23)
+        self.assertEqual(seen, expected)
+
+    def test_cursor_matches_offset_page(self):
+        """Тест совпадения страницы по курсору со страницей по номеру"""
+        first = self.repository.get_paginated(page=1, per_page=6)
+        second = self.repository.get_paginated(page=2, per_page=6)
+
+        by_cursor = self.repository.get_paginated(cursor=encode_cursor(first[-1]), per_page=6)
+
+        self.assertEqual([animal['id'] for animal in by_cursor], [animal['id'] for animal in second])
+
+    def test_invalid_cursor_falls_back_to_page(self):
+        """Тест выборки по номеру страницы при повреждённом курсоре"""
+        by_page = self.repository.get_paginated(page=2, per_page=6)
+
+        by_bad_cursor = self.repository.get_paginated(page=2, cursor='garbage', per_page=6)
+
+        self.assertEqual(by_bad_cursor, by_page)
+
+
+class TestAnimalRepositoryDelete(unittest.TestCase):
+    """Unit тесты для AnimalRepository.delete"""
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.after_commit.side_effect = lambda connection, callback: callback()
+        self.connection = self.db.transaction.return_value.__enter__.return_value
+        self.cursor = self.connection.cursor.return_value
+        self.repository = AnimalRepository(self.db)
+
+    def test_returns_only_unreferenced_files(self):
+        """Тест удаления одним набором запросов без файлов, используемых другими записями"""
+        self.cursor.fetchall.side_effect = [
+            [('aa/bb/one.jpg', '320,640'), ('cc/dd/shared.jpg', None)],
+            [('cc/dd/shared.jpg',)],
+        ]
+
+        orphaned = self.repository.delete(7)
+
+        self.assertEqual(orphaned, [('aa/bb/one.jpg', '320,640')])
+        self.assertEqual(self.cursor.execute.call_count, 3)
+        self.assertEqual(self.cursor.execute.call_args_list[1].args, ("DELETE FROM animals WHERE id = %s", (7,)))
+
+    def test_animal_without_photos(self):
+        """Тест удаления животного без фотографий"""
+        self.cursor.fetchall.return_value = []
+
+        self.assertEqual(self.repository.delete(7), [])
+        self.assertEqual(self.cursor.execute.call_count, 2)
+
+
+class CountingCursor:
+    """Курсор, отвечающий на запрос списка и запрос количества по статусам"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, query, params=()):
+        self.db.queries.append(query)
+        self.query = query
+        if 'GROUP BY status' in query and self.db.during_count:
+            self.db.during_count()
+
+    def fetchall(self):
+        if 'GROUP BY status' in self.query:
+            return [dict(row) for row in self.db.counts]
+        return [{'id': 1, 'name': 'Барон'}]
+
+    def close(self):
+        pass
+
+
+class TestListingCounts(unittest.TestCase):
+    """Unit тесты для кэша количества животных на странице списка"""
+
+    def setUp(self):
+        invalidate_status_counts()
+        self.db = MagicMock()
+        self.db.queries = []
+        self.db.during_count = None
+        self.db.counts = [{'status': 'available', 'total': 4}, {'status': 'adopted', 'total': 2}]
+        self.db.connect.return_value.cursor.side_effect = lambda **kwargs: CountingCursor(self.db)
+        self.db.after_commit.side_effect = lambda connection, callback: callback()
+        self.repository = AnimalRepository(self.db)
+
+    def count_queries(self):
+        return sum('GROUP BY status' in query for query in self.db.queries)
+
+    def test_page_counts_are_cached(self):
+        """Тест одного запроса количества на несколько страниц"""
+        animals, total = self.repository.get_page(1)
+        _, second_total = self.repository.get_page(2)
+
+        self.assertEqual(animals, [{'id': 1, 'name': 'Барон'}])
+        self.assertEqual((total, second_total), (6, 6))
+        self.assertEqual(self.repository.get_total_count('adopted'), 2)
+        self.assertEqual(self.repository.get_total_count('adoption'), 0)
+        self.assertEqual(self.count_queries(), 1)
+        self.assertEqual(len(self.db.queries), 3)
+
+    def test_writes_invalidate_counts(self):
+        """Тест сброса количества после добавления, изменения и удаления животного"""
+        animal = {'name': 'Барон', 'age_months': 24, 'breed': 'Лабрадор', 'gender': 'male'}
+        self.db.transaction.return_value.__enter__.return_value.cursor.return_value.fetchall.return_value = []
+        writes = [
+            lambda: self.repository.create(animal),
+            lambda: self.repository.update(1, animal),
+            lambda: self.repository.delete(1),
+        ]
+        self.assertEqual(self.repository.get_total_count(), 6)
+        for number, write in enumerate(writes, start=1):
+            self.db.counts[0]['total'] += 1
+            self.assertEqual(self.repository.get_total_count(), 5 + number)
+            write()
+            self.assertEqual(self.repository.get_total_count(), 6 + number)
+        self.assertEqual(self.count_queries(), 4)
+
+    def test_invalidation_during_count_is_kept(self):
+        """Тест сброса, пришедшего во время подсчёта: устаревший результат не кэшируется"""
+        self.db.during_count = invalidate_status_counts
+        self.assertEqual(self.repository.get_total_count(), 6)
+
+        self.db.during_count = None
+        self.db.counts = [{'status': 'available', 'total': 5}]
+        self.assertEqual(self.repository.get_total_count(), 5)
+        self.assertEqual(self.count_queries(), 2)
+
+
+class TestSearch(unittest.TestCase):
+    """Unit тесты для AnimalRepository.search"""
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.cursor = self.db.connect.return_value.cursor.return_value
+        self.cursor.fetchall.return_value = []
+        self.repository = AnimalRepository(self.db)
+
+    def test_full_text_query(self):
+        """Тест полнотекстового поиска по нормализованному тексту"""
+        self.repository.search('рыжая кошка')
+
+        query, params = self.cursor.execute.call_args.args
+        self.assertIn('MATCH(a.search_text) AGAINST (%s IN BOOLEAN MODE)', query)
+        self.assertEqual(params[:2], ['+рыж* +кошк*', '+рыж* +кошк*'])
+
+    def test_short_query_matches_name_and_breed(self):
+        """Тест короткого запроса, не попадающего в полнотекстовый индекс: ищется по кличке и породе"""
+        self.repository.search(' Ш ', gender='female')
+
+        query, params = self.cursor.execute.call_args.args
+        self.assertIn('(a.name LIKE %s OR a.breed LIKE %s)', query)
+        self.assertNotIn('MATCH', query)
+        self.assertEqual(params, ['Ш%', 'Ш%', 'female', 20, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для JSON API каталога
+"""
+
+import gzip
+import json
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import Mock, patch
+
+from app import create_app
+from app.blueprints import api
+from app.serialization import dumps
+
+ANIMAL = {
+    'id': 7, 'name': 'Барон', 'description': 'Пёс', 'description_html': '<p>Пёс</p>',
+    'description_html_version': 1, 'age_months': 12, 'breed': 'Лабрадор', 'gender': 'male',
+    'status': 'available', 'is_available': 1, 'adoption_count': 0,
+    'primary_photo_filename': None, 'primary_photo_variants': None,
+    'created_at': datetime(2025, 6, 18, 11, 0), 'updated_at': datetime(2025, 6, 18, 11, 0),
+}
+
+
+class TestApi(unittest.TestCase):
+    """Unit тесты для blueprint api"""
+
+    def setUp(self):
+        self.app = create_app({'TESTING': True, 'SECRET_KEY': 'test'})
+        self.client = self.app.test_client()
+        self.animals = Mock()
+        patcher = patch.object(api.bp, 'animal_repository', self.animals)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_serializer_handles_datetimes_and_decimals(self):
+        """Тест сериализации дат и Decimal"""
+        data = json.loads(dumps({'at': datetime(2025, 6, 18, 11, 0), 'price': Decimal('1.50')}))
+        self.assertEqual(data, {'at': '2025-06-18T11:00:00', 'price': '1.50'})
+
+    def test_sparse_fieldset_and_cursor(self):
+        """Тест выборки полей и курсора следующей страницы"""
+        self.animals.get_paginated.return_value = [dict(ANIMAL)]
+
+        response = self.client.get('/api/v1/animals?fields=id,name&limit=1')
+
+        body = response.get_json()
+        self.assertEqual(body['data'], [{'id': 7, 'name': 'Барон'}])
+        self.assertIsNotNone(body['next_cursor'])
+        self.assertEqual(self.animals.get_paginated.call_args.kwargs['per_page'], 1)
+
+    def test_unknown_field_is_rejected(self):
+        """Тест ошибки 400 для неизвестного поля"""
+        response = self.client.get('/api/v1/animals?fields=id,search_text')
+
+        self.assertEqual(response.status_code, 400)
+        self.animals.get_paginated.assert_not_called()
+
+    def test_large_responses_are_gzipped(self):
+        """Тест сжатия больших ответов"""
+        self.animals.get_paginated.return_value = [dict(ANIMAL, id=i) for i in range(30)]
+
+        response = self.client.get('/api/v1/animals', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.data))['data']), 30)
+
+    def test_adoptions_require_moderator(self):
+        """Тест закрытого списка заявок"""
+        response = self.client.get('/api/v1/animals/7/adoptions')
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_moderation_queue(self):
+        """Тест очереди модерации с курсором, фильтрами и счётчиками"""
+        adoptions = Mock()
+        adoptions.get_queue.return_value = [{'id': 3, 'animal_name': 'Барон', 'status': 'pending',
+                                             'created_at': datetime(2025, 6, 18, 11, 0)}]
+        adoptions.get_status_counts.return_value = {'pending': 1}
+        moderator = Mock(is_authenticated=True, role_name='moderator')
+
+        with patch.object(api.bp, 'adoption_repository', adoptions), \
+                patch('app.blueprints.api.current_user', moderator):
+            response = self.client.get('/api/v1/adoptions?fields=id,animal_name&animal_id=7&min_age_days=3&limit=1')
+            invalid = self.client.get('/api/v1/adoptions?status=unknown')
+
+        body = response.get_json()
+        self.assertEqual(body['data'], [{'id': 3, 'animal_name': 'Барон'}])
+        self.assertIsNotNone(body['next_cursor'])
+        self.assertEqual(body['counts'], {'pending': 1})
+        kwargs = adoptions.get_queue.call_args.kwargs
+        self.assertEqual((kwargs['status'], kwargs['animal_id'], kwargs['limit']), ('pending', 7, 1))
+        self.assertLess(kwargs['created_before'], datetime.now())
+        self.assertEqual(invalid.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для адресов статики с отпечатком содержимого
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import Flask
+
+from app import assets
+
+
+class TestAssetUrls(unittest.TestCase):
+    """Unit тесты для app.assets"""
+
+    def setUp(self):
+        self.static_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_folder)
+        os.makedirs(os.path.join(self.static_folder, 'uploads'))
+        self.write('styles.css', b'body {}')
+        self.write('uploads/Goshka.jpg', b'legacy photo')
+
+        self.app = Flask(__name__, static_folder=self.static_folder, static_url_path='/static')
+        assets.init_app(self.app)
+        self.client = self.app.test_client()
+        self.sharded = 'uploads/ab/cd/' + 'ab' * 32 + '_320w.webp'
+
+    def write(self, filename, content):
+        with open(os.path.join(self.static_folder, filename), 'wb') as file:
+            file.write(content)
+
+    def test_manifest_skips_uploads(self):
+        """Тест построения манифеста только для статики приложения"""
+        self.assertEqual(list(self.app.extensions['asset_manifest']), ['styles.css'])
+
+    def test_urls_carry_content_version(self):
+        """Тест адресов с версией содержимого"""
+        with self.app.test_request_context():
+            styles = assets.asset_url('styles.css')
+            legacy = assets.asset_url('uploads/Goshka.jpg')
+            sharded = assets.asset_url(self.sharded)
+
+        self.assertRegex(styles, r'^/static/styles\.css\?v=[0-9a-f]{12}$')
+        self.assertRegex(legacy, r'^/static/uploads/Goshka\.jpg\?v=[0-9a-f]{12}$')
+        self.assertEqual(sharded, '/static/' + self.sharded)
+
+    def test_fingerprinted_urls_are_immutable(self):
+        """Тест долгого кэширования только для актуальной версии"""
+        with self.app.test_request_context():
+            url = assets.asset_url('styles.css')
+
+        response = self.client.get(url)
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(response.cache_control.max_age, assets.IMMUTABLE_MAX_AGE)
+        response.close()
+
+        response = self.client.get('/static/styles.css?v=outdated')
+        self.assertFalse(response.cache_control.immutable)
+        response.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для in-process кэшей
+"""
+
+import multiprocessing
+import time
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+from flask import Flask
+
+from app.cache import LRUCache, SharedGenerations, TaggedCache
+from app.page_cache import cached_page, invalidate_animal, page_cache
+from app.repositories.user_repository import UserRepository, user_cache
+
+
+class TestLRUCache(unittest.TestCase):
+    """Unit тесты для LRUCache"""
+
+    def test_get_returns_stored_value(self):
+        """Тест сохранения и получения значения"""
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.get('missing', 0), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        """Тест вытеснения давно не использованного ключа"""
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_entries_expire_after_ttl(self):
+        """Тест истечения срока жизни записи"""
+        cache = LRUCache(maxsize=2, ttl=0.01)
+        cache.set('a', 1)
+        time.sleep(0.02)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_delete_and_clear(self):
+        """Тест удаления ключа и очистки кэша"""
+        cache = LRUCache(maxsize=4)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.delete('a')
+        cache.delete('missing')
+
+        self.assertIsNone(cache.get('a'))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+
+class TestTaggedCache(unittest.TestCase):
+    """Unit тесты для TaggedCache"""
+
+    def test_invalidate_drops_tagged_entries(self):
+        """Тест сброса записей по тегу"""
+        cache = TaggedCache(maxsize=4)
+        cache.set('listing', 'a', tags=['animals'])
+        cache.set('animal', 'b', tags=['animal:1'])
+        cache.invalidate('animals')
+
+        self.assertIsNone(cache.get('listing'))
+        self.assertEqual(cache.get('animal'), 'b')
+
+    def test_entry_computed_before_invalidation_is_not_served(self):
+        """Тест записи, вычисленной до сброса тега"""
+        cache = TaggedCache(maxsize=4)
+        generations = cache.generations(['animal:1'])
+        cache.invalidate('animal:1')
+        cache.set('animal', 'stale', generations=generations)
+
+        self.assertIsNone(cache.get('animal'))
+
+        generations = cache.generations(['animal:1'])
+        cache.clear()
+        cache.set('animal', 'stale', generations=generations)
+        self.assertIsNone(cache.get('animal'))
+
+    def test_invalidation_in_forked_worker_is_visible(self):
+        """Тест сброса тега в другом процессе через общие поколения"""
+        with patch('app.cache._shared_generations', SharedGenerations(slots=64)):
+            cache = TaggedCache(maxsize=4, name='test')
+            cache.set('listing', 'a', tags=['animals'])
+            cache.set('animal', 'b', tags=['animal:1'])
+
+            worker = multiprocessing.get_context('fork').Process(target=cache.invalidate, args=('animals',))
+            worker.start()
+            worker.join(5)
+
+            self.assertEqual(worker.exitcode, 0)
+            self.assertIsNone(cache.get('listing'))
+            self.assertEqual(cache.get('animal'), 'b')
+
+
+class TestPageCache(unittest.TestCase):
+    """Unit тесты для кэша страниц анонимных посетителей"""
+
+    def setUp(self):
+        page_cache.clear()
+        self.app = Flask(__name__)
+        self.app.config['SECRET_KEY'] = 'test'
+        self.render = Mock(return_value='<html>')
+        self.user = Mock(is_authenticated=False)
+        patcher = patch('app.page_cache.current_user', self.user)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(page_cache.clear)
+
+        @self.app.route('/animals/<int:id>')
+        @cached_page('animal:{id}')
+        def view(id):
+            return self.render()
+
+        self.client = self.app.test_client()
+
+    def test_page_is_rendered_once_until_invalidated(self):
+        """Тест повторной выдачи страницы из кэша и сброса после изменения"""
+        self.client.get('/animals/1')
+        response = self.client.get('/animals/1')
+        self.assertEqual(response.data, b'<html>')
+        self.assertEqual(self.render.call_count, 1)
+
+        invalidate_animal(1)
+        self.client.get('/animals/1')
+        self.assertEqual(self.render.call_count, 2)
+
+    def test_authenticated_users_bypass_cache(self):
+        """Тест отсутствия кэширования для вошедших пользователей"""
+        self.user.configure_mock(is_authenticated=True, role_name='admin')
+        self.client.get('/animals/1')
+        self.client.get('/animals/1')
+
+        self.assertEqual(self.render.call_count, 2)
+
+
+class TestUserPrincipalCache(unittest.TestCase):
+    """Unit тесты для кэша пользователей Flask-Login"""
+
+    def setUp(self):
+        user_cache.clear()
+        self.db = MagicMock()
+        self.db.after_commit.side_effect = lambda connection, callback: callback()
+        self.cursor = self.db.connect.return_value.cursor.return_value.__enter__.return_value
+        self.cursor.fetchone.return_value = ('user-row',)
+        self.repository = UserRepository(self.db)
+        self.context = Flask(__name__).app_context()
+        self.context.push()
+
+    def tearDown(self):
+        self.context.pop()
+        user_cache.clear()
+
+    def test_principal_is_loaded_once(self):
+        """Тест повторной загрузки пользователя из кэша"""
+        first = self.repository.get_principal('1')
+        second = self.repository.get_principal(1)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.cursor.execute.call_count, 1)
+
+    def test_update_invalidates_principal(self):
+        """Тест сброса кэша при изменении пользователя"""
+        self.repository.get_principal(1)
+        self.repository.update(1, 'Иван', 'Иванов', role_id=2)
+        self.repository.get_principal(1)
+
+        selects = [call for call in self.cursor.execute.call_args_list if 'SELECT' in call.args[0]]
+        self.assertEqual(len(selects), 2)
+
+    def test_invalidation_during_lookup_is_not_lost(self):
+        """Тест сброса во время чтения пользователя: строка, прочитанная до сброса, не остаётся в кэше"""
+        self.cursor.fetchone.side_effect = lambda: user_cache.invalidate('1') or ('user-row',)
+
+        self.repository.get_principal(1)
+        self.repository.get_principal(1)
+
+        self.assertEqual(self.cursor.execute.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
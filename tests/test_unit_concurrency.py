@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для параллельной загрузки данных страницы
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import Mock
+
+from flask import Flask, g
+
+from app.concurrency import fetch_parallel
+from app.db import ConnectionPool, DBConnector
+from app.tracing import QueryTrace
+
+
+def make_connection():
+    connection = Mock()
+    connection.unread_result = False
+    connection.in_transaction = False
+    return connection
+
+
+class TestFetchParallel(unittest.TestCase):
+    """Unit тесты для fetch_parallel"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.db = DBConnector()
+        self.app.db.init_app(self.app)
+        self.app.db._pool = ConnectionPool(Mock(side_effect=make_connection), size=3, timeout=0.1)
+
+    def test_calls_run_concurrently_in_order(self):
+        """Тест одновременного выполнения и порядка результатов"""
+        barrier = threading.Barrier(3, timeout=2)
+
+        def load(value):
+            def call():
+                barrier.wait()
+                return value
+            return call
+
+        with self.app.app_context():
+            results = fetch_parallel(load('animal'), load('photos'), load('adoptions'))
+
+        self.assertEqual(results, ['animal', 'photos', 'adoptions'])
+
+    def test_tasks_share_request_trace_and_use_own_connections(self):
+        """Тест общей трассировки запросов и отдельных соединений у задач"""
+        def call():
+            return g.get('sql_trace'), self.app.db.connect()
+
+        with self.app.app_context():
+            g.sql_trace = QueryTrace()
+            (trace, first), (task_trace, second) = fetch_parallel(call, call)
+            self.assertIs(task_trace, g.sql_trace)
+            self.assertIsNot(first, second)
+            self.assertTrue(second.released)
+
+    def test_falls_back_to_serial_when_pool_is_exhausted(self):
+        """Тест последовательного выполнения при нехватке соединений"""
+        pool = self.app.db.get_pool()
+        held = [pool.acquire(), pool.acquire(), pool.acquire()]
+
+        with self.app.app_context():
+            threads = fetch_parallel(threading.get_ident, threading.get_ident)
+
+        self.assertEqual(threads, [threading.get_ident()] * 2)
+        for connection in held:
+            connection.close()
+
+    def test_task_without_free_connection_runs_on_request_connection(self):
+        """Тест задачи без свободного соединения: она не ждёт DB_POOL_TIMEOUT, вызов идёт на соединении запроса"""
+        self.app.db._pool = ConnectionPool(Mock(side_effect=make_connection), size=1, timeout=30)
+
+        def call():
+            return threading.get_ident(), self.app.db.connect(readonly=True)
+
+        with self.app.app_context():
+            request_connection = self.app.db.connect()
+            started = time.monotonic()
+            results = fetch_parallel(call, call)
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(results, [(threading.get_ident(), request_connection)] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
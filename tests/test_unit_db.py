@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для пула соединений DBConnector
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from flask import Flask, session as flask_session
+from mysql.connector.errors import DatabaseError, InterfaceError, InternalError, PoolError
+
+from app.db import (SESSION_WROTE_AT, ConnectionPool, DBConnector, _reset_pools_after_fork, parse_hosts,
+                    retry_on_deadlock)
+
+
+def make_connection():
+    connection = Mock()
+    connection.unread_result = False
+    connection.in_transaction = False
+    return connection
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Unit тесты для ConnectionPool"""
+
+    def setUp(self):
+        self.factory = Mock(side_effect=make_connection)
+
+    def test_connection_is_reused_after_close(self):
+        """Тест повторного использования соединения после close()"""
+        pool = ConnectionPool(self.factory, size=2)
+
+        first = pool.acquire()
+        raw = first._connection
+        first.close()
+        second = pool.acquire()
+
+        self.assertIs(second._connection, raw)
+        self.assertEqual(self.factory.call_count, 1)
+        raw.close.assert_not_called()
+
+    def test_double_close_is_ignored(self):
+        """Тест повторного close() на уже возвращённом соединении"""
+        pool = ConnectionPool(self.factory, size=1)
+
+        connection = pool.acquire()
+        connection.close()
+        connection.close()
+
+        self.assertEqual(pool.idle_count, 1)
+        self.assertTrue(connection.released)
+        with self.assertRaises(PoolError):
+            connection.cursor()
+
+    def test_open_transaction_is_rolled_back_on_release(self):
+        """Тест отката незавершённой транзакции при возврате в пул"""
+        pool = ConnectionPool(self.factory, size=1)
+
+        connection = pool.acquire()
+        raw = connection._connection
+        raw.in_transaction = True
+        connection.close()
+
+        raw.rollback.assert_called_once()
+        self.assertEqual(pool.idle_count, 1)
+
+    def test_timeout_when_pool_is_exhausted(self):
+        """Тест ожидания свободного соединения с ограничением по времени"""
+        pool = ConnectionPool(self.factory, size=1, timeout=0.05)
+
+        pool.acquire()
+        with self.assertRaises(PoolError):
+            pool.acquire()
+
+    def test_waiter_gets_released_connection(self):
+        """Тест передачи соединения ожидающему потоку"""
+        pool = ConnectionPool(self.factory, size=1, timeout=2)
+        connection = pool.acquire()
+        result = {}
+
+        def borrow():
+            result['connection'] = pool.acquire()
+
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        time.sleep(0.05)
+        connection.close()
+        thread.join()
+
+        self.assertFalse(result['connection'].released)
+        self.assertEqual(self.factory.call_count, 1)
+
+    def test_unhealthy_connection_is_replaced(self):
+        """Тест замены соединения, не прошедшего проверку на ping"""
+        pool = ConnectionPool(self.factory, size=1, ping_after=0)
+
+        connection = pool.acquire()
+        raw = connection._connection
+        raw.ping.side_effect = Exception('gone away')
+        connection.close()
+        replacement = pool.acquire()
+
+        self.assertIsNot(replacement._connection, raw)
+        raw.close.assert_called_once()
+        self.assertEqual(pool.opened_count, 1)
+
+    def test_idle_connections_are_evicted(self):
+        """Тест вытеснения простаивающих соединений"""
+        pool = ConnectionPool(self.factory, size=2, max_idle=0.01)
+
+        connection = pool.acquire()
+        raw = connection._connection
+        connection.close()
+        time.sleep(0.02)
+        pool.acquire()
+
+        raw.close.assert_called_once()
+        self.assertEqual(self.factory.call_count, 2)
+
+    def test_expired_connection_is_closed_on_release(self):
+        """Тест закрытия соединения, превысившего max_lifetime"""
+        pool = ConnectionPool(self.factory, size=1, max_lifetime=0)
+
+        connection = pool.acquire()
+        raw = connection._connection
+        connection.close()
+
+        raw.close.assert_called_once()
+        self.assertEqual(pool.idle_count, 0)
+        self.assertEqual(pool.opened_count, 0)
+
+    def test_pool_is_recreated_after_fork(self):
+        """Тест нового пула в дочернем процессе без закрытия соединений родителя"""
+        app = Flask(__name__)
+        app.config.update(DB_POOL_SIZE=2)
+        db = DBConnector()
+        db.init_app(app)
+        db._pool = inherited = ConnectionPool(self.factory, size=2)
+        connection = inherited.acquire()
+        raw = connection._connection
+        connection.close()
+
+        _reset_pools_after_fork()
+
+        self.assertIsNone(db._pool)
+        self.assertIsNot(db.get_pool(), inherited)
+        raw.close.assert_not_called()
+
+
+class TestPreparedStatements(unittest.TestCase):
+    """Unit тесты для кэша prepared statements соединения"""
+
+    def setUp(self):
+        self.factory = Mock(side_effect=make_connection)
+
+    def test_statement_is_prepared_once_per_connection(self):
+        """Тест повторного использования подготовленного запроса после возврата соединения в пул"""
+        pool = ConnectionPool(self.factory, size=1)
+        for user_id in (1, 2):
+            connection = pool.acquire()
+            with connection.cursor(prepared=True, dictionary=True) as cursor:
+                cursor.execute(''.join(['SELECT * FROM users WHERE id = ', '%s']), (user_id,))
+            connection.close()
+
+        raw = pool._idle[0][0]
+        raw.cursor.assert_called_once_with(prepared=True, dictionary=True, named_tuple=False)
+        prepared = raw.cursor.return_value
+        first, second = prepared.execute.call_args_list
+        self.assertIs(first.args[0], second.args[0])
+        self.assertEqual(second.args[1], (2,))
+
+    def test_statements_are_prepared_again_after_reconnect(self):
+        """Тест подготовки запросов заново после переподключения и потери statement сервером"""
+        pool = ConnectionPool(self.factory, size=1)
+        connection = pool.acquire()
+        raw = connection._connection
+        raw.connection_id = 1
+        connection.cursor(prepared=True).execute('SELECT 1')
+        raw.connection_id = 2
+        connection.cursor(prepared=True).execute('SELECT 1')
+        self.assertEqual(raw.cursor.call_count, 2)
+
+        raw.cursor.return_value.execute.side_effect = [
+            DatabaseError(msg='Unknown prepared statement handler', errno=1243), None
+        ]
+        connection.cursor(prepared=True).execute('SELECT 1')
+        self.assertEqual(raw.cursor.call_count, 3)
+
+    def test_rows_left_after_fetchone_are_drained(self):
+        """Тест дочитывания строк курсора, когда соединение не сообщает о непрочитанном результате"""
+        pool = ConnectionPool(self.factory, size=1)
+        connection = pool.acquire()
+        prepared = connection._connection.cursor.return_value
+        prepared.with_rows = True
+
+        with connection.cursor(prepared=True) as cursor:
+            cursor.execute('SELECT id FROM users WHERE username = %s', ('ivan',))
+            cursor.fetchone()
+
+        prepared.fetchall.assert_called_once()
+
+        prepared.with_rows = False
+        with connection.cursor(prepared=True) as cursor:
+            cursor.execute('UPDATE users SET first_name = %s', ('Иван',))
+
+        prepared.fetchall.assert_called_once()
+
+    def test_least_recently_used_statement_is_deallocated(self):
+        """Тест освобождения statements сверх statement_cache_size"""
+        pool = ConnectionPool(self.factory, size=1, statement_cache_size=1)
+        connection = pool.acquire()
+        raw = connection._connection
+        raw.cursor.side_effect = lambda **kwargs: Mock()
+
+        connection.cursor(prepared=True).execute('SELECT 1')
+        evicted = pool.statements(raw)._active
+        connection.cursor(prepared=True).execute('SELECT 2')
+
+        evicted.close.assert_called_once()
+        self.assertEqual(len(pool.statements(raw)), 1)
+
+    def test_disabled_cache_uses_text_protocol(self):
+        """Тест обычного курсора при statement_cache_size=0"""
+        pool = ConnectionPool(self.factory, size=1, statement_cache_size=0)
+        connection = pool.acquire()
+        connection.cursor(prepared=True, dictionary=True)
+
+        connection._connection.cursor.assert_called_once_with(dictionary=True)
+
+
+class TestUnitOfWork(unittest.TestCase):
+    """Unit тесты для DBConnector.transaction()"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.db = DBConnector()
+        self.db.init_app(self.app)
+        self.db._pool = ConnectionPool(Mock(side_effect=make_connection), size=2)
+
+    def test_single_commit_for_nested_calls(self):
+        """Тест одного commit на несколько вложенных вызовов"""
+        with self.app.app_context():
+            with self.db.transaction() as outer:
+                with self.db.transaction() as inner:
+                    inner.close()
+                with self.db.transaction(outer) as passed:
+                    self.assertIs(passed, outer)
+                self.assertIs(inner, outer)
+                self.assertFalse(outer.released)
+                raw = outer._connection
+
+        raw.commit.assert_called_once()
+        self.assertTrue(outer.released)
+
+    def test_callbacks_run_after_commit_only(self):
+        """Тест запуска after_commit только после успешного commit"""
+        calls = []
+        with self.app.app_context():
+            with self.db.transaction() as connection:
+                self.db.after_commit(connection, lambda: calls.append('committed'))
+                self.assertEqual(calls, [])
+            self.assertEqual(calls, ['committed'])
+
+            with self.assertRaises(ValueError):
+                with self.db.transaction() as connection:
+                    raw = connection._connection
+                    raw.reset_mock()
+                    self.db.after_commit(connection, lambda: calls.append('rolled back'))
+                    raise ValueError()
+
+        self.assertEqual(calls, ['committed'])
+        raw.rollback.assert_called_once()
+        raw.commit.assert_not_called()
+
+class TestReadReplicas(unittest.TestCase):
+    """Unit тесты для распределения чтений по репликам"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(
+            SECRET_KEY='test', MYSQL_USER='user', MYSQL_PASSWORD='password', MYSQL_HOST='primary',
+            MYSQL_DATABASE='test', MYSQL_REPLICAS='replica-1, replica-2:3307'
+        )
+        self.db = DBConnector()
+        self.db.init_app(self.app)
+        self.unavailable = set()
+        patcher = patch('app.db.mysql.connector.connect', side_effect=self.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self, host, port=3306, **kwargs):
+        if host in self.unavailable:
+            raise InterfaceError(f"Can't connect to MySQL server on '{host}'")
+        connection = make_connection()
+        connection.host = host
+        return connection
+
+    def read_host(self):
+        with self.app.app_context():
+            return self.db.connect(readonly=True)._connection.host
+
+    def test_parse_hosts(self):
+        """Тест разбора списка реплик"""
+        self.assertEqual(parse_hosts(' a, b:3307 ,'), [('a', 3306), ('b', 3307)])
+        self.assertEqual(parse_hosts(''), [])
+
+    def test_reads_are_spread_across_replicas(self):
+        """Тест выдачи реплик по кругу и записи на основной сервер"""
+        self.assertEqual([self.read_host() for _ in range(3)], ['replica-1', 'replica-2', 'replica-1'])
+        with self.app.app_context():
+            self.assertEqual(self.db.connect()._connection.host, 'primary')
+
+    def test_unavailable_replica_is_skipped(self):
+        """Тест пропуска недоступной реплики и чтения с основного сервера без реплик"""
+        self.unavailable.update({'replica-1', 'replica-2'})
+        self.assertEqual(self.read_host(), 'primary')
+
+        self.unavailable.discard('replica-2')
+        self.db.get_replicas()._down_until[1] = 0.0
+        self.assertEqual([self.read_host() for _ in range(3)], ['replica-2'] * 3)
+        self.assertEqual(self.db.get_replicas().pools[0].opened_count, 0)
+
+    def test_session_reads_primary_after_write(self):
+        """Тест чтения своих записей: после commit сессия читает с основного сервера"""
+        with self.app.test_request_context('/'):
+            with self.db.transaction():
+                pass
+            self.assertEqual(self.db.connect(readonly=True)._connection.host, 'primary')
+            wrote_at = flask_session[SESSION_WROTE_AT]
+
+        with self.app.test_request_context('/'):
+            flask_session[SESSION_WROTE_AT] = wrote_at
+            self.assertEqual(self.db.connect(readonly=True)._connection.host, 'primary')
+
+        with self.app.test_request_context('/'):
+            flask_session[SESSION_WROTE_AT] = wrote_at - 60
+            self.assertTrue(self.db.connect(readonly=True)._connection.host.startswith('replica'))
+
+    def test_busy_replica_is_skipped_without_waiting(self):
+        """Тест перехода к следующей реплике, когда у первой нет свободных соединений"""
+        self.app.config.update(DB_POOL_SIZE=1, DB_POOL_TIMEOUT=30)
+        with self.app.app_context():
+            busy = self.db.get_replicas().pools[0].acquire()
+            self.assertEqual(busy._connection.host, 'replica-1')
+
+            started = time.monotonic()
+            self.assertEqual(self.read_host(), 'replica-2')
+            self.assertLess(time.monotonic() - started, 1)
+
+
+class FlakyRepository:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    @retry_on_deadlock
+    def approve(self, connection=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'approved'
+
+
+def deadlock():
+    return InternalError(msg='Deadlock found when trying to get lock', errno=1213)
+
+
+@patch('app.db.time.sleep')
+class TestRetryOnDeadlock(unittest.TestCase):
+    """Unit тесты для повтора транзакций после deadlock"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(DB_DEADLOCK_RETRIES=3, DB_DEADLOCK_BACKOFF=0.1)
+
+    def test_deadlock_is_retried_with_growing_backoff(self, sleep):
+        """Тест повтора после deadlock и lock wait timeout с растущей паузой"""
+        lock_wait = DatabaseError(msg='Lock wait timeout exceeded', errno=1205)
+        repository = FlakyRepository([deadlock(), lock_wait])
+
+        with self.app.app_context():
+            self.assertEqual(repository.approve(), 'approved')
+
+        self.assertEqual(repository.calls, 3)
+        first, second = (call.args[0] for call in sleep.call_args_list)
+        self.assertTrue(0.05 <= first <= 0.1)
+        self.assertTrue(0.1 <= second <= 0.2)
+
+    def test_retries_are_bounded(self, sleep):
+        """Тест ограничения числа повторов"""
+        repository = FlakyRepository([deadlock() for _ in range(5)])
+
+        with self.app.app_context(), self.assertRaises(InternalError):
+            repository.approve()
+
+        self.assertEqual(repository.calls, 4)
+
+    def test_outer_transaction_and_other_errors_are_not_retried(self, sleep):
+        """Тест проброса ошибки владельцу внешней транзакции и ошибок, не связанных с блокировками"""
+        repository = FlakyRepository([deadlock()])
+        with self.app.app_context(), self.assertRaises(InternalError):
+            repository.approve(connection=Mock())
+
+        repository = FlakyRepository([DatabaseError(msg='Table is full', errno=1114)])
+        with self.app.app_context(), self.assertRaises(DatabaseError):
+            repository.approve()
+
+        self.assertEqual(repository.calls, 1)
+        sleep.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
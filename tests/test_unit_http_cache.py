@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для условных GET-запросов (ETag / Last-Modified)
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+
+from flask import Flask, flash
+
+from app.http_cache import conditional
+from app.page_cache import invalidate_all, invalidate_animal, listing_version
+
+
+class TestConditionalGet(unittest.TestCase):
+    """Unit тесты для app.http_cache.conditional"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(SECRET_KEY='test', ETAG_SALT='salt')
+        self.render = Mock(return_value='<html>')
+        self.user = Mock(is_authenticated=False)
+        patcher = patch('app.http_cache.current_user', self.user)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, validator=(1, 1), headers=None):
+        with self.app.test_request_context('/animals/1', headers=headers or {}):
+            return conditional(validator, self.render)
+
+    def test_matching_etag_returns_304_without_rendering(self):
+        """Тест ответа 304 без отрисовки шаблона"""
+        etag = self.get().get_etag()[0]
+        self.render.reset_mock()
+
+        response = self.get(headers={'If-None-Match': f'"{etag}"'})
+
+        self.assertEqual(response.status_code, 304)
+        self.render.assert_not_called()
+        self.assertIn('Cookie', response.vary)
+
+    def test_etag_changes_with_revision_and_role(self):
+        """Тест различия ETag для разных ревизий и ролей"""
+        anonymous = self.get().get_etag()[0]
+        self.assertNotEqual(self.get(validator=(1, 2)).get_etag()[0], anonymous)
+
+        self.user.configure_mock(is_authenticated=True, id=1, role_name='admin', full_name='Иванов Иван')
+        admin = self.get()
+        self.assertNotEqual(admin.get_etag()[0], anonymous)
+        self.assertTrue(admin.cache_control.private)
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        """Тест отрисовки по If-Modified-Since: секундная точность и отсутствие зрителя не позволяют ответить 304"""
+        response = self.get(headers={'If-Modified-Since': 'Wed, 18 Jun 2099 11:00:00 GMT'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.last_modified)
+        self.render.assert_called_once()
+
+    def test_etag_of_another_viewer_is_rendered(self):
+        """Тест страницы, запрошенной с ETag, выданным другой роли"""
+        anonymous = self.get().get_etag()[0]
+
+        self.user.configure_mock(is_authenticated=True, id=1, role_name='moderator', full_name='Иванов Иван')
+        response = self.get(headers={'If-None-Match': f'"{anonymous}"'})
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_pending_flash_disables_validation(self):
+        """Тест отрисовки страницы при наличии сообщений flash"""
+        with self.app.test_request_context('/animals/1'):
+            flash('Данные животного успешно обновлены', 'success')
+            response = conditional((1, 1), self.render)
+
+        self.render.assert_called_once()
+        self.assertIsNone(response.get_etag()[0])
+
+
+class TestListingVersion(unittest.TestCase):
+    """Unit тесты для версии списка животных без запроса к БД"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config.update(PAGE_CACHE_TTL=300)
+
+    def version(self):
+        with self.app.app_context():
+            return listing_version()
+
+    def test_changes_on_every_listing_invalidation(self):
+        """Тест смены версии после изменения животного и сброса всего кэша"""
+        first = self.version()
+        self.assertEqual(self.version(), first)
+
+        invalidate_animal(7)
+        second = self.version()
+        self.assertNotEqual(second, first)
+
+        invalidate_all()
+        self.assertNotIn(self.version(), (first, second))
+
+    def test_changes_at_least_once_per_ttl(self):
+        """Тест обновления версии раз в PAGE_CACHE_TTL, даже если сброса не было"""
+        with patch('app.page_cache.time.time', return_value=900.0):
+            first = self.version()
+        with patch('app.page_cache.time.time', return_value=1199.0):
+            self.assertEqual(self.version(), first)
+        with patch('app.page_cache.time.time', return_value=1200.0):
+            self.assertNotEqual(self.version(), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для уменьшенных WebP-копий фотографий
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from flask import Flask
+
+from app import images
+from app.repositories.photo_repository import PhotoRepository
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+FILENAME = 'ab/cd/' + 'ab' * 32 + '.jpg'
+
+
+@unittest.skipIf(Image is None, 'Pillow не установлен')
+class TestGenerateVariants(unittest.TestCase):
+    """Unit тесты для images.generate_variants"""
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_folder)
+        os.makedirs(os.path.join(self.upload_folder, 'ab', 'cd'))
+
+    def save_original(self, width, height):
+        Image.new('RGB', (width, height), (200, 120, 40)).save(os.path.join(self.upload_folder, FILENAME), 'JPEG')
+
+    def variant(self, width):
+        return os.path.join(self.upload_folder, images.variant_filename(FILENAME, width))
+
+    def test_all_widths_for_large_photo(self):
+        """Тест создания копий 320, 640 и 1280 пикселей в формате WebP"""
+        self.save_original(1600, 1200)
+
+        self.assertEqual(images.generate_variants(self.upload_folder, FILENAME), [320, 640, 1280])
+
+        for width in images.VARIANT_WIDTHS:
+            with Image.open(self.variant(width)) as variant:
+                self.assertEqual(variant.format, 'WEBP')
+                self.assertEqual(variant.size, (width, width * 3 // 4))
+        self.assertFalse([name for name in os.listdir(os.path.dirname(self.variant(320))) if name.endswith('.tmp')])
+
+    def test_widths_larger_than_source_are_not_upscaled(self):
+        """Тест пропуска ширин больше исходной: вместо них одна копия исходной ширины"""
+        self.save_original(500, 250)
+
+        self.assertEqual(images.generate_variants(self.upload_folder, FILENAME), [320, 500])
+
+        with Image.open(self.variant(500)) as variant:
+            self.assertEqual(variant.size, (500, 250))
+        self.assertFalse(os.path.exists(self.variant(640)))
+        self.assertFalse(os.path.exists(self.variant(1280)))
+
+    def test_existing_variants_are_reused(self):
+        """Тест повторной обработки того же файла: готовые копии не перезаписываются"""
+        self.save_original(800, 600)
+        images.generate_variants(self.upload_folder, FILENAME)
+        mtime = os.stat(self.variant(320)).st_mtime_ns
+
+        self.assertEqual(images.generate_variants(self.upload_folder, FILENAME), [320, 640, 800])
+        self.assertEqual(os.stat(self.variant(320)).st_mtime_ns, mtime)
+
+    def test_widths_are_stored_with_photo(self):
+        """Тест сохранения списка ширин после фоновой обработки"""
+        self.save_original(700, 700)
+        app = Flask(__name__)
+        app.config.update(UPLOAD_FOLDER=self.upload_folder, IMAGE_WORKERS=1)
+        app.photo_repository = MagicMock()
+
+        images.schedule_variants(app, 12, FILENAME).result(timeout=10)
+
+        app.photo_repository.set_variants.assert_called_once_with(12, '320,640,700')
+
+
+class TestVariantWidths(unittest.TestCase):
+    """Unit тесты для хранения и использования списка ширин"""
+
+    def test_srcset_lists_every_stored_width(self):
+        """Тест атрибута srcset по сохранённым ширинам"""
+        app = Flask(__name__)
+
+        with app.test_request_context():
+            srcset = images.photo_srcset(FILENAME, '320,640')
+
+        stem = '/static/uploads/ab/cd/' + 'ab' * 32
+        self.assertEqual(srcset, f'{stem}_320w.webp 320w, {stem}_640w.webp 640w')
+        self.assertEqual(images.parse_variants(None), [])
+
+    def test_variant_paths_follow_stored_widths(self):
+        """Тест путей копий, удаляемых вместе с фотографией"""
+        self.assertEqual(images.variant_paths('/uploads', 'x/y/photo.png', '320,500'),
+                         ['/uploads/x/y/photo_320w.webp', '/uploads/x/y/photo_500w.webp'])
+
+    def test_set_variants_updates_primary_photo(self):
+        """Тест записи ширин у фотографии и у основного фото животного"""
+        db = MagicMock()
+        db.after_commit.side_effect = lambda connection, callback: callback()
+        cursor = db.transaction.return_value.__enter__.return_value.cursor.return_value
+        cursor.fetchone.return_value = (5,)
+
+        PhotoRepository(db).set_variants(12, '320,640,1280')
+
+        calls = [call.args for call in cursor.execute.call_args_list]
+        self.assertEqual(calls[1][1], ('320,640,1280', 12))
+        self.assertIn('a.primary_photo_variants = IF(p.filename = a.primary_photo_filename, %s', calls[2][0])
+        self.assertEqual(calls[2][1], ('320,640,1280', 12))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для рендеринга описаний животных из Markdown
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app.markdown_renderer import RENDERER_VERSION, description_html, render_markdown
+from app.repositories.animal_repository import AnimalRepository
+
+
+class TestRenderMarkdown(unittest.TestCase):
+    """Unit тесты для render_markdown"""
+
+    def test_markdown_is_rendered(self):
+        """Тест преобразования Markdown в HTML"""
+        self.assertEqual(render_markdown('Очень **ласковый** кот'), '<p>Очень <strong>ласковый</strong> кот</p>')
+        self.assertEqual(render_markdown(''), '')
+        self.assertEqual(render_markdown(None), '')
+
+    def test_script_is_not_rendered(self):
+        """Тест экранирования тега script"""
+        html = render_markdown('Привет <script>alert(1)</script>')
+
+        self.assertNotIn('<script', html)
+        self.assertIn('&lt;script&gt;', html)
+
+    def test_javascript_links_and_handlers_are_stripped(self):
+        """Тест удаления ссылок javascript: и обработчиков событий"""
+        html = render_markdown('[кот](javascript:alert(1)) <a href="javascript:alert(2)" onclick="x()">пёс</a> '
+                               '<img src="cat.jpg" onerror="alert(3)">')
+
+        self.assertNotIn('javascript:', html)
+        self.assertNotIn('onclick', html)
+        self.assertNotIn('onerror', html)
+        self.assertIn('<a>кот</a>', html)
+        self.assertIn('<img src="cat.jpg">', html)
+
+    def test_safe_links_are_kept(self):
+        """Тест сохранения обычных ссылок"""
+        html = render_markdown('[приют](https://example.org/shelter)')
+
+        self.assertEqual(html, '<p><a href="https://example.org/shelter">приют</a></p>')
+
+
+class TestDescriptionHtml(unittest.TestCase):
+    """Unit тесты для выбора сохранённого или нового HTML описания"""
+
+    def test_stored_html_of_current_version_is_used(self):
+        """Тест использования HTML, сохранённого текущей версией рендерера"""
+        animal = {'description': '*новое*', 'description_html': '<p>сохранённое</p>',
+                  'description_html_version': RENDERER_VERSION}
+
+        self.assertEqual(description_html(animal), '<p>сохранённое</p>')
+
+    def test_stale_version_is_rerendered(self):
+        """Тест повторного рендеринга HTML, собранного старой версией рендерера"""
+        animal = {'description': '*новое*', 'description_html': '<p>сохранённое</p>',
+                  'description_html_version': RENDERER_VERSION - 1}
+
+        self.assertEqual(description_html(animal), '<p><em>новое</em></p>')
+
+    def test_missing_html_falls_back_to_description(self):
+        """Тест рендеринга при отсутствии сохранённого HTML"""
+        animal = {'description': 'Кот <script>x</script>', 'description_html': None,
+                  'description_html_version': RENDERER_VERSION}
+
+        self.assertEqual(description_html(animal), '<p>Кот &lt;script&gt;x&lt;/script&gt;</p>')
+        self.assertEqual(description_html({'description': None}), '')
+
+
+class TestRerenderDescriptions(unittest.TestCase):
+    """Unit тесты для AnimalRepository.rerender_descriptions"""
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.connection = self.db.connect.return_value
+        self.read_cursor = MagicMock()
+        self.write_cursor = MagicMock()
+        self.connection.cursor.side_effect = [self.read_cursor, self.write_cursor]
+        self.repository = AnimalRepository(self.db)
+
+    @patch('app.repositories.animal_repository.invalidate_all')
+    def test_only_stale_rows_are_rerendered(self, invalidate_all):
+        """Тест перерендеринга описаний старой версии с записью текущей версии"""
+        self.read_cursor.fetchall.side_effect = [
+            [{'id': 3, 'description': '**пёс**'}, {'id': 8, 'description': '<script>x</script>'}],
+            [],
+        ]
+
+        self.assertEqual(self.repository.rerender_descriptions(batch_size=2), 2)
+
+        query, params = self.read_cursor.execute.call_args_list[0].args
+        self.assertIn('description_html_version < %s', query)
+        self.assertEqual(params, (0, RENDERER_VERSION, 2))
+        self.assertEqual(self.read_cursor.execute.call_args_list[1].args[1], (8, RENDERER_VERSION, 2))
+        _, rows = self.write_cursor.executemany.call_args.args
+        self.assertEqual(rows, [
+            ('<p><strong>пёс</strong></p>', RENDERER_VERSION, 3),
+            ('&lt;script&gt;x&lt;/script&gt;', RENDERER_VERSION, 8),
+        ])
+        self.connection.commit.assert_called_once()
+        invalidate_all.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
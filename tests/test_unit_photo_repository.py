@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для PhotoRepository с имитацией соединения
+"""
+
+import unittest
+from unittest.mock import MagicMock
+
+from app.repositories.photo_repository import PhotoRepository
+
+
+class TestPhotoRepositoryCreateMany(unittest.TestCase):
+    """Unit тесты для PhotoRepository.create_many"""
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.cursor = self.db.transaction.return_value.__enter__.return_value.cursor.return_value
+        self.repository = PhotoRepository(self.db)
+
+    def test_single_insert_for_all_photos(self):
+        """Тест вставки всех фотографий одним многострочным INSERT с возвратом их id"""
+        self.cursor.fetchall.return_value = [(41,), (43,), (47,)]
+        photos = [
+            {'filename': 'aa/bb/one.jpg', 'mime_type': 'image/jpeg', 'content_hash': 'one'},
+            {'filename': 'cc/dd/two.png', 'mime_type': 'image/png', 'content_hash': 'two'},
+            {'filename': 'ee/ff/three.jpg', 'content_hash': 'three'},
+        ]
+
+        photo_ids = self.repository.create_many(5, photos)
+
+        self.assertEqual(photo_ids, [41, 43, 47])
+        self.assertEqual(self.cursor.execute.call_count, 2)
+        insert, params = self.cursor.execute.call_args_list[0].args
+        self.assertEqual(insert.count('(%s, %s, %s, %s)'), 3)
+        self.assertIn('RETURNING id', insert)
+        self.assertEqual(params[4:8], (5, 'cc/dd/two.png', 'image/png', 'two'))
+        self.assertEqual(self.cursor.execute.call_args_list[1].args[1], ('aa/bb/one.jpg', 5))
+
+    def test_empty_list_skips_database(self):
+        """Тест пустого списка фотографий"""
+        self.assertEqual(self.repository.create_many(5, []), [])
+        self.db.transaction.assert_not_called()
+
+
+class TestPrimaryPhoto(unittest.TestCase):
+    """Unit тесты для основного фото, хранимого в animals"""
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.after_commit.side_effect = lambda connection, callback: callback()
+        self.connection = self.db.transaction.return_value.__enter__.return_value
+        self.cursor = self.connection.cursor.return_value
+        self.repository = PhotoRepository(self.db)
+
+    def statements(self):
+        return [' '.join(call.args[0].split()) for call in self.cursor.execute.call_args_list]
+
+    def test_first_photo_becomes_primary(self):
+        """Тест выбора основного фото при добавлении в той же транзакции"""
+        self.cursor.lastrowid = 12
+
+        self.assertEqual(self.repository.create({'animal_id': 5, 'filename': 'aa/bb/one.jpg'}), 12)
+
+        insert, update = self.statements()
+        self.assertTrue(insert.startswith('INSERT INTO animal_photos'))
+        self.assertIn('primary_photo_filename = COALESCE(primary_photo_filename, %s)', update)
+        self.assertEqual(self.cursor.execute.call_args_list[1].args[1], ('aa/bb/one.jpg', 5))
+        self.db.transaction.assert_called_once()
+
+    def test_deleting_photo_recomputes_primary(self):
+        """Тест пересчёта основного фото после удаления"""
+        self.cursor.fetchone.return_value = (5,)
+        self.cursor.rowcount = 1
+
+        self.assertTrue(self.repository.delete(12))
+
+        select, delete, update = self.statements()
+        self.assertEqual(delete, 'DELETE FROM animal_photos WHERE id = %s')
+        self.assertIn('SELECT filename FROM animal_photos WHERE animal_id = %s ORDER BY id LIMIT 1', update)
+        self.assertEqual(self.cursor.execute.call_args_list[2].args[1], (5, 5, 5))
+
+    def test_deleting_missing_photo_leaves_animals_alone(self):
+        """Тест удаления несуществующего фото"""
+        self.cursor.fetchone.return_value = None
+        self.cursor.rowcount = 0
+
+        self.assertFalse(self.repository.delete(12))
+        self.assertEqual(self.cursor.execute.call_count, 2)
+        self.db.after_commit.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для нормализации текста полнотекстового поиска
+"""
+
+import unittest
+
+from app.search import build_boolean_query, build_search_text, stem, tokenize
+
+
+class TestSearchNormalization(unittest.TestCase):
+    """Unit тесты для app.search"""
+
+    def test_word_forms_share_a_stem(self):
+        """Тест приведения словоформ к одной основе"""
+        self.assertEqual(stem('кошка'), stem('кошки'))
+        self.assertEqual(stem('кошкой'), stem('кошку'))
+        self.assertEqual(stem('Пушистый'), stem('пушистая'))
+        self.assertEqual(stem('лабрадора'), 'лабрадор')
+
+    def test_yo_is_normalized(self):
+        """Тест замены ё на е"""
+        self.assertEqual(stem('Ёжик'), stem('ежик'))
+
+    def test_short_words_are_skipped(self):
+        """Тест пропуска слов короче минимальной длины токена"""
+        self.assertEqual(tokenize('он и кот'), ['кот'])
+        self.assertEqual(tokenize(''), [])
+        self.assertEqual(tokenize(None), [])
+
+    def test_name_is_weighted_twice(self):
+        """Тест двойного веса клички в поисковом тексте"""
+        text = build_search_text({'name': 'Барон', 'breed': 'Лабрадор', 'description': ''})
+        self.assertEqual(text.split(), ['барон', 'барон', 'лабрадор'])
+
+    def test_boolean_query_requires_every_term(self):
+        """Тест построения запроса для BOOLEAN MODE"""
+        self.assertEqual(build_boolean_query('рыжая кошка кошки'), '+рыж* +кошк*')
+        self.assertEqual(build_boolean_query('"+-*()'), '')
+        self.assertEqual(build_boolean_query(None), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
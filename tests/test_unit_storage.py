@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для хранилища фотографий по хешу содержимого
+"""
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+from werkzeug.datastructures import FileStorage
+
+from app import create_app
+from app.blueprints import animals
+from app.images import schedule_removal
+from app.storage import INCOMING_DIR, LOCK_FILE, is_held, release, save_upload
+
+
+class TestStorage(unittest.TestCase):
+    """Unit тесты для app.storage"""
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.upload_folder)
+
+    def upload(self, content, filename):
+        return save_upload(FileStorage(stream=io.BytesIO(content), filename=filename), self.upload_folder)
+
+    def test_upload_is_stored_under_sharded_path(self):
+        """Тест сохранения файла в каталог по первым символам хеша"""
+        content = b'photo' * 1000
+        digest = hashlib.sha256(content).hexdigest()
+
+        filename, content_hash, _ = self.upload(content, 'IMG_0001.JPG')
+
+        self.assertEqual(content_hash, digest)
+        self.assertEqual(filename, f'{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        with open(os.path.join(self.upload_folder, filename), 'rb') as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_identical_uploads_are_deduplicated(self):
+        """Тест хранения одинаковых фотографий одним файлом"""
+        first, _, first_hold = self.upload(b'same', 'a.jpg')
+        second, _, second_hold = self.upload(b'same', 'b.jpg')
+        release([first_hold, second_hold])
+
+        self.assertEqual(first, second)
+        self.assertEqual(set(os.listdir(os.path.join(self.upload_folder, INCOMING_DIR))) - {LOCK_FILE}, set())
+
+    def test_same_name_different_content_does_not_overwrite(self):
+        """Тест загрузки разных файлов с одинаковым именем"""
+        first, _, _ = self.upload(b'first', 'IMG_0001.jpg')
+        second, _, _ = self.upload(b'second', 'IMG_0001.jpg')
+
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.exists(os.path.join(self.upload_folder, first)))
+        self.assertTrue(os.path.exists(os.path.join(self.upload_folder, second)))
+
+    def test_upload_holds_file_until_released(self):
+        """Тест удержания файла, пока ссылка на него не сохранена в БД"""
+        filename, _, hold = self.upload(b'held', 'a.jpg')
+        _, _, second_hold = self.upload(b'held', 'b.jpg')
+        path = os.path.join(self.upload_folder, filename)
+
+        self.assertTrue(is_held(path))
+        release([hold])
+        self.assertTrue(is_held(path))
+        release([second_hold])
+        self.assertFalse(is_held(path))
+        self.assertFalse(is_held(path + '.missing'))
+
+
+class TestRemoval(unittest.TestCase):
+    """Unit тесты для удаления файлов без ссылок"""
+
+    def setUp(self):
+        self.upload_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.upload_folder)
+        self.app = create_app({'TESTING': True, 'SECRET_KEY': 'test'})
+        self.app.config['UPLOAD_FOLDER'] = self.upload_folder
+        self.app.photo_repository = Mock()
+        self.app.photo_repository.get_referenced.return_value = set()
+
+    def upload(self, content):
+        return save_upload(FileStorage(stream=io.BytesIO(content), filename='a.jpg'), self.upload_folder)
+
+    def exists(self, filename):
+        return os.path.exists(os.path.join(self.upload_folder, filename))
+
+    def test_unreferenced_file_and_variants_are_removed(self):
+        """Тест удаления файла и его копий"""
+        filename, _, hold = self.upload(b'orphan')
+        release([hold])
+        variant = filename.replace('.jpg', '_320w.webp')
+        open(os.path.join(self.upload_folder, variant), 'wb').close()
+
+        schedule_removal(self.app, [(filename, '320')]).result(timeout=10)
+
+        self.assertFalse(self.exists(filename))
+        self.assertFalse(self.exists(variant))
+        self.app.photo_repository.get_referenced.assert_called_once_with([filename])
+
+    def test_file_referenced_again_is_kept(self):
+        """Тест файла, на который после удаления записи сослалась новая загрузка"""
+        filename, _, hold = self.upload(b'reused')
+        release([hold])
+        self.app.photo_repository.get_referenced.return_value = {filename}
+
+        schedule_removal(self.app, [(filename, None)]).result(timeout=10)
+
+        self.assertTrue(self.exists(filename))
+
+    def test_file_held_by_upload_in_progress_is_kept(self):
+        """Тест файла, который загрузка уже разместила, но ещё не сохранила ссылку в БД"""
+        filename, _, hold = self.upload(b'in progress')
+
+        schedule_removal(self.app, [(filename, None)]).result(timeout=10)
+
+        self.assertTrue(self.exists(filename))
+        release([hold])
+
+    def test_failed_create_removes_new_files(self):
+        """Тест удаления сохранённых файлов, если животное не удалось сохранить"""
+        admin = Mock(is_authenticated=True, is_active=True, role_name='admin', get_id=lambda: '1')
+        self.app.db = MagicMock()
+        self.app.db.transaction.return_value.__enter__.side_effect = RuntimeError('deadlock')
+        client = self.app.test_client()
+
+        with patch('flask_login.utils._get_user', return_value=admin), \
+                patch.object(animals, 'schedule_removal', wraps=schedule_removal) as removal:
+            client.post('/animals/create', data={
+                'name': 'Барон', 'description': '', 'age_months': '12', 'breed': 'Лабрадор',
+                'gender': 'male', 'status': 'available', 'photos': (io.BytesIO(b'new photo'), 'a.jpg'),
+            }, content_type='multipart/form-data')
+            removal.return_value.result(timeout=10)
+
+        digest = hashlib.sha256(b'new photo').hexdigest()
+        filename = f'{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        removal.assert_called_once()
+        self.assertEqual(removal.call_args.args[1], [(filename, None)])
+        self.assertFalse(self.exists(filename))
+        self.assertEqual(set(os.listdir(os.path.join(self.upload_folder, INCOMING_DIR))) - {LOCK_FILE}, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для трассировки SQL-запросов
+"""
+
+import importlib
+import unittest
+from unittest.mock import Mock, patch
+
+from flask import Flask, g
+
+from app import config, tracing
+from app.tracing import QueryTrace, TracingCursor, normalize_statement
+
+
+class TestTracing(unittest.TestCase):
+    """Unit тесты для app.tracing"""
+
+    def test_literals_and_placeholders_are_normalized(self):
+        """Тест приведения запросов с разными параметрами к одной форме"""
+        first = normalize_statement("""
+            SELECT * FROM animal_photos
+            WHERE animal_id = %s AND filename = 'a.jpg' LIMIT 10
+        """)
+        second = normalize_statement("SELECT * FROM animal_photos WHERE animal_id = 7 AND filename = 'b''.jpg' LIMIT 3")
+
+        self.assertEqual(first, 'SELECT * FROM animal_photos WHERE animal_id = ? AND filename = ? LIMIT ?')
+        self.assertEqual(first, second)
+
+    def test_value_lists_are_collapsed(self):
+        """Тест свёртки списков значений IN и VALUES"""
+        self.assertEqual(
+            normalize_statement("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)"),
+            'INSERT INTO t (a, b) VALUES (?)'
+        )
+        self.assertEqual(
+            normalize_statement("SELECT id FROM t WHERE id IN (1, 2, 3)"),
+            'SELECT id FROM t WHERE id IN (?)'
+        )
+
+    def test_repeated_statements_are_reported(self):
+        """Тест обнаружения N+1"""
+        trace = QueryTrace()
+        for photo_id in range(4):
+            trace.record(f"DELETE FROM animal_photos WHERE id = {photo_id}", 0.001, 1)
+        trace.record("DELETE FROM animals WHERE id = 1", 0.5, 1)
+
+        self.assertEqual(trace.repeated(3), [('DELETE FROM animal_photos WHERE id = ?', 4)])
+        self.assertEqual(len(trace.slow(0.1)), 1)
+        self.assertEqual(trace.count, 5)
+
+    def test_cursor_records_statement_and_rows(self):
+        """Тест записи запроса и числа строк курсором-обёрткой"""
+        trace = QueryTrace()
+        raw = Mock()
+        raw.rowcount = -1
+        raw.fetchall.return_value = [{'id': 1}, {'id': 2}]
+
+        with TracingCursor(raw, trace) as cursor:
+            cursor.execute("SELECT * FROM animals WHERE id > %s", (0,))
+            rows = cursor.fetchall()
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(trace.statements[0]['rows'], 2)
+        raw.execute.assert_called_once_with("SELECT * FROM animals WHERE id > %s", (0,))
+        raw.close.assert_called_once()
+
+    def test_server_timing_only_when_enabled(self):
+        """Тест заголовка Server-Timing: по умолчанию выключен, включается настройкой SQL_TRACE"""
+        def build(config):
+            app = Flask(__name__)
+            app.config.update(config)
+            tracing.init_app(app)
+
+            @app.route('/')
+            def index():
+                if 'sql_trace' in g:
+                    g.sql_trace.record('SELECT 1', 0.002, 1)
+                return 'ok'
+
+            return app.test_client().get('/')
+
+        self.assertNotIn('Server-Timing', build({}).headers)
+        self.assertNotIn('Server-Timing', build({'SQL_TRACE': False}).headers)
+        self.assertIn('desc="1 queries"', build({'SQL_TRACE': True}).headers['Server-Timing'])
+
+    def test_config_defaults_to_off(self):
+        """Тест значения SQL_TRACE по умолчанию"""
+        with patch.dict('os.environ', {}, clear=False) as environ:
+            environ.pop('SQL_TRACE', None)
+            self.assertFalse(importlib.reload(config).SQL_TRACE)
+            environ['SQL_TRACE'] = 'true'
+            self.assertTrue(importlib.reload(config).SQL_TRACE)
+        importlib.reload(config)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Unit тесты для UserRepository с имитацией соединения
+"""
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from app.repositories.user_repository import UserRepository
+
+
+class TestUserRepositoryDelete(unittest.TestCase):
+    """Unit тесты для UserRepository.delete"""
+
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.after_commit.side_effect = lambda connection, callback: callback()
+        self.cursor = self.db.transaction.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        self.cursor.rowcount = 1
+        self.repository = UserRepository(self.db)
+
+    def statements(self):
+        return [' '.join(call.args[0].split()) for call in self.cursor.execute.call_args_list]
+
+    @patch('app.repositories.user_repository.invalidate_animal')
+    def test_adoption_counts_are_decremented_before_cascade(self, invalidate_animal):
+        """Тест уменьшения счётчика заявок животных в той же транзакции, что и удаление"""
+        self.cursor.fetchall.return_value = [(7,), (9,)]
+
+        self.assertTrue(self.repository.delete(3))
+
+        select, update, delete = self.statements()
+        self.assertIn('SET a.adoption_count = GREATEST(a.adoption_count - ad.total, 0)', update)
+        self.assertIn('WHERE user_id = %s GROUP BY animal_id', update)
+        self.assertEqual(delete, 'DELETE FROM users WHERE id = %s')
+        self.assertEqual(self.cursor.execute.call_args_list[1].args[1], (3,))
+        self.db.transaction.assert_called_once()
+        self.assertEqual([call.args for call in invalidate_animal.call_args_list], [(7,), (9,)])
+
+    @patch('app.repositories.user_repository.invalidate_animal')
+    def test_user_without_adoptions(self, invalidate_animal):
+        """Тест удаления пользователя без заявок"""
+        self.cursor.fetchall.return_value = []
+
+        self.assertTrue(self.repository.delete(3))
+
+        self.assertEqual(self.statements()[1], 'DELETE FROM users WHERE id = %s')
+        self.assertEqual(self.cursor.execute.call_count, 2)
+        invalidate_animal.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()